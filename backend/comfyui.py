@@ -1,28 +1,75 @@
 import asyncio
+import collections
 import copy
+import hashlib
 import json
+import logging
 import random
 import urllib.parse
+import uuid
 from pathlib import Path
 from typing import Callable, Optional
 
 import httpx
+from websockets.asyncio.client import connect as ws_connect
 
 from .config import settings
 
 
+logger = logging.getLogger(__name__)
+
+# Max prompt states kept for events that arrive before (or after) anyone waits
+MAX_TRACKED_PROMPTS = 1024
+
+
 class ComfyUIError(Exception):
     pass
 
 
-class ComfyUIClient:
+def _retrieve_exception(task: asyncio.Task):
+    """Mark a shared task's failure as seen when every waiter has gone away."""
+    if not task.cancelled():
+        task.exception()
+
+
+class _PromptState:
+    """Push-side state for one prompt: node outputs seen so far plus a done future."""
+
     def __init__(self):
+        self.outputs: dict = {}
+        self.connection: Optional[asyncio.Future] = None  # socket live at submit time
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ComfyUIClient:
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or settings.comfyui_url
+        self.client_id = uuid.uuid4().hex
         self._client: Optional[httpx.AsyncClient] = None
         self._workflow_template: Optional[dict] = None
+        # WebSocket event stream: prompt_id -> state, oldest first
+        self._prompts: collections.OrderedDict[str, _PromptState] = collections.OrderedDict()
+        self._ws_task: Optional[asyncio.Task] = None
+        self._ws_closed: Optional[asyncio.Future] = None  # set while the socket is up
+        # Content hashes already present in this backend's input dir, oldest first
+        self._uploaded: collections.OrderedDict[str, str] = collections.OrderedDict()
+        self._uploads_in_flight: dict[str, asyncio.Task] = {}
+        self.upload_stats = {"hits": 0, "misses": 0, "bytes_uploaded": 0, "bytes_saved": 0}
+        # Prompts withdrawn because their job was cancelled
+        self.cancel_stats = {"dequeued": 0, "interrupted": 0, "finished": 0}
+        # Load and health state, maintained by ComfyUIPool
+        self.healthy = True
+        self.probe_failures = 0  # consecutive failed /queue probes
+        self.queue_depth = 0  # running + pending on the ComfyUI side, as of last refresh
+        self.own_at_probe = 0  # our jobs that queue_depth already includes
+        self.in_flight = 0  # jobs we have routed here that haven't finished
+        self.completed = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
 
     async def start(self):
         self._client = httpx.AsyncClient(
-            base_url=settings.comfyui_url,
+            base_url=self.base_url,
             timeout=settings.comfyui_timeout,
         )
         # Load workflow template
@@ -30,12 +77,134 @@ class ComfyUIClient:
         if not path.exists():
             raise FileNotFoundError(f"Workflow template not found: {path}")
         self._workflow_template = json.loads(path.read_text())
+        if settings.comfyui_websocket:
+            self._ws_task = asyncio.create_task(self._ws_loop())
 
     async def close(self):
+        if self._ws_task:
+            self._ws_task.cancel()
+            try:
+                await self._ws_task
+            except asyncio.CancelledError:
+                pass
+            self._ws_task = None
         if self._client:
             await self._client.aclose()
             self._client = None
 
+    async def get_queue_depth(self) -> int:
+        """Number of prompts running or pending on this ComfyUI instance."""
+        resp = await self._client.get("/queue")
+        resp.raise_for_status()
+        data = resp.json()
+        return len(data.get("queue_running", [])) + len(data.get("queue_pending", []))
+
+    async def _queue_state(self, prompt_id: str) -> Optional[str]:
+        """"running", "pending", or None if ComfyUI no longer has the prompt queued."""
+        resp = await self._client.get("/queue")
+        resp.raise_for_status()
+        data = resp.json()
+        for state, key in (("running", "queue_running"), ("pending", "queue_pending")):
+            if any(entry[1] == prompt_id for entry in data.get(key, [])):
+                return state
+        return None
+
+    async def cancel_prompt(self, prompt_id: str) -> Optional[str]:
+        """Free the GPU from a prompt nobody wants any more.
+
+        A pending prompt is deleted from ComfyUI's queue; a running one is
+        interrupted (naming the prompt, so a newer ComfyUI won't interrupt
+        whatever replaced it if it has just finished). Returns "dequeued",
+        "interrupted", or None if the prompt had already finished.
+        """
+        state = await self._queue_state(prompt_id)
+        if state == "pending":
+            resp = await self._client.post("/queue", json={"delete": [prompt_id]})
+            resp.raise_for_status()
+            # It may have started between the check and the delete
+            state = await self._queue_state(prompt_id)
+            if state is None:
+                self.cancel_stats["dequeued"] += 1
+                return "dequeued"
+        if state == "running":
+            resp = await self._client.post("/interrupt", json={"prompt_id": prompt_id})
+            resp.raise_for_status()
+            self.cancel_stats["interrupted"] += 1
+            return "interrupted"
+        self.cancel_stats["finished"] += 1
+        return None
+
+    async def system_stats(self) -> dict:
+        resp = await self._client.get("/system_stats")
+        resp.raise_for_status()
+        return resp.json()
+
+    @property
+    def load(self) -> int:
+        """Our in-flight jobs plus everyone else's prompts as of the last refresh."""
+        return self.in_flight + max(0, self.queue_depth - self.own_at_probe)
+
+    @property
+    def ws_connected(self) -> bool:
+        return self._ws_closed is not None and not self._ws_closed.done()
+
+    def _ws_url(self) -> str:
+        parts = urllib.parse.urlsplit(self.base_url)
+        scheme = "wss" if parts.scheme == "https" else "ws"
+        query = urllib.parse.urlencode({"clientId": self.client_id})
+        return urllib.parse.urlunsplit((scheme, parts.netloc, parts.path.rstrip("/") + "/ws", query, ""))
+
+    async def _ws_loop(self):
+        """Keep one WebSocket open to ComfyUI, reconnecting after drops."""
+        while True:
+            try:
+                async with ws_connect(self._ws_url(), max_size=None) as ws:
+                    self._ws_closed = asyncio.get_running_loop().create_future()
+                    try:
+                        async for message in ws:
+                            # Binary frames are latent previews; only JSON events matter here
+                            if isinstance(message, str):
+                                self._handle_event(json.loads(message))
+                    finally:
+                        if not self._ws_closed.done():
+                            self._ws_closed.set_result(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("ComfyUI websocket error (%s): %s", self.base_url, exc)
+            await asyncio.sleep(settings.comfyui_ws_reconnect_delay)
+
+    def _state(self, prompt_id: str) -> _PromptState:
+        state = self._prompts.get(prompt_id)
+        if state is None:
+            state = self._prompts[prompt_id] = _PromptState()
+            while len(self._prompts) > MAX_TRACKED_PROMPTS:
+                self._prompts.popitem(last=False)
+        return state
+
+    def _handle_event(self, event: dict):
+        """Route one ComfyUI event to the waiter for its prompt."""
+        data = event.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        kind = event.get("type")
+        if kind == "executed":
+            self._state(prompt_id).outputs[str(data.get("node"))] = data.get("output") or {}
+        elif (kind == "executing" and data.get("node") is None) or kind == "execution_success":
+            state = self._state(prompt_id)
+            if not state.done.done():
+                state.done.set_result(state.outputs)
+        elif kind in ("execution_error", "execution_interrupted"):
+            state = self._state(prompt_id)
+            if not state.done.done():
+                detail = data.get("exception_message") or kind
+                state.done.set_exception(
+                    ComfyUIError(f"ComfyUI workflow failed: {detail}")
+                )
+                # Waiters still see it; a prompt we withdrew has none left
+                state.done.exception()
+
     async def health_check(self) -> bool:
         try:
             resp = await self._client.get("/")
@@ -56,6 +225,47 @@ class ComfyUIClient:
             raise ComfyUIError(f"Upload response missing 'name': {result}")
         return result["name"]
 
+    async def ensure_uploaded(self, image_bytes: bytes) -> str:
+        """Upload image bytes under a content-addressed name, skipping known content.
+
+        Identical bytes always map to the same filename, so concurrent jobs
+        can never overwrite each other's input and repeat sketches (presets,
+        variation batches) cost one upload per backend.
+        """
+        digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+        if digest in self._uploaded:
+            self._uploaded.move_to_end(digest)
+            self.upload_stats["hits"] += 1
+            self.upload_stats["bytes_saved"] += len(image_bytes)
+            return self._uploaded[digest]
+        task = self._uploads_in_flight.get(digest)
+        if task is not None:
+            self.upload_stats["hits"] += 1
+            self.upload_stats["bytes_saved"] += len(image_bytes)
+        else:
+            # Detached so a cancelled job can't take the shared upload (and
+            # every other job waiting on the same sketch) down with it
+            task = asyncio.create_task(self._upload_content(image_bytes, digest))
+            task.add_done_callback(_retrieve_exception)
+            self._uploads_in_flight[digest] = task
+        return await asyncio.shield(task)
+
+    async def _upload_content(self, image_bytes: bytes, digest: str) -> str:
+        try:
+            name = await self.upload_image(image_bytes, f"pencil_{digest}.png")
+        finally:
+            self._uploads_in_flight.pop(digest, None)
+        self.upload_stats["misses"] += 1
+        self.upload_stats["bytes_uploaded"] += len(image_bytes)
+        self._uploaded[digest] = name
+        while len(self._uploaded) > settings.comfyui_upload_cache_size:
+            self._uploaded.popitem(last=False)
+        return name
+
+    def forget_upload(self, image_bytes: bytes):
+        """Drop an image from the upload cache so the next use re-uploads it."""
+        self._uploaded.pop(hashlib.sha256(image_bytes).hexdigest()[:32], None)
+
     def build_workflow(
         self,
         image_filename: str,
@@ -65,8 +275,14 @@ class ComfyUIClient:
         seed: Optional[int],
         width: int = 512,
         height: int = 512,
+        batch_size: int = 1,
     ) -> dict:
-        """Build a workflow dict from template, injecting parameters."""
+        """Build a workflow dict from template, injecting parameters.
+
+        With batch_size > 1 the encoded sketch latent is repeated so LoadImage,
+        VAEEncode and CLIPTextEncode run once; RandomNoise then draws distinct
+        noise for every latent in the batch from the single seed.
+        """
         wf = copy.deepcopy(self._workflow_template)
         # Node 1: LoadImage
         wf["1"]["inputs"]["image"] = image_filename
@@ -85,49 +301,140 @@ class ComfyUIClient:
         wf["15"]["inputs"]["denoise"] = denoise
         # Node 14: SaveImage prefix
         wf["14"]["inputs"]["filename_prefix"] = "pencil_flux"
+        if batch_size > 1:
+            # Node 17: RepeatLatentBatch between VAEEncode and the sampler
+            wf["17"] = {
+                "class_type": "RepeatLatentBatch",
+                "inputs": {"samples": ["3", 0], "amount": batch_size},
+                "_meta": {"title": "Repeat Latent (Batch)"},
+            }
+            wf["12"]["inputs"]["latent_image"] = ["17", 0]
         return wf
 
     async def submit_workflow(self, workflow: dict) -> str:
         """Submit workflow to ComfyUI, return prompt_id."""
+        connection = self._ws_closed if self.ws_connected else None
         resp = await self._client.post(
             "/prompt",
-            json={"prompt": workflow},
+            json={"prompt": workflow, "client_id": self.client_id},
         )
         result = resp.json()
         if "error" in result:
             raise ComfyUIError(f"ComfyUI rejected workflow: {json.dumps(result, indent=2)}")
         if "prompt_id" not in result:
             raise ComfyUIError(f"Unexpected response from /prompt: {result}")
-        return result["prompt_id"]
+        prompt_id = result["prompt_id"]
+        if connection is not None:
+            self._state(prompt_id).connection = connection
+        return prompt_id
+
+    async def fetch_history_outputs(self, prompt_id: str) -> Optional[dict]:
+        """Check /history/{prompt_id} once. Returns outputs, or None if not done yet."""
+        resp = await self._client.get(f"/history/{prompt_id}")
+        history = resp.json()
+        if prompt_id not in history:
+            return None
+        entry = history[prompt_id]
+        if entry.get("status", {}).get("status_str") == "error":
+            msgs = entry.get("status", {}).get("messages", [])
+            raise ComfyUIError(
+                f"ComfyUI workflow failed: {json.dumps(msgs, indent=2)}"
+            )
+        return entry.get("outputs", {}) or None
 
     async def poll_for_completion(self, prompt_id: str) -> dict:
         """Poll /history/{prompt_id} until done. Returns outputs dict."""
         deadline = asyncio.get_event_loop().time() + settings.comfyui_poll_timeout
         while asyncio.get_event_loop().time() < deadline:
-            resp = await self._client.get(f"/history/{prompt_id}")
-            history = resp.json()
-            if prompt_id in history:
-                entry = history[prompt_id]
-                if entry.get("status", {}).get("status_str") == "error":
-                    msgs = entry.get("status", {}).get("messages", [])
-                    raise ComfyUIError(
-                        f"ComfyUI workflow failed: {json.dumps(msgs, indent=2)}"
-                    )
-                outputs = entry.get("outputs", {})
-                if outputs:
-                    return outputs
+            outputs = await self.fetch_history_outputs(prompt_id)
+            if outputs:
+                return outputs
             await asyncio.sleep(settings.comfyui_poll_interval)
         raise TimeoutError(
             f"Workflow {prompt_id} did not complete within {settings.comfyui_poll_timeout}s"
         )
 
+    async def wait_for_completion(self, prompt_id: str) -> dict:
+        """Wait for a prompt to finish, driven by WebSocket events.
+
+        Falls back to polling /history while the socket is down, and checks
+        history once on every (re)entry into push mode so a completion that
+        happened during a gap is never missed.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + settings.comfyui_poll_timeout
+        state = self._state(prompt_id)
+        # Events are only guaranteed if the socket that saw the submit is still up
+        catch_up = state.connection is None or state.connection is not self._ws_closed
+        try:
+            while loop.time() < deadline:
+                if not self.ws_connected:
+                    outputs = await self.fetch_history_outputs(prompt_id)
+                    if outputs:
+                        return outputs
+                    await asyncio.sleep(settings.comfyui_poll_interval)
+                    catch_up = True
+                    continue
+                if catch_up and not state.done.done():
+                    catch_up = False
+                    outputs = await self.fetch_history_outputs(prompt_id)
+                    if outputs:
+                        return outputs
+                await asyncio.wait(
+                    {state.done, self._ws_closed},
+                    timeout=deadline - loop.time(),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if state.done.done():
+                    outputs = state.done.result()
+                    # Fully cached prompts emit no "executed" events
+                    if not outputs:
+                        outputs = await self.fetch_history_outputs(prompt_id)
+                    if outputs:
+                        return outputs
+                    raise ComfyUIError(f"Workflow {prompt_id} finished without outputs")
+        finally:
+            self._prompts.pop(prompt_id, None)
+        raise TimeoutError(
+            f"Workflow {prompt_id} did not complete within {settings.comfyui_poll_timeout}s"
+        )
+
+    async def run_prompt(self, workflow: dict) -> dict:
+        """Submit a workflow and wait for its outputs.
+
+        If the calling task is cancelled, the prompt is withdrawn from ComfyUI
+        (see ``cancel_prompt``) before the cancellation propagates, so the
+        GPU slot is free by the time the caller's task is done and the
+        outputs are never downloaded.
+        """
+        submit = asyncio.ensure_future(self.submit_workflow(workflow))
+        try:
+            # Shielded so a cancel mid-submit still learns the prompt ID to withdraw
+            prompt_id = await asyncio.shield(submit)
+            return await self.wait_for_completion(prompt_id)
+        except asyncio.CancelledError:
+            try:
+                await self.cancel_prompt(await submit)
+            except Exception as exc:
+                logger.warning("Could not withdraw cancelled prompt from %s: %s", self.base_url, exc)
+            raise
+
     async def download_output_image(self, outputs: dict) -> bytes:
         """Download the output PNG from SaveImage node (node 14)."""
         save_node = outputs.get("14", {})
         images = save_node.get("images", [])
         if not images:
             raise ComfyUIError(f"No output images in node 14. Outputs: {outputs}")
-        img_info = images[0]
+        return await self._download(images[0])
+
+    async def download_output_images(self, outputs: dict) -> list[bytes]:
+        """Download every PNG from SaveImage node (node 14), in batch order."""
+        images = outputs.get("14", {}).get("images", [])
+        if not images:
+            raise ComfyUIError(f"No output images in node 14. Outputs: {outputs}")
+        return list(await asyncio.gather(*(self._download(img) for img in images)))
+
+    async def _download(self, img_info: dict) -> bytes:
         params = urllib.parse.urlencode({
             "filename": img_info["filename"],
             "subfolder": img_info.get("subfolder", ""),
@@ -148,10 +455,9 @@ class ComfyUIClient:
         width: int,
         height: int,
     ) -> bytes:
-        """Single generation pass: build -> submit -> poll -> download."""
+        """Single generation pass: build -> submit -> wait -> download."""
         workflow = self.build_workflow(filename, prompt, steps, denoise, seed, width, height)
-        prompt_id = await self.submit_workflow(workflow)
-        outputs = await self.poll_for_completion(prompt_id)
+        outputs = await self.run_prompt(workflow)
         return await self.download_output_image(outputs)
 
     async def generate(
@@ -173,22 +479,63 @@ class ComfyUIClient:
         from .models import JobStatus
 
         _set(JobStatus.uploading)
-        filename = await self.upload_image(image_bytes, "pencil_input.png")
+        filename = await self.ensure_uploaded(image_bytes)
 
         _set(JobStatus.processing)
-        result_bytes = await self._run_single_pass(
-            image_bytes, filename, prompt, steps, denoise, seed, 512, 512,
-        )
+        try:
+            result_bytes = await self._run_single_pass(
+                image_bytes, filename, prompt, steps, denoise, seed, 512, 512,
+            )
+        except ComfyUIError:
+            # The backend may have lost its input dir; don't trust the cache entry
+            self.forget_upload(image_bytes)
+            raise
 
         if hd:
             _set(JobStatus.uploading)
-            hd_filename = await self.upload_image(result_bytes, "pencil_hd_input.png")
+            hd_filename = await self.ensure_uploaded(result_bytes)
 
             _set(JobStatus.processing)
-            hd_seed = random.randint(0, 2**53)
+            # Derive the refinement seed so seeded HD requests stay reproducible
+            hd_seed = random.Random(seed).randint(0, 2**53) if seed is not None else random.randint(0, 2**53)
             result_bytes = await self._run_single_pass(
                 result_bytes, hd_filename, prompt, steps, 0.35, hd_seed, 1024, 1024,
             )
 
         _set(JobStatus.downloading)
         return result_bytes
+
+    async def generate_batch(
+        self,
+        image_bytes: bytes,
+        prompt: str,
+        steps: int,
+        denoise: float,
+        seed: Optional[int],
+        count: int,
+        on_status: Optional[Callable] = None,
+    ) -> list[bytes]:
+        """Render `count` variations of one sketch in a single ComfyUI prompt."""
+
+        def _set(status):
+            if on_status:
+                on_status(status)
+
+        from .models import JobStatus
+
+        _set(JobStatus.uploading)
+        filename = await self.ensure_uploaded(image_bytes)
+
+        _set(JobStatus.processing)
+        workflow = self.build_workflow(filename, prompt, steps, denoise, seed, batch_size=count)
+        try:
+            outputs = await self.run_prompt(workflow)
+        except ComfyUIError:
+            self.forget_upload(image_bytes)
+            raise
+
+        _set(JobStatus.downloading)
+        results = await self.download_output_images(outputs)
+        if len(results) != count:
+            raise ComfyUIError(f"Expected {count} batch outputs, got {len(results)}")
+        return results
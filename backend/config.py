@@ -8,9 +8,19 @@ class Settings(BaseSettings):
     dev_mode_delay: float = 1.0  # simulated generation delay in seconds
 
     comfyui_url: str = "http://127.0.0.1:18188"
+    comfyui_urls: str = ""  # comma-separated backend pool; falls back to comfyui_url
+    comfyui_health_interval: float = 5.0  # seconds between /queue health probes
+    comfyui_unhealthy_after: int = 3  # consecutive failed probes before leaving rotation
     comfyui_timeout: int = 30
     comfyui_poll_interval: float = 1.0
     comfyui_poll_timeout: float = 120.0
+    comfyui_websocket: bool = True  # push completion over /ws; polling is the fallback
+    comfyui_ws_reconnect_delay: float = 2.0
+    comfyui_upload_cache_size: int = 256  # content hashes remembered per backend
+    comfyui_max_concurrent: int = 2  # jobs dispatched to ComfyUI at once per backend
+
+    batch_max_size: int = 16  # variations per ComfyUI prompt; larger batches are split
+    queue_max_size: int = 64  # jobs waiting for a GPU slot before /api/generate returns 503
 
     host: str = "127.0.0.1"
     port: int = 8000
@@ -18,17 +28,43 @@ class Settings(BaseSettings):
     default_prompt: str = "a colorful illustration, vibrant colors, detailed shading"
     default_steps: int = 4
     max_image_size: int = 10 * 1024 * 1024  # 10 MB
+    ingest_workers: int = 0  # threads decoding uploaded sketches (0 = min(8, CPU count))
+    sketch_normalize_size: int = 512  # crop/downscale uploads to the workflow input size (0 = off)
 
     workflow_template: str = "workflow_template.json"
+    presets_manifest: str = "static/img/presets.json"  # preset sketches; see backend/presets.py
+
+    job_store_max_jobs: int = 1000
+    job_store_max_bytes: int = 256 * 1024 * 1024  # total result bytes kept before evicting
+    job_store_dir: str = ""  # spill results under <dir>/jobs; keep only job metadata in memory
+    job_store_eviction: str = "fifo"  # "fifo" (oldest job) or "lru" (least recently fetched)
+
+    result_cache_bytes: int = 64 * 1024 * 1024  # in-memory budget for seeded results
+    result_cache_dir: str = ""  # set to persist seeded results across restarts
+    result_cache_disk_bytes: int = 512 * 1024 * 1024
+
+    # WebP/AVIF renditions of results, negotiated via Accept or ?format=
+    result_webp_quality: int = 80
+    result_avif_quality: int = 60
+    transcode_workers: int = 0  # 0 = min(4, CPU count)
+    transcode_cache_bytes: int = 64 * 1024 * 1024
 
     signup_enabled: bool = False
     git_commit: str = "dev"
 
     usage_salt: str = "dev-salt-change-in-production"
     usage_db: str = "data/usage.db"
+    usage_flush_interval: float = 0.5  # seconds between write-behind flushes
+    usage_flush_max: int = 100  # pending rows that trigger an early flush
+    usage_stats_ttl: float = 2.0  # seconds global usage figures are cached
+    usage_retention_days: int = 90  # per-IP rows older than this are archived (0 = keep forever)
+    usage_archive_dir: str = "data/usage-archive"  # gzipped CSV of archived rows ("" = don't keep)
+    usage_maintenance_interval: float = 3600.0  # seconds between compaction/checkpoint runs
 
     rate_limit_window: int = 60  # seconds
     rate_limit_max: int = 15  # max requests per window per IP
+    rate_limit_max_keys: int = 100_000  # tracked IPs per bucket before the stalest are dropped
+    rate_limit_sweep_interval: float = 30.0  # seconds between idle-key sweeps
 
     daily_free_limit: int = 20  # max free generations per IP per day (0 = unlimited)
 
@@ -38,5 +74,9 @@ class Settings(BaseSettings):
     anthropic_model: str = "claude-haiku-4-5-20251001"
     anthropic_max_tokens: int = 512
 
+    def comfyui_backend_urls(self) -> list[str]:
+        urls = [u.strip() for u in self.comfyui_urls.split(",") if u.strip()]
+        return urls or [self.comfyui_url]
+
 
 settings = Settings()
@@ -0,0 +1,38 @@
+"""In-process pub/sub for job status transitions, consumed by the SSE endpoint."""
+
+import asyncio
+import json
+
+
+class JobEventBus:
+    """Fan out per-job status payloads to any number of subscriber queues."""
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    def subscribe(self, job_ids: list[str]) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for job_id in job_ids:
+            self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, job_ids: list[str]):
+        for job_id in job_ids:
+            subs = self._subscribers.get(job_id)
+            if subs is None:
+                continue
+            subs.discard(queue)
+            if not subs:
+                del self._subscribers[job_id]
+
+    def publish(self, job_id: str, payload: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(payload)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len({q for subs in self._subscribers.values() for q in subs})
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
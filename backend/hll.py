@@ -0,0 +1,67 @@
+"""HyperLogLog sketch for approximate distinct counts over hashed IPs.
+
+Each sketch is ``2 ** precision`` one-byte registers (16 KiB at the default
+precision of 14) no matter how many items are added, and two sketches merge
+by taking the register-wise maximum, so multi-day unique counts are a union
+of per-day sketches rather than a scan of the raw rows.
+
+Error bound: the relative standard error is ``1.04 / sqrt(2 ** precision)``,
+about 0.81% at precision 14. Roughly 95% of estimates land within ±1.6% of
+the true count and 99.7% within ±2.4%. Small cardinalities use linear
+counting and are close to exact.
+"""
+
+import hashlib
+import math
+from typing import Iterable
+
+DEFAULT_PRECISION = 14
+_INVERSE_POWERS = [2.0**-r for r in range(65)]
+
+
+class HyperLogLog:
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: bytes = b""):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        size = 1 << precision
+        if registers and len(registers) != size:
+            raise ValueError(f"expected {size} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers else bytearray(size)
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+    def add(self, item: str):
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        rest_bits = 64 - self.precision
+        index = h >> rest_bits
+        rest = h & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(map(_INVERSE_POWERS.__getitem__, self.registers))
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                # Linear counting is far more accurate while most registers are empty
+                estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
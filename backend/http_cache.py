@@ -0,0 +1,42 @@
+"""Strong ETags and conditional GET helpers for immutable responses.
+
+Results and preset sketches never change once their URL exists (or, for
+presets, once their content hash is in the URL), so they are served with a
+content-hash ETag and a year-long ``immutable`` lifetime. Revalidations that
+do happen get a 304 without touching the image bytes.
+"""
+
+import hashlib
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+ONE_YEAR = 365 * 24 * 3600
+IMMUTABLE = f"public, max-age={ONE_YEAR}, immutable"
+# Results are per-user, so keep them out of shared caches
+PRIVATE_IMMUTABLE = f"private, max-age={ONE_YEAR}, immutable"
+REVALIDATE = "no-cache"
+
+
+def content_etag(data: bytes) -> str:
+    """Hex digest identifying `data`; quote it when used as a header value."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cache_headers(etag: str, cache_control: str, vary: Optional[str] = None) -> dict[str, str]:
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+def not_modified(request_headers: Headers, headers: dict[str, str]) -> Optional[Response]:
+    """A 304 for `headers` if the request's If-None-Match already names its ETag."""
+    if_none_match = request_headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in tags or headers["ETag"] in tags:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,181 @@
+"""Job registry whose finished results are budgeted by bytes, not by count.
+
+Result PNGs are either held in memory or, with a spill directory configured,
+written to disk so only compact job metadata stays resident. Terminal jobs are
+evicted (oldest first, or least recently fetched) once the total result bytes
+or the job count exceed their limits.
+
+All bookkeeping is constant-time: terminal jobs sit in an ordered dict in
+eviction order, and per-status counters are updated on every transition made
+through ``set_status``.
+"""
+
+import asyncio
+import collections
+import os
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .http_cache import content_etag
+from .models import TERMINAL, Job, JobStatus
+
+EVICTION_POLICIES = ("fifo", "lru")
+SPILL_SUBDIR = "jobs"
+
+
+class JobStore:
+    def __init__(self, max_jobs: int, max_bytes: int, spill_dir: str = "", eviction: str = "fifo"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {EVICTION_POLICIES}, got {eviction!r}")
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._jobs: dict[str, Job] = {}
+        # Terminal jobs, next eviction candidate first
+        self._terminal: collections.OrderedDict[str, Job] = collections.OrderedDict()
+        self._counts: dict[JobStatus, int] = {status: 0 for status in JobStatus}
+        self.result_bytes = 0
+        self.evicted = 0
+        # A subdirectory of our own, so the startup sweep below can't delete
+        # anything else kept in spill_dir (e.g. a shared result cache)
+        self._dir = Path(spill_dir) / SPILL_SUBDIR if spill_dir else None
+        if self._dir is not None:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            # Jobs don't survive a restart, so neither do their spilled results
+            for pattern in ("*.png", "*.tmp"):
+                for stale in self._dir.glob(pattern):
+                    stale.unlink(missing_ok=True)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def __getitem__(self, job_id: str) -> Job:
+        return self._jobs[job_id]
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def values(self) -> Iterator[Job]:
+        return iter(self._jobs.values())
+
+    def add(self, job: Job):
+        self._jobs[job.job_id] = job
+        self._counts[job.status] += 1
+        if job.status in TERMINAL:
+            self._terminal[job.job_id] = job
+        self.evict()
+
+    def remove(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            self._counts[job.status] -= 1
+            self._terminal.pop(job_id, None)
+            self.discard_result(job)
+        return job
+
+    def set_status(self, job: Job, status: JobStatus):
+        """Change a job's status, keeping counters and eviction order in sync."""
+        if job.job_id in self._jobs:
+            self._counts[job.status] -= 1
+            self._counts[status] += 1
+            if status in TERMINAL:
+                self._terminal[job.job_id] = job
+            else:
+                self._terminal.pop(job.job_id, None)
+        job.status = status
+        if status in TERMINAL:
+            self.evict()
+
+    def count(self, status: JobStatus) -> int:
+        return self._counts[status]
+
+    def active_count(self) -> int:
+        """Jobs not yet in a terminal state."""
+        return len(self._jobs) - len(self._terminal)
+
+    async def save_result(self, job: Job, data: bytes):
+        """Attach a result to a job, spilling it to disk when configured."""
+        self.discard_result(job)
+        if self._dir is not None:
+            path = self._dir / f"{job.job_id}.png"
+            await asyncio.to_thread(_write_atomic, path, data)
+            if self._jobs.get(job.job_id) is not job or job.status == JobStatus.cancelled:
+                # Cancelled or evicted while the file was being written
+                path.unlink(missing_ok=True)
+                return
+            job.result_path = str(path)
+        else:
+            job.result_image = data
+        job.result_size = len(data)
+        job.result_etag = content_etag(data)
+        self.result_bytes += len(data)
+        self.evict()
+
+    def save_thumbnails(self, job: Job, thumbnails: dict[int, bytes]):
+        """Attach thumbnails; they count toward the byte budget and are dropped with the result."""
+        if job.job_id not in self._jobs or not job.result_size:
+            return  # evicted or cancelled while the thumbnails were being made
+        if job.thumbnails:
+            old = sum(map(len, job.thumbnails.values()))
+            job.result_size -= old
+            self.result_bytes -= old
+        size = sum(map(len, thumbnails.values()))
+        job.thumbnails = thumbnails
+        job.result_size += size
+        self.result_bytes += size
+        self.evict()
+
+    async def read_result(self, job: Job) -> Optional[bytes]:
+        self.touch(job)
+        if job.result_image is not None:
+            return job.result_image
+        if job.result_path is not None:
+            try:
+                return await asyncio.to_thread(Path(job.result_path).read_bytes)
+            except OSError:
+                return None
+        return None
+
+    def touch(self, job: Job):
+        """Record a result fetch; under LRU this defers the job's eviction."""
+        if self.eviction == "lru" and job.job_id in self._terminal:
+            self._terminal.move_to_end(job.job_id)
+
+    def discard_result(self, job: Job):
+        self.result_bytes -= job.result_size
+        job.result_size = 0
+        job.result_image = None
+        job.thumbnails = None
+        job.result_etag = None
+        if job.result_path is not None:
+            Path(job.result_path).unlink(missing_ok=True)
+            job.result_path = None
+
+    def evict(self):
+        """Drop terminal jobs until both the count and byte limits hold."""
+        while self._terminal and (
+            len(self._jobs) > self.max_jobs or self.result_bytes > self.max_bytes
+        ):
+            job_id = next(iter(self._terminal))
+            self.remove(job_id)
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._jobs),
+            "max_jobs": self.max_jobs,
+            "by_status": {status.value: n for status, n in self._counts.items()},
+            "result_bytes": self.result_bytes,
+            "max_bytes": self.max_bytes,
+            "spill_to_disk": self._dir is not None,
+            "evicted": self.evicted,
+        }
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
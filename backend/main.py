@@ -1,23 +1,36 @@
 import asyncio
-import base64
 import collections
-import io
+import hashlib
 import math
 import time
 import uuid
 from contextlib import asynccontextmanager
-from typing import Optional
+from pathlib import Path
+from typing import Annotated, Optional
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, RedirectResponse, Response
-from fastapi.staticfiles import StaticFiles
-from PIL import Image, ImageDraw
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 
-from .comfyui import ComfyUIClient, ComfyUIError
+from .comfyui import ComfyUIError
 from .config import settings
+from .events import JobEventBus, format_sse
+from .http_cache import IMMUTABLE, PRIVATE_IMMUTABLE, REVALIDATE, cache_headers, not_modified
+from .ingest import IngestError, IngestResult, SketchIngestor, server_timing
+from .job_store import JobStore
+from .pool import ComfyUIPool
+from .presets import PresetRegistry
+from .rate_limit import RateLimiter
+from .result_cache import ResultCache, cache_key
+from .scheduler import GenerationScheduler, QueueFullError
+from .static_assets import PrecompressedStaticFiles
+from .transcode import MEDIA_TYPES, THUMB_SIZES, Transcoder, available_formats, make_thumbnails, negotiate
 from .models import (
+    TERMINAL,
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    GenerateParams,
     GenerateRequest,
     GenerateResponse,
     HealthResponse,
@@ -38,88 +51,47 @@ if settings.dev_mode:
     from .mock_comfyui import MockComfyUIClient
 
 # ---------------------------------------------------------------------------
-# Preset sketches (generated at import time)
+# Preset sketches (read from the manifest on first use)
 # ---------------------------------------------------------------------------
 
-PRESETS: dict[str, dict] = {}
-
-
-def _generate_house() -> Image.Image:
-    img = Image.new("RGB", (512, 512), "white")
-    draw = ImageDraw.Draw(img)
-    draw.rectangle([100, 250, 412, 450], outline="black", width=4)
-    draw.polygon([(80, 250), (256, 80), (432, 250)], outline="black", width=4)
-    draw.rectangle([220, 330, 292, 450], outline="black", width=3)
-    draw.ellipse([270, 385, 282, 397], fill="black")
-    draw.rectangle([130, 290, 195, 340], outline="black", width=3)
-    draw.line([(162, 290), (162, 340)], fill="black", width=2)
-    draw.line([(130, 315), (195, 315)], fill="black", width=2)
-    draw.rectangle([317, 290, 382, 340], outline="black", width=3)
-    draw.line([(349, 290), (349, 340)], fill="black", width=2)
-    draw.line([(317, 315), (382, 315)], fill="black", width=2)
-    return img
-
-
-def _generate_face() -> Image.Image:
-    img = Image.new("RGB", (512, 512), "white")
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([80, 80, 432, 432], outline="black", width=4)
-    draw.ellipse([170, 170, 210, 220], fill="black")
-    draw.ellipse([302, 170, 342, 220], fill="black")
-    draw.arc([160, 200, 352, 370], start=20, end=160, fill="black", width=4)
-    return img
-
-
-def _img_to_png_bytes(img: Image.Image) -> bytes:
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
-
-
-def _load_presets():
-    from pathlib import Path
-
-    # llama: real sketch file (default preset)
-    llama_path = Path("static/img/llama-sketch.png")
-    if llama_path.exists():
-        PRESETS["llama"] = {
-            "name": "Llama",
-            "default_prompt": "a pencil sketch of a llama cartoon abstract logo",
-            "image_bytes": llama_path.read_bytes(),
-        }
-    # birds: real sketch file
-    birds_path = Path("static/img/input-sketch.png")
-    if birds_path.exists():
-        PRESETS["birds"] = {
-            "name": "Birds",
-            "default_prompt": "a colorful illustration of birds perched on branches, vibrant feathers, detailed nature scene",
-            "image_bytes": birds_path.read_bytes(),
-        }
-    # house: generated
-    PRESETS["house"] = {
-        "name": "House",
-        "default_prompt": "a colorful illustration of a cozy house with a red roof, green grass, blue sky, warm sunlight",
-        "image_bytes": _img_to_png_bytes(_generate_house()),
-    }
-    # face: generated
-    PRESETS["face"] = {
-        "name": "Face",
-        "default_prompt": "a colorful portrait illustration, warm skin tones, expressive eyes, soft lighting",
-        "image_bytes": _img_to_png_bytes(_generate_face()),
-    }
-
-
-_load_presets()
+PRESETS = PresetRegistry(settings.presets_manifest)
 
 # ---------------------------------------------------------------------------
 # Job store
 # ---------------------------------------------------------------------------
 
-MAX_JOBS = 50
-jobs: dict[str, Job] = {}
+jobs = JobStore(
+    max_jobs=settings.job_store_max_jobs,
+    max_bytes=settings.job_store_max_bytes,
+    spill_dir=settings.job_store_dir,
+    eviction=settings.job_store_eviction,
+)
+
+result_cache = ResultCache(
+    settings.result_cache_bytes,
+    settings.result_cache_dir,
+    settings.result_cache_disk_bytes,
+)
+_workflow_fingerprint: Optional[str] = None
+
+
+def _seeded_cache_key(image_bytes: bytes, prompt: str, steps: int, denoise: float, hd: bool, seed: int) -> str:
+    global _workflow_fingerprint
+    if _workflow_fingerprint is None:
+        # Results depend on the workflow graph; mock output must never mix with real
+        if settings.dev_mode:
+            _workflow_fingerprint = "dev-mode"
+        else:
+            path = Path(settings.workflow_template)
+            _workflow_fingerprint = hashlib.sha256(path.read_bytes()).hexdigest() if path.exists() else ""
+    return cache_key(image_bytes, prompt, steps, denoise, hd, seed, _workflow_fingerprint)
+
 
-# Per-IP rate limiting: bucket -> ip_hash -> deque of request timestamps
-_rate_limits: dict[str, dict[str, collections.deque]] = {}
+SSE_MAX_JOBS = 256  # one live sketch plus a full 128-variation batch, with headroom
+SSE_KEEPALIVE_SECONDS = 15.0
+
+# Per-IP rate limiting, one GCRA bucket per route family
+rate_limiter = RateLimiter(max_keys=settings.rate_limit_max_keys)
 
 
 def _check_rate_limit(
@@ -129,58 +101,47 @@ def _check_rate_limit(
     max_req: Optional[int] = None,
 ) -> bool:
     """Return True if the request is allowed, False if rate-limited."""
-    now = time.monotonic()
     window = window if window is not None else settings.rate_limit_window
     max_req = max_req if max_req is not None else settings.rate_limit_max
-
-    if bucket not in _rate_limits:
-        _rate_limits[bucket] = {}
-    limits = _rate_limits[bucket]
-
-    if ip_hash not in limits:
-        limits[ip_hash] = collections.deque()
-
-    dq = limits[ip_hash]
-    while dq and dq[0] <= now - window:
-        dq.popleft()
-
-    if len(dq) >= max_req:
-        return False
-    dq.append(now)
-    return True
-
-
-def _evict_old_jobs():
-    """Remove oldest completed/failed jobs if store exceeds MAX_JOBS."""
-    if len(jobs) <= MAX_JOBS:
-        return
-    terminal = [
-        j for j in jobs.values()
-        if j.status in (JobStatus.completed, JobStatus.failed, JobStatus.cancelled)
-    ]
-    terminal.sort(key=lambda j: j.created_at)
-    while len(jobs) > MAX_JOBS and terminal:
-        old = terminal.pop(0)
-        jobs.pop(old.job_id, None)
+    return rate_limiter.allow(ip_hash, bucket, window, max_req)
 
 
 # ---------------------------------------------------------------------------
 # App lifecycle & client
 # ---------------------------------------------------------------------------
 
-client = MockComfyUIClient() if settings.dev_mode else ComfyUIClient()
+client = MockComfyUIClient() if settings.dev_mode else ComfyUIPool(settings.comfyui_backend_urls())
 tracker: UsageTracker
+job_events = JobEventBus()
+ingestor = SketchIngestor(settings.ingest_workers, settings.sketch_normalize_size)
+transcoder = Transcoder(settings.transcode_workers, settings.transcode_cache_bytes)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global tracker
-    tracker = UsageTracker(settings.usage_db, settings.usage_salt)
+    tracker = UsageTracker(
+        settings.usage_db,
+        settings.usage_salt,
+        flush_interval=settings.usage_flush_interval,
+        flush_max=settings.usage_flush_max,
+        stats_ttl=settings.usage_stats_ttl,
+        retention_days=settings.usage_retention_days,
+        archive_dir=settings.usage_archive_dir,
+        maintenance_interval=settings.usage_maintenance_interval,
+    )
     await client.start()
+    await scheduler.start()
+    sweeper = asyncio.create_task(rate_limiter.run_sweeper(settings.rate_limit_sweep_interval))
     if settings.dev_mode:
         print("  [DEV MODE] Mock ComfyUI client active — no GPU required")
     yield
+    sweeper.cancel()
+    await scheduler.close()
     await client.close()
+    ingestor.close()
+    transcoder.close()
+    tracker.close()
 
 
 app = FastAPI(title="Pencil Flux Klein", lifespan=lifespan)
@@ -198,6 +159,43 @@ app.add_middleware(
 # ---------------------------------------------------------------------------
 
 
+def _status_payload(job: Job) -> dict:
+    return JobStatusResponse(
+        job_id=job.job_id,
+        status=job.status,
+        error=job.error,
+        elapsed_seconds=round(time.time() - job.created_at, 2),
+        sketch_bytes_saved=job.sketch_bytes_saved,
+    ).model_dump(mode="json")
+
+
+def _set_status(job: Job, status: JobStatus):
+    """Move a job to a new status and notify event subscribers. Cancelled is final."""
+    if job.status == JobStatus.cancelled or job.status == status:
+        return
+    jobs.set_status(job, status)
+    job_events.publish(job.job_id, _status_payload(job))
+
+
+_thumbnail_tasks: dict[str, asyncio.Task] = {}
+
+
+def _thumbnails(job: Job, png_bytes: bytes) -> asyncio.Task:
+    """Build (once) and attach the job's thumbnails in the background."""
+    task = _thumbnail_tasks.get(job.job_id)
+    if task is None:
+        async def build():
+            try:
+                jobs.save_thumbnails(job, await transcoder.run(make_thumbnails, png_bytes))
+            except Exception:
+                pass  # undecodable result; the thumb route reports it as unavailable
+            finally:
+                del _thumbnail_tasks[job.job_id]
+
+        task = _thumbnail_tasks[job.job_id] = asyncio.create_task(build())
+    return task
+
+
 async def _run_generation(job: Job, image_bytes: bytes, prompt: str, steps: int, denoise: float, hd: bool, seed: Optional[int]):
     try:
         png_bytes = await client.generate(
@@ -207,18 +205,70 @@ async def _run_generation(job: Job, image_bytes: bytes, prompt: str, steps: int,
             denoise=denoise,
             seed=seed,
             hd=hd,
-            on_status=lambda s: setattr(job, "status", s),
+            on_status=lambda s: _set_status(job, s),
         )
+        if seed is not None:
+            await result_cache.put(
+                _seeded_cache_key(image_bytes, prompt, steps, denoise, hd, seed), png_bytes,
+            )
         if job.status == JobStatus.cancelled:
             return
-        job.result_image = png_bytes
-        job.status = JobStatus.completed
+        await jobs.save_result(job, png_bytes)
+        if job.status == JobStatus.cancelled:  # cancelled while the result was being stored
+            jobs.discard_result(job)
+            return
+        _set_status(job, JobStatus.completed)
+        _thumbnails(job, png_bytes)
     except (ComfyUIError, TimeoutError, httpx.ConnectError) as exc:
         job.error = str(exc)
-        job.status = JobStatus.failed
+        _set_status(job, JobStatus.failed)
     except Exception as exc:
         job.error = f"Unexpected error: {exc}"
-        job.status = JobStatus.failed
+        _set_status(job, JobStatus.failed)
+
+
+async def _run_batch_generation(batch: list[Job], image_bytes: bytes, prompt: str, steps: int, denoise: float, seed: Optional[int]):
+    def _set_batch_status(status):
+        for job in batch:
+            _set_status(job, status)
+
+    try:
+        results = await client.generate_batch(
+            image_bytes=image_bytes,
+            prompt=prompt,
+            steps=steps,
+            denoise=denoise,
+            seed=seed,
+            count=len(batch),
+            on_status=_set_batch_status,
+        )
+        for job, png_bytes in zip(batch, results):
+            if job.status == JobStatus.cancelled:
+                continue
+            await jobs.save_result(job, png_bytes)
+            _set_status(job, JobStatus.completed)
+            _thumbnails(job, png_bytes)
+    except Exception as exc:
+        error = str(exc) if isinstance(exc, (ComfyUIError, TimeoutError, httpx.ConnectError)) else f"Unexpected error: {exc}"
+        for job in batch:
+            if job.status != JobStatus.cancelled:
+                job.error = error
+                _set_status(job, JobStatus.failed)
+
+
+scheduler = GenerationScheduler(
+    _run_generation,
+    max_queue=settings.queue_max_size,
+    concurrency=settings.comfyui_max_concurrent * len(settings.comfyui_backend_urls()),
+)
+
+
+def _queue_full(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Generation queue is full, try again shortly",
+        headers={"Retry-After": str(retry_after)},
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -226,17 +276,20 @@ async def _run_generation(job: Job, image_bytes: bytes, prompt: str, steps: int,
 # ---------------------------------------------------------------------------
 
 
+static_files = PrecompressedStaticFiles(directory="static")
+
+
 @app.get("/")
-async def root():
-    return FileResponse("static/landing.html", media_type="text/html")
+async def root(request: Request):
+    return await static_files.get_response("landing.html", request.scope)
 
 
 @app.get("/app")
-async def app_page():
-    return FileResponse("static/index.html", media_type="text/html")
+async def app_page(request: Request):
+    return await static_files.get_response("index.html", request.scope)
 
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_files, name="static")
 
 
 @app.get("/api/config")
@@ -261,12 +314,12 @@ async def health():
         reachable = await client.health_check()
         return HealthResponse(
             comfyui_reachable=reachable,
-            comfyui_url=settings.comfyui_url,
+            comfyui_url=",".join(settings.comfyui_backend_urls()),
         )
     except Exception as exc:
         return HealthResponse(
             comfyui_reachable=False,
-            comfyui_url=settings.comfyui_url,
+            comfyui_url=",".join(settings.comfyui_backend_urls()),
             error=str(exc),
         )
 
@@ -274,23 +327,56 @@ async def health():
 @app.get("/api/sketches", response_model=list[SketchInfo])
 async def list_sketches():
     return [
-        SketchInfo(id=k, name=v["name"], default_prompt=v["default_prompt"])
-        for k, v in PRESETS.items()
+        SketchInfo(id=p.id, name=p.name, default_prompt=p.default_prompt, version=p.etag)
+        for p in PRESETS.values()
     ]
 
 
 @app.get("/api/sketches/{sketch_id}")
-async def get_sketch(sketch_id: str):
+async def get_sketch(sketch_id: str, request: Request, v: Optional[str] = Query(None, description="Preset version")):
+    """The preset PNG. Versioned URLs (see /api/sketches) are immutable; bare ones revalidate."""
     if sketch_id not in PRESETS:
         raise HTTPException(status_code=404, detail=f"Unknown sketch: {sketch_id}")
+    preset = PRESETS[sketch_id]
+    # Loading verifies the file against its manifest hash, so read it before
+    # trusting preset.etag; a stale hash must never be served as immutable
+    image_bytes = preset.image_bytes
+    headers = cache_headers(preset.etag, IMMUTABLE if v == preset.etag else REVALIDATE)
+    if (cached := not_modified(request.headers, headers)) is not None:
+        return cached
     return Response(
-        content=PRESETS[sketch_id]["image_bytes"],
+        content=image_bytes,
         media_type="image/png",
+        headers=headers,
     )
 
 
-@app.post("/api/generate", response_model=GenerateResponse)
-async def generate(req: GenerateRequest, request: Request):
+async def _resolve_sketch(sketch: str, prompt: Optional[str]) -> tuple[bytes, str, Optional[IngestResult]]:
+    """Return (png_bytes, prompt, ingest result) for a preset ID or a base64-encoded image."""
+    if sketch in PRESETS:
+        preset = PRESETS[sketch]
+        return preset.image_bytes, prompt or preset.default_prompt, None
+    # Treat as base64-encoded image; decoding and validation run on the ingest pool
+    try:
+        result = await ingestor.ingest(sketch, settings.max_image_size)
+    except IngestError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return result.image_bytes, prompt or settings.default_prompt, result
+
+
+def _check_daily_limit(ip_hash: str, count: int = 1):
+    """Raise 429 if `count` more generations would exceed the daily free limit."""
+    if settings.daily_free_limit > 0:
+        used_today = tracker.get_today(ip_hash)
+        if used_today + count > settings.daily_free_limit:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Daily limit reached: {settings.daily_free_limit} free generations per day",
+            )
+
+
+def _admit(request: Request, count: int = 1) -> str:
+    """Apply rate and daily limits for `count` generations; return the IP hash."""
     ip = get_client_ip(request)
     ip_hash = hash_ip(ip, settings.usage_salt)
 
@@ -300,88 +386,285 @@ async def generate(req: GenerateRequest, request: Request):
             detail=f"Rate limited: max {settings.rate_limit_max} requests per {settings.rate_limit_window}s",
         )
 
-    # Daily free limit enforcement
-    if settings.daily_free_limit > 0:
-        used_today = tracker.get_today(ip_hash)
-        if used_today >= settings.daily_free_limit:
-            raise HTTPException(
-                status_code=429,
-                detail=f"Daily limit reached: {settings.daily_free_limit} free generations per day",
-            )
+    _check_daily_limit(ip_hash, count)
 
-    tracker.record(ip_hash)
+    # The queue limit is applied later, once a cached result can't serve the request
+    return ip_hash
 
-    # Resolve sketch image bytes
-    if req.sketch in PRESETS:
-        image_bytes = PRESETS[req.sketch]["image_bytes"]
-        prompt = req.prompt or PRESETS[req.sketch]["default_prompt"]
-    else:
-        # Treat as base64-encoded image
-        try:
-            image_bytes = base64.b64decode(req.sketch)
-        except Exception:
-            raise HTTPException(status_code=400, detail="sketch must be a preset ID or valid base64")
-        if len(image_bytes) > settings.max_image_size:
-            raise HTTPException(status_code=400, detail=f"Image exceeds {settings.max_image_size} bytes")
-        # Validate with Pillow and re-encode as PNG
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            img.verify()
-            # Re-open after verify (verify consumes the stream)
-            img = Image.open(io.BytesIO(image_bytes))
-            buf = io.BytesIO()
-            img.save(buf, format="PNG")
-            image_bytes = buf.getvalue()
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid image data")
-        prompt = req.prompt or settings.default_prompt
+
+@app.post("/api/generate", response_model=GenerateResponse)
+async def generate(req: GenerateRequest, request: Request, response: Response):
+    ip_hash = _admit(request)
+    image_bytes, prompt, ingested = await _resolve_sketch(req.sketch, req.prompt)
+    return await _start_generation(req, ip_hash, image_bytes, prompt, ingested, response)
+
+
+@app.post("/api/generate/raw", response_model=GenerateResponse)
+async def generate_raw(request: Request, response: Response, params: Annotated[GenerateParams, Query()]):
+    """Like /api/generate, but the sketch is the raw request body (e.g. `image/png`).
+
+    Parameters travel as query fields, so there is no base64 or JSON to parse,
+    and the body is streamed so an oversized upload is refused as soon as it
+    crosses `max_image_size` instead of after it has been buffered.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and not (content_type.startswith("image/") or content_type == "application/octet-stream"):
+        raise HTTPException(status_code=415, detail="Send the sketch as an image/* request body")
+    ip_hash = _admit(request)
+    body = await _read_limited_body(request, settings.max_image_size)
+
+    try:
+        ingested = await ingestor.ingest(body, settings.max_image_size)
+    except IngestError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    prompt = params.prompt or settings.default_prompt
+    return await _start_generation(params, ip_hash, ingested.image_bytes, prompt, ingested, response)
+
+
+async def _read_limited_body(request: Request, limit: int) -> bytes:
+    """Read the request body, raising 413 as soon as it exceeds `limit` bytes."""
+    too_large = HTTPException(status_code=413, detail=f"Image exceeds {limit} bytes")
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > limit:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty request body")
+    return bytes(body)
+
+
+# Live-sketch sessions, keyed by client IP hash and session key: jobs that may
+# still run, oldest first. Least recently used sessions are forgotten first.
+_sessions: collections.OrderedDict[str, list[Job]] = collections.OrderedDict()
+MAX_SESSIONS = 10_000
+
+
+def _supersede(session_key: str, running: bool) -> list[str]:
+    """Cancel a session's older jobs that are still queued (and in flight, if `running`).
+
+    Runs without awaiting, so no older job can be dispatched between the
+    check and its cancellation. Returns the cancelled job IDs.
+    """
+    superseded = []
+    live = []
+    for job in _sessions.pop(session_key, []):
+        if job.status in TERMINAL:
+            continue
+        if job.dispatched_at is None or running:
+            _cancel(job)
+            superseded.append(job.job_id)
+        else:
+            live.append(job)
+    _sessions[session_key] = live
+    while len(_sessions) > MAX_SESSIONS:
+        _sessions.popitem(last=False)
+    return superseded
+
+
+async def _start_generation(
+    params: GenerateParams,
+    ip_hash: str,
+    image_bytes: bytes,
+    prompt: str,
+    ingested: Optional[IngestResult],
+    response: Response,
+) -> GenerateResponse:
+    """Create a job for a resolved sketch and queue it (or serve it from the result cache).
+
+    Usage is recorded only once the job is queued or served.
+
+    With a session key, the new job supersedes the session's older ones once it
+    is sure to be accepted.
+    """
+    if ingested is not None:
+        response.headers["Server-Timing"] = server_timing(ingested.timings)
+
+    # Seeded requests are deterministic: serve repeats without touching the GPU
+    cached = None
+    if params.seed is not None:
+        cached = await result_cache.get(
+            _seeded_cache_key(image_bytes, prompt, params.steps, params.denoise, params.hd, params.seed),
+        )
+
+    # Nothing from here until the generation is recorded awaits, so this
+    # re-check can't race other requests from the same client that were
+    # admitted while this sketch was being ingested
+    _check_daily_limit(ip_hash)
 
     # Create job
     job_id = uuid.uuid4().hex
     job = Job(job_id)
-    jobs[job_id] = job
-    _evict_old_jobs()
-
-    # Launch background generation
-    asyncio.create_task(
-        _run_generation(job, image_bytes, prompt, req.steps, req.denoise, req.hd, req.seed)
-    )
+    if ingested is not None:
+        job.sketch_bytes_saved = ingested.bytes_saved
+
+    # Scoped to the client so a guessed session key can't cancel someone else's jobs
+    session_key = f"{ip_hash}:{params.session}" if params.session else None
+
+    if cached is not None:
+        jobs.add(job)
+        superseded = _supersede(session_key, params.supersede_running) if session_key else []
+        tracker.record(ip_hash)
+        await jobs.save_result(job, cached)
+        jobs.set_status(job, JobStatus.completed)
+        _thumbnails(job, cached)
+        return GenerateResponse(job_id=job_id, status=job.status, superseded=superseded)
+
+    # Refuse before superseding, so a 503 never costs the client its older jobs.
+    # Only queued jobs hand their queue slot back straight away.
+    freed = sum(
+        1 for j in _sessions.get(session_key, ()) if j.status not in TERMINAL and j.dispatched_at is None
+    ) if session_key else 0
+    if scheduler.depth - freed >= scheduler.max_queue:
+        raise _queue_full(scheduler.retry_after())
+    superseded = _supersede(session_key, params.supersede_running) if session_key else []
+
+    # Queue for dispatch once a GPU slot is free
+    jobs.add(job)
+    try:
+        scheduler.submit(job, image_bytes, prompt, params.steps, params.denoise, params.hd, params.seed)
+    except QueueFullError as exc:
+        jobs.remove(job_id)
+        raise _queue_full(exc.retry_after)
+    # Only now is the generation certain to happen, so only now does it count
+    tracker.record(ip_hash)
+    if session_key:
+        _sessions.setdefault(session_key, []).append(job)
+
+    return GenerateResponse(job_id=job_id, status=job.status, superseded=superseded)
+
+
+@app.post("/api/generate/batch", response_model=BatchGenerateResponse)
+async def generate_batch(req: BatchGenerateRequest, request: Request):
+    """Render `count` variations of one sketch, batched into as few ComfyUI prompts as possible.
+
+    Each variation gets its own job ID, usable with the status/result/cancel routes.
+    """
+    ip_hash = _admit(request, req.count)
+    image_bytes, prompt, ingested = await _resolve_sketch(req.sketch, req.prompt)
+
+    batch = [Job(uuid.uuid4().hex) for _ in range(req.count)]
+    if ingested is not None:
+        for job in batch:
+            job.sketch_bytes_saved = ingested.bytes_saved
+    size = max(1, settings.batch_max_size)
+    chunks = [batch[i:i + size] for i in range(0, len(batch), size)]
+    if scheduler.depth + len(chunks) > scheduler.max_queue:
+        raise _queue_full(scheduler.retry_after())
+    # Other requests may have used the quota while the sketch was ingested;
+    # nothing between this check and the record awaits
+    _check_daily_limit(ip_hash, req.count)
+
+    tracker.record(ip_hash, req.count)
+    for job in batch:
+        jobs.add(job)
+
+    for i, chunk in enumerate(chunks):
+        seed = req.seed + i if req.seed is not None else None
+        scheduler.submit_group(
+            chunk, _run_batch_generation, chunk, image_bytes, prompt, req.steps, req.denoise, seed,
+        )
 
-    return GenerateResponse(job_id=job_id, status=job.status)
+    return BatchGenerateResponse(job_ids=[j.job_id for j in batch], status=JobStatus.queued)
 
 
 @app.get("/api/status/{job_id}", response_model=JobStatusResponse)
 async def job_status(job_id: str):
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
-    job = jobs[job_id]
-    return JobStatusResponse(
-        job_id=job.job_id,
-        status=job.status,
-        error=job.error,
-        elapsed_seconds=round(time.time() - job.created_at, 2),
+    return _status_payload(jobs[job_id])
+
+
+@app.get("/api/events")
+async def job_event_stream(job_ids: str = Query(..., alias="jobs", description="Comma-separated job IDs")):
+    """Server-Sent Events stream of status transitions for the given jobs.
+
+    Sends the current status of every job on connect, then a ``status`` event
+    per transition and a ``complete`` event once a job reaches a terminal
+    state. The stream ends when all jobs are terminal.
+    """
+    ids = list(dict.fromkeys(j for j in job_ids.split(",") if j))
+    if not ids:
+        raise HTTPException(status_code=400, detail="jobs must list at least one job ID")
+    if len(ids) > SSE_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"At most {SSE_MAX_JOBS} jobs per stream")
+
+    def _complete(job_id: str, payload: dict) -> str:
+        data = dict(payload)
+        if payload["status"] == JobStatus.completed.value:
+            data["result_url"] = f"/api/result/{job_id}"
+        return format_sse("complete", data)
+
+    async def stream():
+        # Subscribe before the snapshot so no transition falls in between
+        queue = job_events.subscribe(ids)
+        try:
+            pending = set()
+            for job_id in ids:
+                job = jobs.get(job_id)
+                if job is None:
+                    yield format_sse("error", {"job_id": job_id, "detail": f"Unknown job: {job_id}"})
+                    continue
+                payload = _status_payload(job)
+                yield format_sse("status", payload)
+                if job.status in TERMINAL:
+                    yield _complete(job_id, payload)
+                else:
+                    pending.add(job_id)
+            while pending:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                job_id = payload["job_id"]
+                if job_id not in pending:
+                    continue
+                yield format_sse("status", payload)
+                if JobStatus(payload["status"]) in TERMINAL:
+                    pending.discard(job_id)
+                    yield _complete(job_id, payload)
+        finally:
+            job_events.unsubscribe(queue, ids)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.post("/api/cancel/{job_id}")
 async def cancel_job(job_id: str):
+    """Cancel a job and stop its generation, withdrawing the prompt from ComfyUI.
+
+    `gpu_seconds_saved` estimates the GPU time this freed, from the average
+    job duration; it is 0 for batch variations while others in the same
+    prompt are still wanted.
+    """
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
     job = jobs[job_id]
     if job.status in (JobStatus.completed, JobStatus.failed, JobStatus.cancelled):
-        return {"job_id": job_id, "status": job.status}
-    job.status = JobStatus.cancelled
-    job.result_image = None
-    return {"job_id": job_id, "status": job.status}
+        return {"job_id": job_id, "status": job.status, "gpu_seconds_saved": 0.0}
+    saved = _cancel(job)
+    return {"job_id": job_id, "status": job.status, "gpu_seconds_saved": round(saved, 2)}
+
+
+def _cancel(job: Job) -> float:
+    """Cancel a live job and stop its generation; returns the estimated GPU seconds saved."""
+    _set_status(job, JobStatus.cancelled)
+    jobs.discard_result(job)
+    return scheduler.cancel(job)
 
 
 @app.get("/api/gpu")
 async def gpu_stats():
-    """Proxy ComfyUI /system_stats for GPU/VRAM info and include job queue counts."""
-    active_jobs = sum(
-        1 for j in jobs.values()
-        if j.status not in (JobStatus.completed, JobStatus.failed, JobStatus.cancelled)
-    )
+    """Proxy ComfyUI /system_stats for GPU/VRAM info and include job queue and per-backend counts."""
+    active_jobs = jobs.active_count()
     if settings.dev_mode:
         vram_total = 24 * 1024**3  # 24 GB simulated
         vram_used = 8 * 1024**3
@@ -392,10 +675,20 @@ async def gpu_stats():
             "torch_vram_total": vram_total,
             "torch_vram_free": vram_total - vram_used,
             "active_jobs": active_jobs,
+            "queued_jobs": scheduler.depth,
+            "scheduler": scheduler.stats(),
+            "result_cache": result_cache.stats(),
+            "job_store": jobs.stats(),
         }
-    try:
-        resp = await client._client.get("/system_stats")
-        data = resp.json()
+    backends = client.stats()
+    # Top-level GPU fields describe the first healthy backend, for the existing UI
+    for backend in client.backends:
+        if not backend.healthy:
+            continue
+        try:
+            data = await backend.system_stats()
+        except Exception:
+            continue
         devices = data.get("devices", [])
         gpu = devices[0] if devices else {}
         return {
@@ -405,20 +698,35 @@ async def gpu_stats():
             "torch_vram_total": gpu.get("torch_vram_total", 0),
             "torch_vram_free": gpu.get("torch_vram_free", 0),
             "active_jobs": active_jobs,
+            "queued_jobs": scheduler.depth,
+            "scheduler": scheduler.stats(),
+            "result_cache": result_cache.stats(),
+            "job_store": jobs.stats(),
+            "backends": backends,
         }
-    except Exception:
-        return {
-            "gpu_name": "Unavailable",
-            "vram_total": 0,
-            "vram_free": 0,
-            "torch_vram_total": 0,
-            "torch_vram_free": 0,
-            "active_jobs": active_jobs,
-        }
+    return {
+        "gpu_name": "Unavailable",
+        "vram_total": 0,
+        "vram_free": 0,
+        "torch_vram_total": 0,
+        "torch_vram_free": 0,
+        "active_jobs": active_jobs,
+        "queued_jobs": scheduler.depth,
+        "scheduler": scheduler.stats(),
+        "result_cache": result_cache.stats(),
+        "job_store": jobs.stats(),
+        "backends": backends,
+    }
 
 
 @app.get("/api/result/{job_id}")
-async def job_result(job_id: str):
+async def job_result(
+    job_id: str,
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", description="png, webp or avif; overrides Accept"),
+    quality: Optional[int] = Query(None, ge=1, le=100),
+):
+    """The finished image, as WebP or AVIF when the client asks for it."""
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
     job = jobs[job_id]
@@ -427,34 +735,85 @@ async def job_result(job_id: str):
             status_code=409,
             detail=f"Job not completed (status: {job.status.value})",
         )
-    return Response(content=job.result_image, media_type="image/png")
+    formats = available_formats()
+    vary = None
+    if fmt is None:
+        fmt = negotiate(request.headers.get("accept", ""), formats)
+        vary = "Accept"
+    elif fmt not in formats:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(formats)}")
+    if fmt != "png" and quality is None:
+        quality = settings.result_avif_quality if fmt == "avif" else settings.result_webp_quality
+
+    # A job's result never changes, so its content hash plus the rendition is a strong ETag
+    etag = job.result_etag if fmt == "png" else f"{job.result_etag}-{fmt}-{quality}"
+    headers = cache_headers(etag, PRIVATE_IMMUTABLE, vary)
+    if (cached := not_modified(request.headers, headers)) is not None:
+        jobs.touch(job)
+        return cached
+
+    if fmt == "png":
+        jobs.touch(job)
+        if job.result_path is not None:
+            # Spilled results stream from disk instead of being read into memory
+            return FileResponse(job.result_path, media_type="image/png", headers=headers)
+        return Response(content=job.result_image, media_type="image/png", headers=headers)
+
+    data = await jobs.read_result(job)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Result no longer available")
+    body = await transcoder.get(job_id, data, fmt, quality)
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@app.get("/api/result/{job_id}/thumb")
+async def job_thumbnail(
+    job_id: str,
+    request: Request,
+    size: int = Query(128, description="Longest side: 64, 128 or 256"),
+):
+    """A small WebP preview of the result, for variation strips and history."""
+    if size not in THUMB_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(map(str, THUMB_SIZES))}")
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    job = jobs[job_id]
+    if job.status != JobStatus.completed:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job not completed (status: {job.status.value})",
+        )
+    jobs.touch(job)
+    headers = cache_headers(f"{job.result_etag}-thumb{size}", PRIVATE_IMMUTABLE)
+    if (cached := not_modified(request.headers, headers)) is not None:
+        return cached
+    if job.thumbnails is None:
+        # Normally built when the job completed; wait for that, or rebuild it
+        task = _thumbnail_tasks.get(job_id)
+        if task is None:
+            data = await jobs.read_result(job)
+            if data is None:
+                raise HTTPException(status_code=404, detail="Result no longer available")
+            task = _thumbnails(job, data)
+        await asyncio.shield(task)
+    if job.thumbnails is None:
+        raise HTTPException(status_code=404, detail="Thumbnail unavailable")
+    return Response(content=job.thumbnails[size], media_type="image/webp", headers=headers)
 
 
 @app.get("/api/usage", response_model=UsageResponse)
 async def usage(request: Request):
     ip = get_client_ip(request)
     ip_hash = hash_ip(ip, settings.usage_salt)
-    today = tracker.get_today(ip_hash)
+    snap = tracker.snapshot(ip_hash)
     limit = settings.daily_free_limit
-    remaining = max(0, limit - today) if limit > 0 else -1
-    return UsageResponse(
-        today=today,
-        total=tracker.get_total(ip_hash),
-        daily_limit=limit,
-        remaining=remaining,
-        global_today=tracker.get_global_today(),
-        global_total=tracker.get_global_total(),
-        unique_users_today=tracker.get_unique_today(),
-    )
+    remaining = max(0, limit - snap["today"]) if limit > 0 else -1
+    return UsageResponse(daily_limit=limit, remaining=remaining, **snap)
 
 
 @app.get("/api/usage/stats")
 async def usage_stats():
-    return {
-        "global_today": tracker.get_global_today(),
-        "global_total": tracker.get_global_total(),
-        "unique_users_today": tracker.get_unique_today(),
-    }
+    return tracker.global_stats()
 
 
 # ---------------------------------------------------------------------------
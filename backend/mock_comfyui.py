@@ -2,9 +2,11 @@ import asyncio
 import io
 import random
 import textwrap
+import uuid
 from typing import Callable, Optional
 
-from PIL import Image, ImageDraw, ImageFont
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
 
 from .config import settings
 from .models import JobStatus
@@ -26,6 +28,8 @@ class MockComfyUIClient:
     def _render_synthetic_image(
         self, prompt: str, width: int, height: int, seed: Optional[int]
     ) -> bytes:
+        from PIL import Image, ImageDraw
+
         rng = random.Random(seed if seed is not None else random.randint(0, 2**32))
 
         img = Image.new("RGB", (width, height))
@@ -98,3 +102,205 @@ class MockComfyUIClient:
 
         width, height = (1024, 1024) if hd else (512, 512)
         return self._render_synthetic_image(prompt, width, height, seed)
+
+    async def generate_batch(
+        self,
+        image_bytes: bytes,
+        prompt: str,
+        steps: int,
+        denoise: float,
+        seed: Optional[int],
+        count: int,
+        on_status: Optional[Callable] = None,
+    ) -> list[bytes]:
+        def _set(status: JobStatus):
+            if on_status:
+                on_status(status)
+
+        _set(JobStatus.uploading)
+        await asyncio.sleep(settings.dev_mode_delay * 0.1)
+
+        _set(JobStatus.processing)
+        await asyncio.sleep(settings.dev_mode_delay * 0.7)
+
+        _set(JobStatus.downloading)
+        await asyncio.sleep(settings.dev_mode_delay * 0.2)
+
+        base = seed if seed is not None else random.randint(0, 2**32)
+        return [self._render_synthetic_image(prompt, 512, 512, base + i) for i in range(count)]
+
+
+def create_mock_server(delay: float = 0.05) -> FastAPI:
+    """A local HTTP + WebSocket stand-in for a ComfyUI server.
+
+    Speaks the subset of the ComfyUI API that ComfyUIClient uses
+    (/upload/image, /prompt, /history, /view, /queue, /interrupt, /system_stats, /ws) and runs
+    prompts one at a time like a single GPU, rendering the same synthetic images as
+    MockComfyUIClient. Used by the tests to exercise the real client.
+    """
+    app = FastAPI(title="Mock ComfyUI")
+    renderer = MockComfyUIClient()
+    uploads: dict[str, bytes] = {}
+    outputs: dict[str, bytes] = {}
+    history: dict[str, dict] = {}
+    sockets: dict[str, WebSocket] = {}
+    gpu = asyncio.Lock()
+    queue: dict[str, list] = {"running": [], "pending": []}
+    tasks: dict[str, asyncio.Task] = {}
+    app.state.uploads = uploads
+    app.state.history = history
+    app.state.sockets = sockets
+    app.state.prompt_count = 0
+    app.state.history_requests = 0
+    app.state.queue = queue
+    app.state.deleted = []  # prompt IDs removed via POST /queue
+    app.state.interrupted = []  # prompt IDs stopped via POST /interrupt
+
+    async def _send(client_id: Optional[str], event_type: str, data: dict):
+        ws = sockets.get(client_id) if client_id else None
+        if ws is None:
+            return
+        try:
+            await ws.send_json({"type": event_type, "data": data})
+        except Exception:
+            sockets.pop(client_id, None)
+
+    async def _execute(entry: list, workflow: dict, client_id: Optional[str]):
+        prompt_id = entry[1]
+        try:
+            async with gpu:
+                queue["pending"].remove(entry)
+                queue["running"].append(entry)
+                try:
+                    await _run(prompt_id, workflow, client_id)
+                except asyncio.CancelledError:
+                    message = "Processing interrupted"
+                    history[prompt_id] = {
+                        "outputs": {},
+                        "status": {"status_str": "error", "completed": False, "messages": [message]},
+                    }
+                    await _send(client_id, "execution_interrupted", {"prompt_id": prompt_id, "node_id": "12"})
+                finally:
+                    queue["running"].remove(entry)
+        except asyncio.CancelledError:
+            pass  # deleted while pending
+        finally:
+            tasks.pop(prompt_id, None)
+
+    async def _run(prompt_id: str, workflow: dict, client_id: Optional[str]):
+        await _send(client_id, "execution_start", {"prompt_id": prompt_id})
+        await _send(client_id, "executing", {"node": "1", "prompt_id": prompt_id})
+        image_name = workflow["1"]["inputs"]["image"]
+        if image_name not in uploads:
+            message = f"Invalid image file: {image_name}"
+            history[prompt_id] = {
+                "outputs": {},
+                "status": {"status_str": "error", "completed": False, "messages": [message]},
+            }
+            await _send(client_id, "execution_error", {
+                "prompt_id": prompt_id, "node_id": "1", "exception_message": message,
+            })
+            return
+        await asyncio.sleep(delay)
+        width = workflow["16"]["inputs"]["width"]
+        height = workflow["16"]["inputs"]["height"]
+        # RepeatLatentBatch (node 17), if present, sets how many images come out
+        batch_size = workflow.get("17", {}).get("inputs", {}).get("amount", 1)
+        seed = workflow["8"]["inputs"]["noise_seed"]
+        images = []
+        for i in range(batch_size):
+            filename = f"{workflow['14']['inputs']['filename_prefix']}_{prompt_id[:8]}_{i:05}.png"
+            outputs[filename] = renderer._render_synthetic_image(
+                workflow["6"]["inputs"]["text"], width, height, seed + i,
+            )
+            images.append({"filename": filename, "subfolder": "", "type": "output"})
+        node_output = {"images": images}
+        history[prompt_id] = {
+            "outputs": {"14": node_output},
+            "status": {"status_str": "success", "completed": True, "messages": []},
+        }
+        await _send(client_id, "executed", {"node": "14", "output": node_output, "prompt_id": prompt_id})
+        await _send(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+
+    @app.get("/")
+    async def index():
+        return {"mock": True}
+
+    @app.post("/upload/image")
+    async def upload_image(image: UploadFile = File(...), overwrite: str = Form("false")):
+        uploads[image.filename] = await image.read()
+        return {"name": image.filename, "subfolder": "", "type": "input"}
+
+    @app.post("/prompt")
+    async def prompt(request: Request):
+        body = await request.json()
+        workflow = body.get("prompt")
+        if not isinstance(workflow, dict):
+            return {"error": {"type": "invalid_prompt", "message": "Missing prompt"}}
+        prompt_id = uuid.uuid4().hex
+        app.state.prompt_count += 1
+        entry = [app.state.prompt_count, prompt_id, workflow]
+        queue["pending"].append(entry)
+        tasks[prompt_id] = asyncio.create_task(_execute(entry, workflow, body.get("client_id")))
+        return {"prompt_id": prompt_id, "number": app.state.prompt_count}
+
+    @app.get("/queue")
+    async def get_queue():
+        return {"queue_running": queue["running"], "queue_pending": queue["pending"]}
+
+    @app.post("/queue")
+    async def edit_queue(request: Request):
+        body = await request.json()
+        for prompt_id in body.get("delete", []):
+            entry = next((e for e in queue["pending"] if e[1] == prompt_id), None)
+            if entry is not None:
+                queue["pending"].remove(entry)
+                tasks[prompt_id].cancel()
+                app.state.deleted.append(prompt_id)
+        return {}
+
+    @app.post("/interrupt")
+    async def interrupt(request: Request):
+        body = await request.json() if await request.body() else {}
+        for entry in queue["running"]:
+            # Like ComfyUI, a named prompt is only interrupted if it is the one executing
+            if body.get("prompt_id") in (None, entry[1]):
+                tasks[entry[1]].cancel()
+                app.state.interrupted.append(entry[1])
+        return {}
+
+    @app.get("/system_stats")
+    async def system_stats():
+        vram_total = 24 * 1024**3
+        return {"devices": [{
+            "name": "Mock GPU", "vram_total": vram_total, "vram_free": vram_total // 2,
+            "torch_vram_total": vram_total, "torch_vram_free": vram_total // 2,
+        }]}
+
+    @app.get("/history/{prompt_id}")
+    async def get_history(prompt_id: str):
+        app.state.history_requests += 1
+        return {prompt_id: history[prompt_id]} if prompt_id in history else {}
+
+    @app.get("/view")
+    async def view(filename: str, subfolder: str = "", type: str = "output"):
+        if filename not in outputs:
+            raise HTTPException(status_code=404)
+        return Response(content=outputs[filename], media_type="image/png")
+
+    @app.websocket("/ws")
+    async def ws_endpoint(websocket: WebSocket, clientId: Optional[str] = None):
+        await websocket.accept()
+        client_id = clientId or uuid.uuid4().hex
+        sockets[client_id] = websocket
+        await websocket.send_json({"type": "status", "data": {"sid": client_id}})
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if sockets.get(client_id) is websocket:
+                sockets.pop(client_id, None)
+
+    return app
@@ -16,18 +16,52 @@ class JobStatus(str, Enum):
     cancelled = "cancelled"
 
 
-class GenerateRequest(BaseModel):
-    sketch: str = Field(..., description="Preset ID (e.g. 'birds') or base64-encoded PNG")
+TERMINAL = (JobStatus.completed, JobStatus.failed, JobStatus.cancelled)
+
+
+class GenerateParams(BaseModel):
+    """Generation settings; sent as query fields by /api/generate/raw."""
+
     prompt: Optional[str] = None
     steps: int = Field(default=4, ge=1, le=50)
     denoise: float = Field(default=0.75, ge=0.0, le=1.0)
     hd: bool = Field(default=False, description="Two-pass HD: generate at 512 then refine at 1024")
     seed: Optional[int] = None
+    session: Optional[str] = Field(
+        default=None,
+        max_length=64,
+        description="Live-sketch session key: a new job cancels the session's older jobs still queued",
+    )
+    supersede_running: bool = Field(
+        default=False, description="With session: also interrupt the session's job already on the GPU"
+    )
+
+
+class GenerateRequest(GenerateParams):
+    sketch: str = Field(..., description="Preset ID (e.g. 'birds') or base64-encoded PNG")
 
 
 class GenerateResponse(BaseModel):
     job_id: str
     status: JobStatus
+    superseded: list[str] = Field(default_factory=list)  # same-session jobs this request cancelled
+
+
+class BatchGenerateRequest(BaseModel):
+    sketch: str = Field(..., description="Preset ID (e.g. 'birds') or base64-encoded PNG")
+    prompt: Optional[str] = None
+    steps: int = Field(default=4, ge=1, le=50)
+    denoise: float = Field(default=0.75, ge=0.0, le=1.0)
+    count: int = Field(default=16, ge=1, le=128, description="Number of variations")
+    seed: Optional[int] = Field(
+        default=None,
+        description="Base noise seed; each ComfyUI batch draws per-variation noise from it",
+    )
+
+
+class BatchGenerateResponse(BaseModel):
+    job_ids: list[str]
+    status: JobStatus
 
 
 class JobStatusResponse(BaseModel):
@@ -35,12 +69,14 @@ class JobStatusResponse(BaseModel):
     status: JobStatus
     error: Optional[str] = None
     elapsed_seconds: Optional[float] = None
+    sketch_bytes_saved: Optional[int] = None  # upload bytes trimmed by sketch normalisation
 
 
 class SketchInfo(BaseModel):
     id: str
     name: str
     default_prompt: str
+    version: str  # content hash; /api/sketches/{id}?v={version} is cacheable forever
 
 
 class HealthResponse(BaseModel):
@@ -57,6 +93,8 @@ class UsageResponse(BaseModel):
     global_today: int
     global_total: int
     unique_users_today: int
+    unique_users_7d: int  # approximate, see backend/hll.py
+    unique_users_30d: int
 
 
 class VisionRequest(BaseModel):
@@ -81,10 +119,31 @@ class PromptEnhanceResponse(BaseModel):
 class Job:
     """Mutable job state — not a Pydantic model so we can update in place."""
 
+    __slots__ = (
+        "job_id",
+        "status",
+        "result_image",
+        "result_path",
+        "result_size",
+        "error",
+        "comfyui_prompt_id",
+        "created_at",
+        "dispatched_at",
+        "sketch_bytes_saved",
+        "thumbnails",
+        "result_etag",
+    )
+
     def __init__(self, job_id: str):
         self.job_id = job_id
         self.status = JobStatus.queued
-        self.result_image: Optional[bytes] = None
+        self.result_image: Optional[bytes] = None  # in-memory result, unless spilled
+        self.result_path: Optional[str] = None  # spilled result on local disk
+        self.result_size = 0
         self.error: Optional[str] = None
         self.comfyui_prompt_id: Optional[str] = None
         self.created_at = time.time()
+        self.dispatched_at: Optional[float] = None  # left the scheduler queue
+        self.sketch_bytes_saved: Optional[int] = None
+        self.thumbnails: Optional[dict[int, bytes]] = None  # size -> WebP, evicted with the result
+        self.result_etag: Optional[str] = None  # content hash of the result PNG
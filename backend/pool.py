@@ -0,0 +1,184 @@
+"""Pool of ComfyUI backends with health tracking and least-loaded routing."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from .comfyui import ComfyUIClient, ComfyUIError
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ComfyUIPool:
+    """Drop-in replacement for a single ComfyUIClient that spreads jobs over N GPUs.
+
+    Each backend keeps its own httpx client, WebSocket and upload cache. A
+    background probe refreshes every backend's /queue depth and takes
+    unreachable ones out of rotation until they answer again. A backend that
+    was up has to miss several probes in a row before it is dropped, so one
+    slow /queue answer can't take a single-GPU deployment offline.
+
+    No backend ever runs more than ``max_concurrent`` of our jobs at once; a
+    job that finds every healthy backend full waits for a slot to free up.
+    """
+
+    def __init__(self, urls: list[str], max_concurrent: Optional[int] = None):
+        if not urls:
+            raise ValueError("ComfyUIPool needs at least one backend URL")
+        self.backends = [ComfyUIClient(url) for url in urls]
+        self.max_concurrent = settings.comfyui_max_concurrent if max_concurrent is None else max_concurrent
+        self._capacity = asyncio.Condition()  # notified when a slot frees or health changes
+        self._monitor: Optional[asyncio.Task] = None
+
+    async def start(self):
+        for backend in self.backends:
+            await backend.start()
+        # Nothing has answered yet, so don't wait for repeated misses here
+        await asyncio.gather(*(self._probe(b, unhealthy_after=1) for b in self.backends))
+        self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def close(self):
+        if self._monitor:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+        for backend in self.backends:
+            await backend.close()
+
+    async def _probe(self, backend: ComfyUIClient, unhealthy_after: Optional[int] = None):
+        try:
+            in_flight = backend.in_flight
+            backend.queue_depth = await backend.get_queue_depth()
+            # Only jobs in flight for the whole probe are surely in its count
+            backend.own_at_probe = min(in_flight, backend.in_flight)
+            if not backend.healthy:
+                logger.info("ComfyUI backend %s is back in rotation", backend.base_url)
+                backend.healthy = True
+                await self._notify()
+            backend.probe_failures = 0
+            backend.last_error = None
+        except Exception as exc:
+            backend.probe_failures += 1
+            backend.last_error = str(exc) or type(exc).__name__
+            if unhealthy_after is None:
+                unhealthy_after = settings.comfyui_unhealthy_after
+            if backend.healthy and backend.probe_failures >= unhealthy_after:
+                logger.warning("ComfyUI backend %s out of rotation: %s", backend.base_url, exc)
+                backend.healthy = False
+                await self._notify()
+
+    async def _notify(self):
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    async def refresh(self):
+        """Probe every backend's health and queue depth once."""
+        await asyncio.gather(*(self._probe(b) for b in self.backends))
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(settings.comfyui_health_interval)
+            await self.refresh()
+
+    async def health_check(self) -> bool:
+        await self.refresh()
+        return any(b.healthy for b in self.backends)
+
+    def _has_room(self, backend: ComfyUIClient) -> bool:
+        return self.max_concurrent <= 0 or backend.in_flight < self.max_concurrent
+
+    def pick(self, exclude: tuple[ComfyUIClient, ...] = ()) -> Optional[ComfyUIClient]:
+        """Least-loaded healthy backend with a free slot, or None if all are full."""
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            raise ComfyUIError("No healthy ComfyUI backends available")
+        free = [b for b in candidates if self._has_room(b)]
+        return min(free, key=lambda b: b.load) if free else None
+
+    async def _acquire(self, exclude: tuple[ComfyUIClient, ...]) -> ComfyUIClient:
+        """Claim a slot on the best backend, waiting while every healthy one is full."""
+        async with self._capacity:
+            while (backend := self.pick(exclude=exclude)) is None:
+                await self._capacity.wait()
+            backend.in_flight += 1
+            return backend
+
+    async def _dispatch(self, call: Callable[[ComfyUIClient], Awaitable]):
+        """Run `call(backend)` on the least-loaded backend.
+
+        A backend that refuses the connection is marked unhealthy and the call
+        is retried once on the next-best backend.
+        """
+        tried: tuple[ComfyUIClient, ...] = ()
+        while True:
+            backend = await self._acquire(tried)
+            try:
+                result = await call(backend)
+                backend.completed += 1
+                return result
+            except httpx.ConnectError as exc:
+                backend.healthy = False
+                backend.last_error = str(exc) or type(exc).__name__
+                backend.failed += 1
+                tried += (backend,)
+                if len(tried) > 1 or not any(b.healthy for b in self.backends):
+                    raise
+            except Exception:
+                backend.failed += 1
+                raise
+            finally:
+                backend.in_flight -= 1
+                await self._notify()
+
+    async def generate(
+        self,
+        image_bytes: bytes,
+        prompt: str,
+        steps: int,
+        denoise: float,
+        seed: Optional[int],
+        hd: bool = False,
+        on_status: Optional[Callable] = None,
+    ) -> bytes:
+        return await self._dispatch(lambda backend: backend.generate(
+            image_bytes, prompt, steps, denoise, seed, hd=hd, on_status=on_status,
+        ))
+
+    async def generate_batch(
+        self,
+        image_bytes: bytes,
+        prompt: str,
+        steps: int,
+        denoise: float,
+        seed: Optional[int],
+        count: int,
+        on_status: Optional[Callable] = None,
+    ) -> list[bytes]:
+        return await self._dispatch(lambda backend: backend.generate_batch(
+            image_bytes, prompt, steps, denoise, seed, count, on_status=on_status,
+        ))
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "url": b.base_url,
+                "healthy": b.healthy,
+                "probe_failures": b.probe_failures,
+                "websocket": b.ws_connected,
+                "queue_depth": b.queue_depth,
+                "in_flight": b.in_flight,
+                "max_concurrent": self.max_concurrent,
+                "completed": b.completed,
+                "failed": b.failed,
+                "last_error": b.last_error,
+                "upload_cache": b.upload_stats,
+                "cancelled_prompts": b.cancel_stats,
+            }
+            for b in self.backends
+        ]
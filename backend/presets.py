@@ -0,0 +1,160 @@
+"""Preset sketches, loaded lazily from a precomputed on-disk manifest.
+
+The manifest (``static/img/presets.json`` by default) lists each preset's
+ID, display name, default prompt, PNG file (relative to the manifest) and
+content hash, in display order. Nothing is read at import time: the manifest
+is parsed on first access and each preset's PNG only when its bytes are
+first needed, so listing presets or serving a cached ``ETag`` never touches
+the images.
+
+Adding a preset needs no code change: drop a PNG next to the manifest, add an
+entry with its ``id``, ``name``, ``default_prompt`` and ``file``, then run
+``python -m backend.presets`` to fill in the hash and dimensions. The same
+command redraws the house and face presets if their PNGs are missing.
+"""
+
+import json
+import logging
+import os
+import struct
+import sys
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .http_cache import content_etag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST = "static/img/presets.json"
+
+
+class Preset:
+    __slots__ = ("id", "name", "default_prompt", "path", "etag", "_image_bytes")
+
+    def __init__(self, preset_id: str, name: str, default_prompt: str, path: Path, etag: str):
+        self.id = preset_id
+        self.name = name
+        self.default_prompt = default_prompt
+        self.path = path
+        self.etag = etag  # content hash from the manifest; corrected if the file disagrees
+        self._image_bytes: Optional[bytes] = None
+
+    @property
+    def image_bytes(self) -> bytes:
+        if self._image_bytes is None:
+            data = self.path.read_bytes()
+            etag = content_etag(data)
+            if etag != self.etag:
+                logger.warning(
+                    "Preset %s: %s does not match its manifest hash; run `python -m backend.presets`",
+                    self.id,
+                    self.path,
+                )
+                self.etag = etag
+            self._image_bytes = data
+        return self._image_bytes
+
+
+class PresetRegistry(Mapping):
+    """Read-only mapping of preset ID to ``Preset``, in manifest order."""
+
+    def __init__(self, manifest_path: str = DEFAULT_MANIFEST):
+        self.manifest_path = Path(manifest_path)
+        self._presets: Optional[dict[str, Preset]] = None
+
+    def _load(self) -> dict[str, Preset]:
+        if self._presets is not None:
+            return self._presets
+        presets: dict[str, Preset] = {}
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            logger.warning("Preset manifest %s not found; no presets available", self.manifest_path)
+            manifest = {"presets": []}
+        base = self.manifest_path.parent
+        for entry in manifest["presets"]:
+            path = base / entry["file"]
+            if not path.is_file():
+                logger.warning("Preset %s: %s is missing; skipping", entry["id"], path)
+                continue
+            presets[entry["id"]] = Preset(
+                entry["id"], entry["name"], entry["default_prompt"], path, entry.get("etag", "")
+            )
+        self._presets = presets
+        return presets
+
+    def __getitem__(self, preset_id: str) -> Preset:
+        return self._load()[preset_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+# ---------------------------------------------------------------------------
+# Manifest build (run at development time, not on startup)
+# ---------------------------------------------------------------------------
+
+
+def _draw_house():
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (512, 512), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([100, 250, 412, 450], outline="black", width=4)
+    draw.polygon([(80, 250), (256, 80), (432, 250)], outline="black", width=4)
+    draw.rectangle([220, 330, 292, 450], outline="black", width=3)
+    draw.ellipse([270, 385, 282, 397], fill="black")
+    draw.rectangle([130, 290, 195, 340], outline="black", width=3)
+    draw.line([(162, 290), (162, 340)], fill="black", width=2)
+    draw.line([(130, 315), (195, 315)], fill="black", width=2)
+    draw.rectangle([317, 290, 382, 340], outline="black", width=3)
+    draw.line([(349, 290), (349, 340)], fill="black", width=2)
+    draw.line([(317, 315), (382, 315)], fill="black", width=2)
+    return img
+
+
+def _draw_face():
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (512, 512), "white")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([80, 80, 432, 432], outline="black", width=4)
+    draw.ellipse([170, 170, 210, 220], fill="black")
+    draw.ellipse([302, 170, 342, 220], fill="black")
+    draw.arc([160, 200, 352, 370], start=20, end=160, fill="black", width=4)
+    return img
+
+
+# Presets drawn in code rather than shipped as artwork, keyed by file name
+DRAWN = {"house-sketch.png": _draw_house, "face-sketch.png": _draw_face}
+
+
+def _png_size(data: bytes) -> tuple[int, int]:
+    return struct.unpack(">II", data[16:24])
+
+
+def build_manifest(manifest_path: str = DEFAULT_MANIFEST) -> dict:
+    """Redraw missing generated presets and refresh every entry's hash and size."""
+    path = Path(manifest_path)
+    manifest = json.loads(path.read_text())
+    for entry in manifest["presets"]:
+        image_path = path.parent / entry["file"]
+        if not image_path.exists() and entry["file"] in DRAWN:
+            DRAWN[entry["file"]]().save(image_path, format="PNG")
+        data = image_path.read_bytes()
+        entry["etag"] = content_etag(data)
+        entry["bytes"] = len(data)
+        entry["width"], entry["height"] = _png_size(data)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2) + "\n")
+    os.replace(tmp, path)
+    return manifest
+
+
+if __name__ == "__main__":
+    for entry in build_manifest(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MANIFEST)["presets"]:
+        print(f"{entry['id']:<10} {entry['file']:<20} {entry['bytes']:>8}  {entry['etag']}")
@@ -0,0 +1,78 @@
+"""Memory-bounded per-key rate limiting using GCRA.
+
+The Generic Cell Rate Algorithm stores a single float per key (its
+"theoretical arrival time") instead of a deque of timestamps. Allowing
+``max_req`` requests per ``window`` seconds means one request is earned back
+every ``window / max_req`` seconds, with bursts of up to ``max_req``.
+
+Keys whose arrival time has passed carry no state worth keeping and are swept
+periodically; a hard cap on keys per bucket bounds memory even under
+IP-rotating abuse.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    def __init__(self, max_keys: int, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        # bucket -> key -> theoretical arrival time, least recently updated first
+        self._tats: dict[str, collections.OrderedDict[str, float]] = {}
+        self.dropped = 0  # keys forgotten early because of the cap
+        self._last_warning = float("-inf")
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._tats.values())
+
+    def allow(self, key: str, bucket: str, window: float, max_req: int) -> bool:
+        """Return True and consume one request if `key` is under its limit."""
+        now = self._clock()
+        interval = window / max_req
+        tats = self._tats.get(bucket)
+        if tats is None:
+            tats = self._tats[bucket] = collections.OrderedDict()
+        tat = max(tats.get(key, now), now)
+        if tat - now > window - interval:
+            return False
+        tats[key] = tat + interval
+        tats.move_to_end(key)
+        if len(tats) > self.max_keys:
+            # Forget the least recently seen key; the sweeper handles expiry
+            tats.popitem(last=False)
+            self.dropped += 1
+            if now - self._last_warning > 60:
+                self._last_warning = now
+                logger.warning("Rate limiter at its %d key cap, dropping stalest keys", self.max_keys)
+        return True
+
+    @staticmethod
+    def _sweep_bucket(tats: collections.OrderedDict[str, float], now: float) -> int:
+        expired = [key for key, tat in tats.items() if tat <= now]
+        for key in expired:
+            del tats[key]
+        return len(expired)
+
+    def sweep(self) -> int:
+        """Drop keys that have fully recovered; returns how many were removed."""
+        now = self._clock()
+        return sum(self._sweep_bucket(tats, now) for tats in self._tats.values())
+
+    async def run_sweeper(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            removed = self.sweep()
+            if removed:
+                logger.debug("Rate limiter swept %d idle keys", removed)
+
+    def reset(self):
+        self._tats.clear()
+
+    def stats(self) -> dict:
+        return {"keys": len(self), "max_keys": self.max_keys, "dropped": self.dropped}
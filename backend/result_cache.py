@@ -0,0 +1,130 @@
+"""Byte-budgeted LRU cache of generated images for fully seeded requests.
+
+With an explicit seed, a generation is fully determined by its inputs, so the
+PNG can be served again without touching the GPU. Entries live in memory up to
+``max_bytes`` and are optionally mirrored to a directory that survives restarts.
+"""
+
+import asyncio
+import collections
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+
+def cache_key(
+    image_bytes: bytes,
+    prompt: str,
+    steps: int,
+    denoise: float,
+    hd: bool,
+    seed: int,
+    workflow_fingerprint: str,
+) -> str:
+    """Stable hash of everything that determines a seeded generation's output."""
+    params = json.dumps(
+        {"prompt": prompt, "steps": steps, "denoise": denoise, "hd": hd, "seed": seed},
+        sort_keys=True,
+    )
+    h = hashlib.sha256()
+    h.update(hashlib.sha256(image_bytes).digest())
+    h.update(params.encode())
+    h.update(workflow_fingerprint.encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, directory: str = "", max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._dir = Path(directory) if directory else None
+        # key -> size for files on disk, oldest first
+        self._disk: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self.disk_bytes = 0
+        if self._dir is not None:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            for path in sorted(self._dir.glob("*.png"), key=lambda p: p.stat().st_mtime):
+                size = path.stat().st_size
+                self._disk[path.stem] = size
+                self.disk_bytes += size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes_used -= len(old)
+        self._entries[key] = data
+        self.bytes_used += len(data)
+        while self.bytes_used > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes_used -= len(evicted)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        if key in self._disk:
+            try:
+                data = await asyncio.to_thread((self._dir / f"{key}.png").read_bytes)
+            except OSError:
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self._remember(key, data)
+                self.hits += 1
+                self.disk_hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        if self._dir is None or key in self._disk or len(data) > self.max_disk_bytes:
+            return
+        await asyncio.to_thread(self._write, key, data)
+        self._disk[key] = len(data)
+        self.disk_bytes += len(data)
+        while self.disk_bytes > self.max_disk_bytes:
+            oldest = next(iter(self._disk))
+            self._forget_disk(oldest)
+
+    def _write(self, key: str, data: bytes):
+        # Write-then-rename so a crash never leaves a truncated entry behind
+        tmp = self._dir / f"{key}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, self._dir / f"{key}.png")
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, 0)
+        self.disk_bytes -= size
+        try:
+            (self._dir / f"{key}.png").unlink()
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self.disk_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,202 @@
+"""Bounded admission scheduler for GPU generation jobs.
+
+Jobs wait in an in-process queue (status ``queued``) and are dispatched to
+ComfyUI only when one of a fixed number of worker slots is free, so ComfyUI's
+own queue stays short and per-job timeouts start at dispatch, not at accept.
+
+Each dispatched slot runs in its own task, so cancelling every job in a slot
+stops its work mid-flight (the ComfyUI client then withdraws the prompt) and
+frees the slot for the next job. Cancellations are credited with the GPU time
+they are estimated to have saved, from the running average job duration.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Optional
+
+from .models import TERMINAL, Job
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Slot:
+    """One queue entry: jobs served by a single run, and its task once dispatched."""
+
+    __slots__ = ("group", "run", "args", "task", "dispatched_at", "cancelled")
+
+    def __init__(self, group: list[Job], run: Callable[..., Awaitable[None]], args: tuple):
+        self.group = group
+        self.run = run
+        self.args = args
+        self.task: Optional[asyncio.Task] = None
+        self.dispatched_at: Optional[float] = None
+        self.cancelled = False
+
+
+class GenerationScheduler:
+    def __init__(
+        self,
+        run: Callable[..., Awaitable[None]],
+        max_queue: int,
+        concurrency: int,
+        initial_job_seconds: float = 5.0,
+    ):
+        self._run = run
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: list[asyncio.Task] = []
+        self.in_flight = 0
+        # Exponential moving average of dispatch-to-finish time, for Retry-After
+        self.avg_job_seconds = initial_job_seconds
+        self._slots: dict[str, _Slot] = {}  # job_id -> its queued or running slot
+        self._cancelled_waiting = 0  # cancelled slots still in the queue, not counted in depth
+        self.cancelled_queued = 0
+        self.cancelled_running = 0
+        self.gpu_seconds_saved = 0.0
+
+    def _ensure_workers(self):
+        """Start workers on first use so the scheduler works without app lifespan."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            # Unbounded: max_queue is enforced on live slots only, see depth
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._workers = []
+            self._slots = {}
+            self._cancelled_waiting = 0
+            self.in_flight = 0
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def start(self):
+        self._ensure_workers()
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._queue = None
+        self._slots = {}
+        self._cancelled_waiting = 0
+        self.in_flight = 0
+
+    @property
+    def depth(self) -> int:
+        """Slots waiting for dispatch, not counting cancelled ones the workers will skip."""
+        return self._queue.qsize() - self._cancelled_waiting if self._queue is not None else 0
+
+    def is_full(self) -> bool:
+        return self.depth >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up."""
+        waves = (self.depth + self.in_flight) / max(self.concurrency, 1)
+        return max(1, math.ceil(waves * self.avg_job_seconds))
+
+    def submit(self, job: Job, *args):
+        """Queue a job for dispatch. Raises QueueFullError instead of blocking."""
+        self.submit_group([job], self._run, job, *args)
+
+    def submit_group(self, group: list[Job], run: Callable[..., Awaitable[None]], *args):
+        """Queue several jobs served by one ComfyUI prompt as a single slot.
+
+        ``run(*args)`` is awaited on dispatch unless every job in the group
+        was cancelled while queued.
+        """
+        self._ensure_workers()
+        if self.is_full():
+            raise QueueFullError(self.retry_after())
+        slot = _Slot(group, run, args)
+        self._queue.put_nowait(slot)
+        for job in group:
+            self._slots[job.job_id] = slot
+
+    def cancel(self, job: Job) -> float:
+        """Stop the work behind a cancelled job; returns the estimated GPU seconds saved.
+
+        Nothing happens until every job sharing the slot is terminal, since a
+        batch prompt still has to run for the variations nobody cancelled. A
+        queued slot is then skipped at dispatch and a running one has its task
+        cancelled.
+        """
+        slot = self._slots.get(job.job_id)
+        if slot is None or not all(j.status in TERMINAL for j in slot.group):
+            return 0.0
+        self._release(slot)
+        if slot.task is None:
+            slot.cancelled = True
+            self._cancelled_waiting += 1
+            saved = self.avg_job_seconds
+            self.cancelled_queued += 1
+        elif not slot.task.done():
+            slot.task.cancel()
+            saved = max(0.0, self.avg_job_seconds - (time.time() - slot.dispatched_at))
+            self.cancelled_running += 1
+        else:
+            return 0.0
+        self.gpu_seconds_saved += saved
+        return saved
+
+    def _release(self, slot: _Slot):
+        for job in slot.group:
+            if self._slots.get(job.job_id) is slot:
+                del self._slots[job.job_id]
+
+    async def _worker(self):
+        while True:
+            slot = await self._queue.get()
+            try:
+                if slot.cancelled:
+                    self._cancelled_waiting -= 1
+                    continue
+                if all(job.status in TERMINAL for job in slot.group):
+                    continue  # cancelled while queued
+                slot.dispatched_at = time.time()
+                for job in slot.group:
+                    job.dispatched_at = slot.dispatched_at
+                self.in_flight += 1
+                slot.task = asyncio.create_task(slot.run(*slot.args))
+                try:
+                    await asyncio.wait({slot.task})
+                except asyncio.CancelledError:
+                    slot.task.cancel()
+                    raise
+                finally:
+                    self.in_flight -= 1
+                if slot.task.cancelled():
+                    continue
+                elapsed = time.time() - slot.dispatched_at
+                self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * elapsed
+                slot.task.result()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Generation job %s crashed", slot.group[0].job_id)
+            finally:
+                self._release(slot)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "avg_job_seconds": round(self.avg_job_seconds, 2),
+            "cancelled_queued": self.cancelled_queued,
+            "cancelled_running": self.cancelled_running,
+            "gpu_seconds_saved": round(self.gpu_seconds_saved, 2),
+        }
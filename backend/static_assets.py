@@ -0,0 +1,118 @@
+"""Static file serving with pre-built gzip and brotli variants.
+
+``precompress`` writes ``<file>.gz`` and ``<file>.br`` next to each text asset
+(run it at image build time: ``python -m backend.static_assets static``).
+``PrecompressedStaticFiles`` then serves the smallest variant the client's
+``Accept-Encoding`` allows, falling back to the original when a variant is
+missing or older than its source. Brotli is optional: without the ``brotli``
+package only gzip variants are built.
+"""
+
+import gzip
+import os
+import sys
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional; gzip covers every browser
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".ico", ".webmanifest"}
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress(directory: str) -> list[Path]:
+    """Write missing or stale compressed variants of text assets; returns the files written."""
+    written = []
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = None
+        for encoding, suffix in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+                continue
+            if data is None:
+                data = path.read_bytes()
+            compressed = _compress(data, encoding)
+            if len(compressed) >= len(data):
+                continue
+            tmp = target.with_name(target.name + ".tmp")
+            tmp.write_bytes(compressed)
+            os.replace(tmp, target)
+            written.append(target)
+    return written
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        path = Path(full_path)
+        if path.suffix not in COMPRESSIBLE_SUFFIXES:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        media_type = FileResponse(path, stat_result=stat_result).media_type
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            variant = path.with_name(path.name + suffix)
+            try:
+                variant_stat = variant.stat()
+            except OSError:
+                continue
+            if variant_stat.st_mtime < stat_result.st_mtime:
+                continue  # stale: the source changed after the variant was built
+            response = FileResponse(variant, status_code=status_code, stat_result=variant_stat, media_type=media_type)
+            response.headers["content-encoding"] = encoding
+            response.headers["vary"] = "Accept-Encoding"
+            break
+        else:
+            response = FileResponse(path, status_code=status_code, stat_result=stat_result)
+            response.headers["vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    for written in precompress(sys.argv[1] if len(sys.argv) > 1 else "static"):
+        print(written)
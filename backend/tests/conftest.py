@@ -14,3 +14,37 @@ os.environ.setdefault("PENCIL_USAGE_DB", os.path.join(tempfile.mkdtemp(), "conft
 def tmp_db(tmp_path):
     """Return a path to a temporary SQLite database."""
     return str(tmp_path / "test_usage.db")
+
+
+@pytest.fixture()
+def mock_comfyui_server():
+    """Factory that starts mock ComfyUI servers on free ports; each call returns (url, app).
+
+    Keyword arguments are passed to ``create_mock_server`` (e.g. ``delay``).
+    """
+    import threading
+    import time
+
+    import uvicorn
+
+    from backend.mock_comfyui import create_mock_server
+
+    servers = []
+
+    def _start(**kwargs):
+        app = create_mock_server(**kwargs)
+        server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        )
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        servers.append((server, thread))
+        return f"http://127.0.0.1:{port}", app
+
+    yield _start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
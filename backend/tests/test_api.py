@@ -1,5 +1,6 @@
 """Integration tests for the FastAPI endpoints."""
 
+import asyncio
 import os
 import tempfile
 
@@ -104,6 +105,87 @@ async def test_generate_and_usage():
     settings.daily_free_limit = 20
 
 
+@pytest.mark.anyio
+async def test_rejected_sketch_does_not_use_quota():
+    from backend import main as m
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_bad_sketch.db"), "test-salt")
+    m.rate_limiter.reset()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        r = await c.post("/api/generate", json={"sketch": "not-an-image"})
+        assert r.status_code == 400
+        r = await c.post("/api/generate/raw", content=b"not-an-image", headers={"content-type": "image/png"})
+        assert r.status_code == 400
+        assert (await c.get("/api/usage")).json()["today"] == 0
+
+
+@pytest.mark.anyio
+async def test_concurrent_uploads_respect_daily_limit():
+    import base64
+    import io
+
+    from PIL import Image
+
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_concurrent_quota.db"), "test-salt")
+    m.rate_limiter.reset()
+    settings.daily_free_limit = 3
+    buf = io.BytesIO()
+    Image.new("RGB", (256, 256), "white").save(buf, format="PNG")
+    sketch = base64.b64encode(buf.getvalue()).decode()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            # All are admitted while the others are still being ingested
+            responses = await asyncio.gather(*[
+                c.post("/api/generate", json={"sketch": sketch}) for _ in range(10)
+            ])
+            codes = sorted(r.status_code for r in responses)
+            assert codes == [200] * 3 + [429] * 7
+            assert (await c.get("/api/usage")).json()["today"] == 3
+            for r in responses:
+                if r.status_code == 200:
+                    await c.post(f"/api/cancel/{r.json()['job_id']}")
+    finally:
+        settings.daily_free_limit = 20
+
+
+@pytest.mark.anyio
+async def test_concurrent_batches_respect_daily_limit():
+    import base64
+    import io
+
+    from PIL import Image
+
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_concurrent_batch_quota.db"), "test-salt")
+    m.rate_limiter.reset()
+    settings.daily_free_limit = 8
+    buf = io.BytesIO()
+    Image.new("RGB", (256, 256), "white").save(buf, format="PNG")
+    sketch = base64.b64encode(buf.getvalue()).decode()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            responses = await asyncio.gather(*[
+                c.post("/api/generate/batch", json={"sketch": sketch, "count": 4}) for _ in range(5)
+            ])
+            codes = sorted(r.status_code for r in responses)
+            assert codes == [200] * 2 + [429] * 3
+            assert (await c.get("/api/usage")).json()["today"] == 8
+            for r in responses:
+                if r.status_code == 200:
+                    for job_id in r.json()["job_ids"]:
+                        await c.post(f"/api/cancel/{job_id}")
+    finally:
+        settings.daily_free_limit = 20
+
+
 @pytest.mark.anyio
 async def test_assist_vision_dev_mode():
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
@@ -121,3 +203,551 @@ async def test_assist_prompt_dev_mode():
     data = r.json()
     assert "a cat" in data["enhanced"]
     assert len(data["alternatives"]) == 2
+
+
+@pytest.mark.anyio
+async def test_generate_returns_503_when_queue_full():
+    from backend import main as m
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_queue_full.db"), "test-salt")
+    max_queue = m.scheduler.max_queue
+    m.scheduler.max_queue = 0
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            r = await c.post("/api/generate", json={"sketch": "house"})
+            assert r.status_code == 503
+            assert int(r.headers["retry-after"]) >= 1
+            r = await c.get("/api/usage")
+            assert r.json()["today"] == 0
+    finally:
+        m.scheduler.max_queue = max_queue
+
+
+@pytest.mark.anyio
+async def test_generate_batch_returns_job_per_variation():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_batch.db"), "test-salt")
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 0.01
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            r = await c.post("/api/generate/batch", json={"sketch": "face", "count": 5, "seed": 1})
+            assert r.status_code == 200
+            job_ids = r.json()["job_ids"]
+            assert len(set(job_ids)) == 5
+
+            r = await c.get("/api/usage")
+            assert r.json()["today"] == 5
+
+            for _ in range(100):
+                statuses = [(await c.get(f"/api/status/{j}")).json()["status"] for j in job_ids]
+                if all(s == "completed" for s in statuses):
+                    break
+                await asyncio.sleep(0.02)
+            assert statuses == ["completed"] * 5
+            images = [(await c.get(f"/api/result/{j}")).content for j in job_ids]
+            assert len(set(images)) == 5
+
+            # Over the remaining daily quota
+            r = await c.post("/api/generate/batch", json={"sketch": "face", "count": 16})
+            assert r.status_code == 429
+    finally:
+        settings.dev_mode_delay = delay
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    import json
+
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.anyio
+async def test_event_stream_pushes_transitions_until_complete():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_events.db"), "test-salt")
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 0.01
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            job_id = (await c.post("/api/generate", json={"sketch": "house"})).json()["job_id"]
+            r = await c.get("/api/events", params={"jobs": f"{job_id},missing"})
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = _parse_sse(r.text)
+        kinds = [kind for kind, _ in events]
+        assert ("error", {"job_id": "missing", "detail": "Unknown job: missing"}) in events
+        statuses = [data["status"] for kind, data in events if kind == "status"]
+        assert statuses[-1] == "completed"
+        assert kinds[-1] == "complete"
+        assert events[-1][1]["result_url"] == f"/api/result/{job_id}"
+        assert m.job_events.subscriber_count == 0
+    finally:
+        settings.dev_mode_delay = delay
+
+
+@pytest.mark.anyio
+async def test_event_stream_reports_cancel():
+    from backend import main as m
+    from backend.models import Job
+
+    job = Job("sse-cancel")
+    m.jobs.add(job)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        async def cancel_soon():
+            await asyncio.sleep(0.05)
+            await c.post(f"/api/cancel/{job.job_id}")
+
+        task = asyncio.create_task(cancel_soon())
+        r = await c.get("/api/events", params={"jobs": job.job_id})
+        await task
+    events = _parse_sse(r.text)
+    assert [data["status"] for _, data in events] == ["queued", "cancelled", "cancelled"]
+    assert events[-1][0] == "complete"
+    assert "result_url" not in events[-1][1]
+
+
+@pytest.mark.anyio
+async def test_cancel_stops_running_generation():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_cancel.db"), "test-salt")
+    m.rate_limiter.reset()
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 30.0
+    cancelled_before = m.scheduler.cancelled_running
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            job_id = (await c.post("/api/generate", json={"sketch": "house"})).json()["job_id"]
+            for _ in range(100):
+                if (await c.get(f"/api/status/{job_id}")).json()["status"] != "queued":
+                    break
+                await asyncio.sleep(0.01)
+            r = await c.post(f"/api/cancel/{job_id}")
+            assert r.json()["status"] == "cancelled"
+            assert r.json()["gpu_seconds_saved"] > 0
+            for _ in range(100):
+                if m.scheduler.in_flight == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert m.scheduler.in_flight == 0  # the slot is free long before the 30 s job would end
+            assert m.scheduler.cancelled_running == cancelled_before + 1
+            assert (await c.get("/api/gpu")).json()["scheduler"]["gpu_seconds_saved"] > 0
+            r = await c.post(f"/api/cancel/{job_id}")
+            assert r.json()["gpu_seconds_saved"] == 0.0
+    finally:
+        settings.dev_mode_delay = delay
+
+
+@pytest.mark.anyio
+async def test_session_latest_job_supersedes_older_ones():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_session.db"), "test-salt")
+    m.rate_limiter.reset()
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 30.0
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            async def submit(**body):
+                r = await c.post("/api/generate", json={"sketch": "house", **body})
+                assert r.status_code == 200
+                return r.json()
+
+            async def status(job_id):
+                return (await c.get(f"/api/status/{job_id}")).json()["status"]
+
+            async def dispatched(job_id):
+                for _ in range(100):
+                    if await status(job_id) != "queued":
+                        return
+                    await asyncio.sleep(0.01)
+                raise AssertionError(f"{job_id} never dispatched")
+
+            # Fill both GPU slots: one job from the session, one from outside it
+            first = await submit(session="live")
+            await dispatched(first["job_id"])
+            other = await submit()
+            await dispatched(other["job_id"])
+            depth = m.scheduler.depth
+
+            second = await submit(session="live")
+            assert second["superseded"] == []  # the running job is kept by default
+            third = await submit(session="live")
+            assert third["superseded"] == [second["job_id"]]
+            assert await status(second["job_id"]) == "cancelled"
+            assert m.scheduler.depth == depth + 1  # the dropped job no longer holds a queue slot
+
+            # The same key from another client is a different session
+            r = await c.post(
+                "/api/generate",
+                json={"sketch": "house", "session": "live"},
+                headers={"x-real-ip": "203.0.113.9"},
+            )
+            elsewhere = r.json()
+            assert elsewhere["superseded"] == []
+
+            latest = await submit(session="live", supersede_running=True)
+            assert sorted(latest["superseded"]) == sorted([first["job_id"], third["job_id"]])
+            assert await status(first["job_id"]) == "cancelled"
+            assert await status(other["job_id"]) != "cancelled"
+            assert await status(elsewhere["job_id"]) != "cancelled"
+
+            for job_id in (other["job_id"], elsewhere["job_id"], latest["job_id"]):
+                await c.post(f"/api/cancel/{job_id}")
+    finally:
+        settings.dev_mode_delay = delay
+
+
+@pytest.mark.anyio
+async def test_rejected_session_job_keeps_older_ones():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_session_full.db"), "test-salt")
+    m.rate_limiter.reset()
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 30.0
+    max_queue = m.scheduler.max_queue
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            first = (await c.post("/api/generate", json={"sketch": "house", "session": "full"})).json()
+            for _ in range(100):
+                if (await c.get(f"/api/status/{first['job_id']}")).json()["status"] != "queued":
+                    break
+                await asyncio.sleep(0.01)
+
+            # No queue room, and superseding would only free a running slot
+            m.scheduler.max_queue = m.scheduler.depth
+            r = await c.post(
+                "/api/generate",
+                json={"sketch": "house", "session": "full", "supersede_running": True},
+            )
+            assert r.status_code == 503
+            assert (await c.get(f"/api/status/{first['job_id']}")).json()["status"] != "cancelled"
+
+            m.scheduler.max_queue = max_queue
+            await c.post(f"/api/cancel/{first['job_id']}")
+    finally:
+        m.scheduler.max_queue = max_queue
+        settings.dev_mode_delay = delay
+
+
+@pytest.mark.anyio
+async def test_seeded_repeat_is_served_from_result_cache():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_result_cache.db"), "test-salt")
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 0.01
+    body = {"sketch": "face", "prompt": "cached face", "seed": 4242}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            first = (await c.post("/api/generate", json=body)).json()
+            assert first["status"] == "queued"
+            await c.get("/api/events", params={"jobs": first["job_id"]})
+            original = (await c.get(f"/api/result/{first['job_id']}")).content
+
+            calls = []
+            generate = m.client.generate
+            m.client.generate = lambda *a, **kw: calls.append(a) or generate(*a, **kw)
+            try:
+                second = (await c.post("/api/generate", json=body)).json()
+            finally:
+                m.client.generate = generate
+            assert second["status"] == "completed"
+            assert calls == []
+            assert (await c.get(f"/api/result/{second['job_id']}")).content == original
+
+            # A cached repeat never needs a GPU slot, so a full queue doesn't refuse it
+            max_queue = m.scheduler.max_queue
+            m.scheduler.max_queue = 0
+            try:
+                r = await c.post("/api/generate", json=body)
+            finally:
+                m.scheduler.max_queue = max_queue
+            assert r.status_code == 200
+            assert r.json()["status"] == "completed"
+
+            r = await c.get("/api/gpu")
+            assert r.json()["result_cache"]["hits"] >= 1
+    finally:
+        settings.dev_mode_delay = delay
+
+
+@pytest.mark.anyio
+async def test_spilled_result_is_served_from_disk(tmp_path):
+    from backend import main as m
+    from backend.job_store import JobStore
+    from backend.models import Job, JobStatus
+
+    store = m.jobs
+    m.jobs = JobStore(max_jobs=10, max_bytes=10**6, spill_dir=str(tmp_path))
+    try:
+        job = Job("spilled")
+        m.jobs.add(job)
+        await m.jobs.save_result(job, b"\x89PNG spilled")
+        m.jobs.set_status(job, JobStatus.completed)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            r = await c.get("/api/result/spilled")
+        assert r.status_code == 200
+        assert r.content == b"\x89PNG spilled"
+        assert r.headers["content-type"] == "image/png"
+    finally:
+        m.jobs = store
+
+
+@pytest.mark.anyio
+async def test_uploaded_sketch_reports_ingest_timings():
+    import base64
+    import io
+
+    from PIL import Image
+
+    from backend import main as m
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_ingest.db"), "test-salt")
+    buf = io.BytesIO()
+    Image.new("RGB", (1024, 768), "white").save(buf, format="PNG")
+    sketch = base64.b64encode(buf.getvalue()).decode()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        r = await c.post("/api/generate", json={"sketch": sketch})
+        assert r.status_code == 200
+        stages = [part.split(";")[0] for part in r.headers["server-timing"].split(", ")]
+        assert stages == ["queue", "decode", "sniff", "verify", "normalize", "encode"]
+
+        # The RGB upload was cropped, downscaled and stored as grayscale
+        r = await c.get(f"/api/status/{r.json()['job_id']}")
+        assert r.json()["sketch_bytes_saved"] > 0
+
+        r = await c.post("/api/generate", json={"sketch": base64.b64encode(b"nope").decode()})
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Invalid image data"
+
+
+@pytest.fixture()
+def sketch_png():
+    import io
+
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("L", (256, 256), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.anyio
+async def test_raw_upload_generates(sketch_png):
+    from backend import main as m
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_raw.db"), "test-salt")
+    m.rate_limiter.reset()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        r = await c.post(
+            "/api/generate/raw",
+            params={"prompt": "a cat", "steps": 2, "seed": 7},
+            content=sketch_png,
+            headers={"content-type": "image/png"},
+        )
+        assert r.status_code == 200
+        assert r.json()["status"] == "queued"
+        assert "server-timing" in r.headers
+
+        r = await c.post("/api/generate/raw", params={"steps": 99}, content=sketch_png)
+        assert r.status_code == 422
+
+        r = await c.post("/api/generate/raw", content=b"{}", headers={"content-type": "application/json"})
+        assert r.status_code == 415
+
+
+@pytest.mark.anyio
+async def test_raw_upload_stops_reading_oversized_body(sketch_png):
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_raw_limit.db"), "test-salt")
+    m.rate_limiter.reset()
+    sent = 0
+
+    async def body():
+        nonlocal sent
+        for _ in range(1000):
+            sent += 1
+            yield b"\0" * 1024
+
+    old_limit = settings.max_image_size
+    settings.max_image_size = 8 * 1024
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            # Declared too large: refused before any of the body is read
+            r = await c.post("/api/generate/raw", content=b"\0" * 9000)
+            assert r.status_code == 413
+            # Streamed without a length: refused once the limit is crossed
+            r = await c.post("/api/generate/raw", content=body())
+            assert r.status_code == 413
+            assert sent < 20
+    finally:
+        settings.max_image_size = old_limit
+
+
+@pytest.mark.anyio
+async def test_result_format_negotiation(sketch_png):
+    from backend import main as m
+    from backend.models import Job, JobStatus
+
+    job = Job("negotiated")
+    m.jobs.add(job)
+    await m.jobs.save_result(job, sketch_png)
+    m.jobs.set_status(job, JobStatus.completed)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        r = await c.get("/api/result/negotiated", headers={"accept": "*/*"})
+        assert r.headers["content-type"] == "image/png"
+        assert r.content == sketch_png
+        assert "Accept" in r.headers["vary"]
+
+        r = await c.get("/api/result/negotiated", headers={"accept": "image/webp,image/*;q=0.8"})
+        assert r.headers["content-type"] == "image/webp"
+        assert r.content[8:12] == b"WEBP"
+
+        encoded = m.transcoder.encoded
+        r = await c.get("/api/result/negotiated", headers={"accept": "image/webp"})
+        assert r.headers["content-type"] == "image/webp"
+        assert m.transcoder.encoded == encoded  # served from the transcode cache
+
+        r = await c.get("/api/result/negotiated", params={"format": "avif", "quality": 40})
+        assert r.headers["content-type"] == "image/avif"
+        assert "Accept" not in r.headers.get("vary", "")
+
+        r = await c.get("/api/result/negotiated", params={"format": "gif"})
+        assert r.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_batch_thumbnails_are_built_on_completion():
+    from backend import main as m
+    from backend.config import settings
+    from backend.usage import UsageTracker
+
+    m.tracker = UsageTracker(os.path.join(_tmpdir, "test_thumbs.db"), "test-salt")
+    m.rate_limiter.reset()
+    delay = settings.dev_mode_delay
+    settings.dev_mode_delay = 0.01
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            r = await c.post("/api/generate/batch", json={"sketch": "house", "count": 8})
+            job_ids = r.json()["job_ids"]
+            await c.get("/api/events", params={"jobs": ",".join(job_ids)})
+            await asyncio.gather(*list(m._thumbnail_tasks.values()))
+            assert all(m.jobs[j].thumbnails for j in job_ids)
+
+            total = 0
+            for job_id in job_ids:
+                r = await c.get(f"/api/result/{job_id}/thumb", params={"size": 64})
+                assert r.status_code == 200
+                assert r.headers["content-type"] == "image/webp"
+                total += len(r.content)
+            assert total < 8 * 4096
+
+            r = await c.get(f"/api/result/{job_ids[0]}/thumb", params={"size": 100})
+            assert r.status_code == 400
+
+            # Dropped thumbnails are rebuilt on demand
+            m.jobs[job_ids[0]].thumbnails = None
+            r = await c.get(f"/api/result/{job_ids[0]}/thumb")
+            assert r.status_code == 200
+    finally:
+        settings.dev_mode_delay = delay
+
+
+@pytest.mark.anyio
+async def test_results_and_presets_are_cacheable(sketch_png):
+    from backend import main as m
+    from backend.models import Job, JobStatus
+
+    job = Job("cacheable")
+    m.jobs.add(job)
+    await m.jobs.save_result(job, sketch_png)
+    m.jobs.set_status(job, JobStatus.completed)
+    await m._thumbnails(job, sketch_png)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        for path, params in (
+            ("/api/result/cacheable", {}),
+            ("/api/result/cacheable", {"format": "webp"}),
+            ("/api/result/cacheable/thumb", {"size": 64}),
+        ):
+            r = await c.get(path, params=params)
+            assert r.status_code == 200
+            assert "immutable" in r.headers["cache-control"]
+            etag = r.headers["etag"]
+            r = await c.get(path, params=params, headers={"if-none-match": etag})
+            assert r.status_code == 304
+            assert r.content == b""
+            assert r.headers["etag"] == etag
+
+        sketches = (await c.get("/api/sketches")).json()
+        house = next(s for s in sketches if s["id"] == "house")
+        r = await c.get("/api/sketches/house")
+        assert r.headers["cache-control"] == "no-cache"
+        assert r.headers["etag"] == f'"{house["version"]}"'
+        r = await c.get("/api/sketches/house", params={"v": house["version"]})
+        assert "immutable" in r.headers["cache-control"]
+        r = await c.get("/api/sketches/house", headers={"if-none-match": r.headers["etag"]})
+        assert r.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_stale_preset_version_is_not_served_immutable(tmp_path):
+    import json
+
+    from backend import main as m
+    from backend.http_cache import content_etag
+    from backend.presets import PresetRegistry
+
+    edited = b"\x89PNG edited"
+    (tmp_path / "a.png").write_bytes(edited)
+    stale = content_etag(b"\x89PNG original")
+    manifest = tmp_path / "presets.json"
+    manifest.write_text(json.dumps({"presets": [
+        {"id": "a", "name": "A", "default_prompt": "ay", "file": "a.png", "etag": stale},
+    ]}))
+    presets = m.PRESETS
+    m.PRESETS = PresetRegistry(str(manifest))
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+            r = await c.get("/api/sketches/a", params={"v": stale})
+            assert r.content == edited
+            assert r.headers["cache-control"] == "no-cache"
+            assert r.headers["etag"] == f'"{content_etag(edited)}"'
+    finally:
+        m.PRESETS = presets
+
+
+@pytest.mark.anyio
+async def test_app_page_is_served_with_validators():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        r = await c.get("/app")
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/html")
+        r = await c.get("/app", headers={"if-none-match": r.headers["etag"]})
+        assert r.status_code == 304
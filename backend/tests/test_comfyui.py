@@ -0,0 +1,245 @@
+"""Tests for ComfyUIClient against the local mock ComfyUI server."""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from backend.comfyui import ComfyUIClient, ComfyUIError
+from backend.config import settings
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture()
+def slow_polling():
+    """Make /history polling slow enough that a fast result proves push delivery."""
+    interval = settings.comfyui_poll_interval
+    settings.comfyui_poll_interval = 5.0
+    yield
+    settings.comfyui_poll_interval = interval
+
+
+async def _connected(client: ComfyUIClient):
+    for _ in range(200):
+        if client.ws_connected:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("websocket never connected")
+
+
+def _sketch() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.anyio
+async def test_generate_completes_over_websocket(mock_comfyui_server, slow_polling):
+    url, app = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await client.generate(_sketch(), "a cat", 4, 0.75, seed=7)
+        assert loop.time() - started < 2.0
+        assert Image.open(io.BytesIO(result)).size == (512, 512)
+        assert app.state.history_requests == 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_concurrent_jobs_share_one_socket(mock_comfyui_server, slow_polling):
+    url, app = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        results = await asyncio.gather(*[
+            client.generate(_sketch(), f"prompt {i}", 4, 0.75, seed=i) for i in range(5)
+        ])
+        assert len(set(results)) == 5
+        assert len(app.state.sockets) == 1
+        assert app.state.history_requests == 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_falls_back_to_polling_when_socket_drops(mock_comfyui_server):
+    url, app = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        client._ws_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await client._ws_task
+        assert not client.ws_connected
+        result = await client.generate(_sketch(), "a dog", 4, 0.75, seed=3)
+        assert Image.open(io.BytesIO(result)).size == (512, 512)
+        assert app.state.history_requests > 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_execution_error_is_pushed(mock_comfyui_server, slow_polling):
+    url, _ = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        workflow = client.build_workflow("missing.png", "p", 4, 0.75, seed=1)
+        prompt_id = await client.submit_workflow(workflow)
+        with pytest.raises(ComfyUIError, match="Invalid image file"):
+            await asyncio.wait_for(client.wait_for_completion(prompt_id), timeout=2.0)
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_cancel_withdraws_prompts_from_comfyui(mock_comfyui_server, slow_polling):
+    url, app = mock_comfyui_server(delay=30.0)
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        tasks = [
+            asyncio.create_task(client.generate(_sketch(), f"prompt {i}", 4, 0.75, seed=i)) for i in range(2)
+        ]
+        queue = app.state.queue
+        for _ in range(200):
+            if queue["running"] and queue["pending"]:
+                break
+            await asyncio.sleep(0.01)
+        running, pending = queue["running"][0], queue["pending"][0]
+        by_prompt = {f"prompt {i}": task for i, task in enumerate(tasks)}
+
+        started = asyncio.get_running_loop().time()
+        # Pending first: interrupting the running prompt would start the other one
+        for entry in (pending, running):
+            task = by_prompt[entry[2]["6"]["inputs"]["text"]]
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert asyncio.get_running_loop().time() - started < 2.0
+        assert app.state.deleted == [pending[1]]
+        assert app.state.interrupted == [running[1]]
+        for _ in range(200):  # the interrupted prompt unwinds asynchronously
+            if not queue["running"]:
+                break
+            await asyncio.sleep(0.01)
+        assert queue == {"running": [], "pending": []}
+        assert client.cancel_stats == {"dequeued": 1, "interrupted": 1, "finished": 0}
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_uploads_are_content_addressed_and_deduplicated(mock_comfyui_server):
+    url, app = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        sketch = _sketch()
+        other = Image.new("RGB", (64, 64), "black")
+        buf = io.BytesIO()
+        other.save(buf, format="PNG")
+
+        names = await asyncio.gather(*[client.ensure_uploaded(sketch) for _ in range(4)])
+        other_name = await client.ensure_uploaded(buf.getvalue())
+
+        assert len(set(names)) == 1
+        assert other_name != names[0]
+        assert set(app.state.uploads) == {names[0], other_name}
+        assert client.upload_stats["misses"] == 2
+        assert client.upload_stats["hits"] == 3
+        assert client.upload_stats["bytes_saved"] == 3 * len(sketch)
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_cancelled_uploader_does_not_cancel_shared_upload():
+    client = ComfyUIClient("http://127.0.0.1:1")
+    release = asyncio.Event()
+    calls = []
+
+    async def slow_upload(image_bytes, filename):
+        calls.append(filename)
+        await release.wait()
+        return filename
+
+    client.upload_image = slow_upload
+    sketch = _sketch()
+    owner = asyncio.create_task(client.ensure_uploaded(sketch))
+    await asyncio.sleep(0)
+    bystander = asyncio.create_task(client.ensure_uploaded(sketch))
+    await asyncio.sleep(0)
+
+    owner.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await owner
+    release.set()
+
+    name = await asyncio.wait_for(bystander, 1.0)
+    assert name.startswith("pencil_")
+    assert len(calls) == 1
+    # The finished upload is cached for the next job too
+    assert await client.ensure_uploaded(sketch) == name
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_failed_job_forgets_cached_upload(mock_comfyui_server, slow_polling):
+    url, app = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        sketch = _sketch()
+        await client.generate(sketch, "p", 4, 0.75, seed=1)
+        app.state.uploads.clear()  # backend lost its input dir
+        with pytest.raises(ComfyUIError):
+            await client.generate(sketch, "p", 4, 0.75, seed=1)
+        await client.generate(sketch, "p", 4, 0.75, seed=1)
+        assert client.upload_stats["misses"] == 2
+    finally:
+        await client.close()
+
+
+@pytest.mark.anyio
+async def test_generate_batch_single_prompt(mock_comfyui_server, slow_polling):
+    url, app = mock_comfyui_server()
+    client = ComfyUIClient(url)
+    await client.start()
+    try:
+        await _connected(client)
+        results = await client.generate_batch(_sketch(), "a fox", 4, 0.75, seed=10, count=4)
+        assert len(results) == 4
+        assert len(set(results)) == 4
+        assert app.state.prompt_count == 1
+        assert len(app.state.uploads) == 1
+    finally:
+        await client.close()
+
+
+def test_build_workflow_batches_latent():
+    client = ComfyUIClient("http://unused")
+    client._workflow_template = {
+        str(n): {"inputs": {}} for n in (1, 6, 8, 10, 12, 14, 15, 16)
+    }
+    single = client.build_workflow("x.png", "p", 4, 0.75, seed=1)
+    assert "17" not in single
+    batched = client.build_workflow("x.png", "p", 4, 0.75, seed=1, batch_size=8)
+    assert batched["17"]["class_type"] == "RepeatLatentBatch"
+    assert batched["17"]["inputs"]["amount"] == 8
+    assert batched["12"]["inputs"]["latent_image"] == ["17", 0]
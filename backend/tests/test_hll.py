@@ -0,0 +1,47 @@
+"""Tests for the HyperLogLog sketch."""
+
+import pytest
+
+from backend.hll import HyperLogLog
+
+
+def test_small_counts_are_near_exact():
+    h = HyperLogLog()
+    for i in range(100):
+        h.add(f"ip{i}")
+        h.add(f"ip{i}")  # duplicates don't count
+    assert abs(h.count() - 100) <= 2
+
+
+def test_large_count_within_error_bound():
+    h = HyperLogLog()
+    n = 200_000
+    for i in range(n):
+        h.add(f"{i:016x}")
+    # 3 standard errors at precision 14
+    assert abs(h.count() - n) / n < 0.025
+
+
+def test_union_counts_overlap_once():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(5000):
+        a.add(str(i))
+    for i in range(2500, 7500):
+        b.add(str(i))
+    assert abs(HyperLogLog.union([a, b]).count() - 7500) / 7500 < 0.025
+    # Inputs are untouched
+    assert abs(a.count() - 5000) / 5000 < 0.025
+
+
+def test_round_trip_bytes():
+    h = HyperLogLog()
+    for i in range(1000):
+        h.add(str(i))
+    assert HyperLogLog(registers=h.to_bytes()).count() == h.count()
+
+
+def test_rejects_mismatched_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+    with pytest.raises(ValueError):
+        HyperLogLog(14, registers=b"\0" * 10)
@@ -0,0 +1,138 @@
+"""Tests for the off-loop sketch ingest stage."""
+
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+
+from backend.ingest import (
+    IngestError,
+    SketchIngestor,
+    ingest_sketch,
+    normalize_sketch,
+    server_timing,
+    sniff_png,
+)
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+def _encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+PNG = _encode(Image.new("RGB", (512, 512), "white"), "PNG")
+
+
+def test_sniff_accepts_plain_png():
+    assert sniff_png(PNG) == (512, 512, 2)
+
+
+def test_sniff_rejects_other_formats_and_oversized_png():
+    assert sniff_png(_encode(Image.new("RGB", (64, 64)), "JPEG")) is None
+    assert sniff_png(_encode(Image.new("RGB", (5000, 10)), "PNG")) is None
+    assert sniff_png(_encode(Image.new("I;16", (64, 64)), "PNG")) is None
+    assert sniff_png(b"\x89PNG") is None
+
+
+def test_valid_png_passes_through_unchanged():
+    result = ingest_sketch(base64.b64encode(PNG).decode(), max_bytes=len(PNG))
+    assert result.image_bytes == PNG
+    assert not result.reencoded
+    assert set(result.timings) == {"decode", "sniff", "verify"}
+
+
+def test_jpeg_is_reencoded_as_png():
+    jpeg = _encode(Image.new("RGB", (64, 64), "white"), "JPEG")
+    result = ingest_sketch(jpeg, max_bytes=10**6)
+    assert result.reencoded
+    assert Image.open(io.BytesIO(result.image_bytes)).format == "PNG"
+    assert "encode" in result.timings
+
+
+@pytest.mark.parametrize(
+    "sketch, max_bytes, message",
+    [
+        ("not base64!", 10**6, "valid base64"),
+        (base64.b64encode(b"definitely not an image").decode(), 10**6, "Invalid image"),
+        (base64.b64encode(PNG).decode(), len(PNG) - 1, "exceeds"),
+    ],
+)
+def test_rejects_bad_uploads(sketch, max_bytes, message):
+    with pytest.raises(IngestError, match=message):
+        ingest_sketch(sketch, max_bytes=max_bytes)
+
+
+def test_truncated_png_is_rejected():
+    with pytest.raises(IngestError):
+        ingest_sketch(PNG[: len(PNG) // 2], max_bytes=10**6)
+
+
+@pytest.mark.anyio
+async def test_ingestor_runs_concurrently_and_counts():
+    ingestor = SketchIngestor(max_workers=2)
+    sketch = base64.b64encode(PNG).decode()
+    results = await asyncio.gather(*(ingestor.ingest(sketch, 10**6) for _ in range(5)))
+    assert all(r.image_bytes == PNG for r in results)
+    assert all("queue" in r.timings for r in results)
+    assert ingestor.stats() == {"workers": 2, "processed": 5, "passthrough": 5, "bytes_saved": 0}
+    ingestor.close()
+
+
+def test_server_timing_header():
+    assert server_timing({"decode": 1.5, "verify": 0.25}) == "decode;dur=1.5, verify;dur=0.25"
+
+
+def _line_art(size: tuple[int, int], mode: str = "RGB") -> Image.Image:
+    img = Image.new(mode, size, "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(0, min(size), 32):
+        draw.line([(i, 0), (size[0] - i, size[1])], fill="black", width=3)
+    return img
+
+
+def test_normalize_crops_downscales_and_grays_line_art():
+    img = normalize_sketch(_line_art((1600, 1200)), 512)
+    assert img.size == (512, 512)
+    assert img.mode == "L"
+
+
+def test_normalize_never_upscales():
+    assert normalize_sketch(_line_art((300, 200)), 512).size == (200, 200)
+
+
+def test_normalize_uses_exact_palette_for_few_colours():
+    img = Image.new("RGB", (64, 64), "white")
+    ImageDraw.Draw(img).rectangle([8, 8, 40, 40], fill=(200, 30, 30))
+    out = normalize_sketch(img, 512)
+    assert out.mode == "P"
+    assert ImageChops.difference(out.convert("RGB"), img).getbbox() is None
+
+
+def test_normalize_keeps_translucent_alpha():
+    img = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
+    assert normalize_sketch(img, 512).mode == "RGBA"
+
+
+def test_normalized_upload_reports_bytes_saved():
+    data = _encode(_line_art((2048, 1536)), "PNG")
+    result = ingest_sketch(data, max_bytes=len(data), normalize_size=512)
+    assert result.reencoded
+    assert result.bytes_saved == len(data) - len(result.image_bytes) > 0
+    out = Image.open(io.BytesIO(result.image_bytes))
+    assert (out.size, out.mode) == ((512, 512), "L")
+
+
+def test_already_normalized_png_passes_through():
+    data = _encode(_line_art((512, 512), "L"), "PNG")
+    result = ingest_sketch(data, max_bytes=len(data), normalize_size=512)
+    assert result.image_bytes == data
+    assert result.bytes_saved == 0
+    assert "normalize" not in result.timings
@@ -0,0 +1,155 @@
+"""Tests for the byte-budgeted job store."""
+
+import asyncio
+
+import pytest
+
+from backend.job_store import JobStore
+from backend.models import Job, JobStatus
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+async def _finished(store: JobStore, job_id: str, size: int) -> Job:
+    job = Job(job_id)
+    store.add(job)
+    await store.save_result(job, b"x" * size)
+    store.set_status(job, JobStatus.completed)
+    return job
+
+
+@pytest.mark.anyio
+async def test_evicts_oldest_terminal_jobs_by_bytes():
+    store = JobStore(max_jobs=100, max_bytes=25)
+    await _finished(store, "a", 10)
+    await _finished(store, "b", 10)
+    running = Job("running")
+    store.add(running)
+    await _finished(store, "c", 10)
+    assert "a" not in store
+    assert {"b", "c", "running"} <= {j.job_id for j in store.values()}
+    assert store.result_bytes == 20
+    assert store.stats()["evicted"] == 1
+
+
+@pytest.mark.anyio
+async def test_count_limit_never_drops_active_jobs():
+    store = JobStore(max_jobs=2, max_bytes=10**6)
+    active = [Job(f"j{i}") for i in range(3)]
+    for job in active:
+        store.add(job)
+    assert len(store) == 3  # nothing terminal to evict yet
+    store.set_status(active[0], JobStatus.failed)
+    store.add(Job("j3"))
+    assert "j0" not in store
+    assert len(store) == 3
+
+
+@pytest.mark.anyio
+async def test_lru_keeps_recently_fetched_results():
+    store = JobStore(max_jobs=100, max_bytes=25, eviction="lru")
+    a = await _finished(store, "a", 10)
+    await _finished(store, "b", 10)
+    assert await store.read_result(a) == b"x" * 10
+    await _finished(store, "c", 10)
+    assert "a" in store
+    assert "b" not in store
+
+
+@pytest.mark.anyio
+async def test_spilled_results_live_on_disk(tmp_path):
+    store = JobStore(max_jobs=100, max_bytes=15, spill_dir=str(tmp_path))
+    a = await _finished(store, "a", 10)
+    assert a.result_image is None
+    assert (tmp_path / "jobs" / "a.png").read_bytes() == b"x" * 10
+    assert await store.read_result(a) == b"x" * 10
+
+    await _finished(store, "b", 10)
+    assert not (tmp_path / "jobs" / "a.png").exists()
+    assert store.result_bytes == 10
+
+
+def test_restart_clears_only_stale_spill_files(tmp_path):
+    (tmp_path / "jobs").mkdir()
+    (tmp_path / "jobs" / "old.png").write_bytes(b"stale")
+    (tmp_path / "cached.png").write_bytes(b"keep")
+    JobStore(max_jobs=10, max_bytes=10, spill_dir=str(tmp_path))
+    assert list((tmp_path / "jobs").glob("*.png")) == []
+    assert (tmp_path / "cached.png").read_bytes() == b"keep"
+
+
+@pytest.mark.anyio
+async def test_write_for_cancelled_job_leaves_no_file(tmp_path):
+    store = JobStore(max_jobs=10, max_bytes=100, spill_dir=str(tmp_path))
+    job = Job("gone")
+    store.add(job)
+    save = asyncio.create_task(store.save_result(job, b"x" * 10))
+    await asyncio.sleep(0)  # the write is now running on a worker thread
+    store.set_status(job, JobStatus.cancelled)
+    store.discard_result(job)
+    await save
+    assert job.result_path is None
+    assert store.result_bytes == 0
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+
+def test_rejects_unknown_eviction_policy():
+    with pytest.raises(ValueError):
+        JobStore(max_jobs=10, max_bytes=10, eviction="random")
+
+
+@pytest.mark.anyio
+async def test_status_counters_follow_transitions():
+    store = JobStore(max_jobs=2, max_bytes=10**6)
+    a, b, c = Job("a"), Job("b"), Job("c")
+    for job in (a, b, c):
+        store.add(job)
+    assert store.count(JobStatus.queued) == 3
+    assert store.active_count() == 3
+
+    store.set_status(a, JobStatus.processing)
+    store.set_status(b, JobStatus.completed)  # over max_jobs: evicted right away
+    assert "b" not in store
+    assert store.count(JobStatus.queued) == 1
+    assert store.count(JobStatus.processing) == 1
+    assert store.count(JobStatus.completed) == 0
+    assert store.active_count() == 2
+    assert store.stats()["by_status"]["processing"] == 1
+
+
+@pytest.mark.anyio
+async def test_thumbnails_share_the_result_budget_and_lifecycle():
+    store = JobStore(max_jobs=100, max_bytes=40)
+    job = await _finished(store, "a", 10)
+    store.save_thumbnails(job, {64: b"t" * 3, 128: b"t" * 5})
+    assert store.result_bytes == 18
+    # Rebuilding replaces rather than double-counts
+    store.save_thumbnails(job, {64: b"t" * 2})
+    assert store.result_bytes == 12
+    store.discard_result(job)
+    assert job.thumbnails is None
+    assert store.result_bytes == 0
+
+    b = await _finished(store, "b", 10)
+    store.save_thumbnails(b, {64: b"t" * 25})
+    await _finished(store, "c", 10)
+    assert "b" not in store  # evicted oldest first, thumbnails and all
+    assert store.result_bytes == 10
+
+
+def test_thumbnails_for_missing_job_are_ignored():
+    store = JobStore(max_jobs=10, max_bytes=100)
+    job = Job("gone")
+    store.save_thumbnails(job, {64: b"t"})
+    assert job.thumbnails is None
+    assert store.result_bytes == 0
+
+
+def test_job_has_no_instance_dict():
+    job = Job("slots")
+    assert not hasattr(job, "__dict__")
+    with pytest.raises(AttributeError):
+        job.unexpected = 1
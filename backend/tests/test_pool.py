@@ -0,0 +1,168 @@
+"""Tests for ComfyUIPool routing against several mock ComfyUI servers."""
+
+import asyncio
+import io
+import socket
+
+import pytest
+from PIL import Image
+
+from backend.comfyui import ComfyUIError
+from backend.config import settings
+from backend.pool import ComfyUIPool
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+def _sketch() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _dead_url() -> str:
+    """URL of a local port nothing is listening on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.mark.anyio
+async def test_jobs_spread_across_backends(mock_comfyui_server):
+    servers = [mock_comfyui_server() for _ in range(3)]
+    pool = ComfyUIPool([url for url, _ in servers])
+    await pool.start()
+    try:
+        await asyncio.gather(*[
+            pool.generate(_sketch(), f"p{i}", 4, 0.75, seed=i) for i in range(9)
+        ])
+        counts = [app.state.prompt_count for _, app in servers]
+        assert counts == [3, 3, 3]
+        assert [b["completed"] for b in pool.stats()] == [3, 3, 3]
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_pick_prefers_shortest_queue(mock_comfyui_server):
+    servers = [mock_comfyui_server() for _ in range(2)]
+    pool = ComfyUIPool([url for url, _ in servers])
+    await pool.start()
+    try:
+        busy, idle = pool.backends
+        busy.queue_depth = 4
+        idle.in_flight = 1
+        assert pool.pick() is idle
+        idle.in_flight = 5
+        assert pool.pick() is busy
+    finally:
+        idle.in_flight = 0
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_unhealthy_backend_is_skipped(mock_comfyui_server):
+    url, app = mock_comfyui_server()
+    pool = ComfyUIPool([_dead_url(), url])
+    await pool.start()
+    try:
+        dead, live = pool.backends
+        assert not dead.healthy
+        assert live.healthy
+        await pool.generate(_sketch(), "p", 4, 0.75, seed=1)
+        assert app.state.prompt_count == 1
+        assert pool.stats()[0]["last_error"]
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_connect_error_retries_on_next_backend(mock_comfyui_server):
+    url, app = mock_comfyui_server()
+    pool = ComfyUIPool([_dead_url(), url])
+    await pool.start()
+    try:
+        dead, live = pool.backends
+        dead.healthy = True  # not yet noticed by the health probe
+        live.queue_depth = 10
+        await pool.generate(_sketch(), "p", 4, 0.75, seed=1)
+        assert not dead.healthy
+        assert app.state.prompt_count == 1
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_no_healthy_backends():
+    pool = ComfyUIPool([_dead_url()])
+    await pool.start()
+    try:
+        assert await pool.health_check() is False
+        with pytest.raises(ComfyUIError, match="No healthy"):
+            await pool.generate(_sketch(), "p", 4, 0.75, seed=1)
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_single_backend_survives_probe_blip(mock_comfyui_server):
+    url, app = mock_comfyui_server()
+    pool = ComfyUIPool([url])
+    await pool.start()
+    try:
+        backend = pool.backends[0]
+        get_queue_depth = backend.get_queue_depth
+
+        async def timeout():
+            raise TimeoutError("probe timed out")
+
+        backend.get_queue_depth = timeout
+        for _ in range(settings.comfyui_unhealthy_after - 1):
+            await pool.refresh()
+        assert backend.healthy
+        await pool.generate(_sketch(), "p", 4, 0.75, seed=1)
+        assert app.state.prompt_count == 1
+
+        await pool.refresh()
+        assert not backend.healthy
+
+        backend.get_queue_depth = get_queue_depth
+        await pool.refresh()
+        assert backend.healthy
+        assert backend.probe_failures == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_concurrency_is_capped_per_backend(mock_comfyui_server):
+    url, app = mock_comfyui_server()
+    pool = ComfyUIPool([_dead_url(), url], max_concurrent=2)
+    await pool.start()
+    try:
+        dead, live = pool.backends
+        assert not dead.healthy
+        running = peak = 0
+
+        async def slow_generate(*args, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return b"png"
+
+        live.generate = slow_generate
+        # As many jobs as the scheduler would dispatch for two healthy backends
+        results = await asyncio.gather(*[
+            pool.generate(_sketch(), f"p{i}", 4, 0.75, seed=i) for i in range(4)
+        ])
+        assert results == [b"png"] * 4
+        assert peak == 2
+        assert live.in_flight == 0
+    finally:
+        await pool.close()
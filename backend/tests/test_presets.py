@@ -0,0 +1,76 @@
+"""Tests for the manifest-backed preset registry."""
+
+import io
+import json
+import logging
+
+import pytest
+from PIL import Image
+
+from backend.http_cache import content_etag
+from backend.presets import DEFAULT_MANIFEST, PresetRegistry, build_manifest
+
+
+def _png(color: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("L", (4, 4), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+FIRST, SECOND = _png(0), _png(255)
+
+
+@pytest.fixture()
+def manifest(tmp_path):
+    (tmp_path / "a.png").write_bytes(FIRST)
+    (tmp_path / "b.png").write_bytes(SECOND)
+    path = tmp_path / "presets.json"
+    path.write_text(json.dumps({"presets": [
+        {"id": "b", "name": "B", "default_prompt": "bee", "file": "b.png", "etag": content_etag(SECOND)},
+        {"id": "a", "name": "A", "default_prompt": "ay", "file": "a.png", "etag": content_etag(FIRST)},
+        {"id": "gone", "name": "Gone", "default_prompt": "", "file": "missing.png", "etag": ""},
+    ]}))
+    return path
+
+
+def test_registry_is_lazy_and_ordered(manifest):
+    registry = PresetRegistry(str(manifest))
+    assert registry._presets is None  # nothing read until first access
+    assert list(registry) == ["b", "a"]  # manifest order; missing files skipped
+    preset = registry["a"]
+    assert preset.name == "A" and preset.etag == content_etag(FIRST)
+    assert preset._image_bytes is None  # metadata alone doesn't read the PNG
+    assert preset.image_bytes == FIRST
+    assert "gone" not in registry
+
+
+def test_registry_picks_up_new_presets_without_code_changes(manifest):
+    data = json.loads(manifest.read_text())
+    data["presets"] = [e for e in data["presets"] if e["id"] != "gone"]
+    Image.new("L", (8, 4), 255).save(manifest.parent / "c.png")
+    data["presets"].append({"id": "c", "name": "C", "default_prompt": "sea", "file": "c.png"})
+    manifest.write_text(json.dumps(data))
+    entry = next(e for e in build_manifest(str(manifest))["presets"] if e["id"] == "c")
+    assert entry["etag"] == content_etag((manifest.parent / "c.png").read_bytes())
+    assert (entry["width"], entry["height"]) == (8, 4)
+    assert PresetRegistry(str(manifest))["c"].etag == entry["etag"]
+
+
+def test_stale_manifest_hash_is_corrected(manifest, caplog):
+    (manifest.parent / "a.png").write_bytes(b"\x89PNG edited")
+    preset = PresetRegistry(str(manifest))["a"]
+    with caplog.at_level(logging.WARNING, logger="backend.presets"):
+        assert preset.image_bytes == b"\x89PNG edited"
+    assert preset.etag == content_etag(b"\x89PNG edited")
+    assert "does not match" in caplog.text
+
+
+def test_missing_manifest_means_no_presets(tmp_path):
+    assert len(PresetRegistry(str(tmp_path / "nope.json"))) == 0
+
+
+def test_bundled_manifest_is_up_to_date():
+    registry = PresetRegistry(DEFAULT_MANIFEST)
+    assert list(registry) == ["llama", "birds", "house", "face"]
+    for preset in registry.values():
+        assert content_etag(preset.path.read_bytes()) == preset.etag, f"rebuild the manifest for {preset.id}"
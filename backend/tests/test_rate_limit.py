@@ -0,0 +1,64 @@
+"""Tests for the GCRA rate limiter."""
+
+from backend.rate_limit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_allows_burst_then_limits():
+    clock = FakeClock()
+    rl = RateLimiter(max_keys=100, clock=clock)
+    assert all(rl.allow("ip", "generate", 60, 15) for _ in range(15))
+    assert not rl.allow("ip", "generate", 60, 15)
+
+
+def test_requests_are_earned_back_over_the_window():
+    clock = FakeClock()
+    rl = RateLimiter(max_keys=100, clock=clock)
+    for _ in range(3):
+        rl.allow("ip", "generate", 60, 3)
+    assert not rl.allow("ip", "generate", 60, 3)
+    clock.now += 20  # one emission interval
+    assert rl.allow("ip", "generate", 60, 3)
+    assert not rl.allow("ip", "generate", 60, 3)
+    clock.now += 60
+    assert all(rl.allow("ip", "generate", 60, 3) for _ in range(3))
+
+
+def test_buckets_and_keys_are_independent():
+    clock = FakeClock()
+    rl = RateLimiter(max_keys=100, clock=clock)
+    for _ in range(10):
+        rl.allow("ip", "assist", 60, 10)
+    assert not rl.allow("ip", "assist", 60, 10)
+    assert rl.allow("ip", "generate", 60, 15)
+    assert rl.allow("other", "assist", 60, 10)
+
+
+def test_sweep_drops_recovered_keys():
+    clock = FakeClock()
+    rl = RateLimiter(max_keys=100, clock=clock)
+    rl.allow("a", "generate", 60, 15)
+    clock.now += 30
+    rl.allow("b", "generate", 60, 15)
+    assert rl.sweep() == 1  # a's 4s interval has long passed; b's has not
+    assert len(rl) == 1
+
+
+def test_key_cap_bounds_memory():
+    clock = FakeClock()
+    rl = RateLimiter(max_keys=50, clock=clock)
+    for i in range(1000):
+        assert rl.allow(f"ip{i}", "generate", 60, 15)
+    assert len(rl) == 50
+    assert rl.stats()["dropped"] == 950
+    # The most recent keys are the ones still tracked
+    for _ in range(14):
+        rl.allow("ip999", "generate", 60, 15)
+    assert not rl.allow("ip999", "generate", 60, 15)
@@ -0,0 +1,60 @@
+"""Tests for the seeded result cache."""
+
+import pytest
+
+from backend.result_cache import ResultCache, cache_key
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+def test_cache_key_covers_every_input():
+    base = dict(image_bytes=b"png", prompt="p", steps=4, denoise=0.75, hd=False, seed=1, workflow_fingerprint="wf")
+    key = cache_key(**base)
+    assert key == cache_key(**base)
+    for field, value in [
+        ("image_bytes", b"other"), ("prompt", "q"), ("steps", 5), ("denoise", 0.5),
+        ("hd", True), ("seed", 2), ("workflow_fingerprint", "wf2"),
+    ]:
+        assert cache_key(**{**base, field: value}) != key
+
+
+@pytest.mark.anyio
+async def test_evicts_least_recently_used_by_bytes():
+    cache = ResultCache(max_bytes=25)
+    await cache.put("a", b"x" * 10)
+    await cache.put("b", b"y" * 10)
+    assert await cache.get("a") == b"x" * 10  # a is now most recent
+    await cache.put("c", b"z" * 10)
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert cache.bytes_used == 20
+    await cache.put("huge", b"h" * 100)  # larger than the whole budget: not cached
+    assert await cache.get("huge") is None
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+@pytest.mark.anyio
+async def test_disk_persistence_survives_restart(tmp_path):
+    cache = ResultCache(max_bytes=100, directory=str(tmp_path), max_disk_bytes=100)
+    await cache.put("k", b"png-bytes")
+
+    reloaded = ResultCache(max_bytes=100, directory=str(tmp_path), max_disk_bytes=100)
+    assert len(reloaded) == 0
+    assert await reloaded.get("k") == b"png-bytes"
+    assert reloaded.stats()["disk_hits"] == 1
+    assert len(reloaded) == 1
+
+
+@pytest.mark.anyio
+async def test_disk_budget_drops_oldest_files(tmp_path):
+    cache = ResultCache(max_bytes=100, directory=str(tmp_path), max_disk_bytes=15)
+    await cache.put("old", b"o" * 10)
+    await cache.put("new", b"n" * 10)
+    assert sorted(p.stem for p in tmp_path.glob("*.png")) == ["new"]
+    assert cache.disk_bytes == 10
@@ -0,0 +1,140 @@
+"""Tests for the bounded generation scheduler."""
+
+import asyncio
+
+import pytest
+
+from backend.models import Job, JobStatus
+from backend.scheduler import GenerationScheduler, QueueFullError
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_concurrency_is_bounded():
+    running = 0
+    peak = 0
+
+    async def run(job):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        job.status = JobStatus.processing
+        await asyncio.sleep(0.02)
+        running -= 1
+        job.status = JobStatus.completed
+
+    sched = GenerationScheduler(run, max_queue=20, concurrency=2)
+    batch = [Job(f"j{i}") for i in range(8)]
+    for job in batch:
+        sched.submit(job)
+    await sched._queue.join()
+    await sched.close()
+
+    assert peak == 2
+    assert all(j.status == JobStatus.completed for j in batch)
+    assert all(j.dispatched_at >= j.created_at for j in batch)
+
+
+@pytest.mark.anyio
+async def test_full_queue_rejects_with_retry_after():
+    release = asyncio.Event()
+
+    async def run(job):
+        await release.wait()
+
+    sched = GenerationScheduler(run, max_queue=2, concurrency=1)
+    sched.submit(Job("running"))
+    await asyncio.sleep(0)  # let the worker pick it up
+    sched.submit(Job("a"))
+    sched.submit(Job("b"))
+    assert sched.is_full()
+    with pytest.raises(QueueFullError) as info:
+        sched.submit(Job("c"))
+    assert info.value.retry_after >= 1
+    release.set()
+    await sched._queue.join()
+    await sched.close()
+
+
+@pytest.mark.anyio
+async def test_cancelled_job_is_never_dispatched():
+    ran = []
+
+    async def run(job):
+        ran.append(job.job_id)
+
+    sched = GenerationScheduler(run, max_queue=5, concurrency=1)
+    keep, drop = Job("keep"), Job("drop")
+    drop.status = JobStatus.cancelled
+    sched.submit(drop)
+    sched.submit(keep)
+    await sched._queue.join()
+    await sched.close()
+
+    assert ran == ["keep"]
+    assert drop.dispatched_at is None
+
+
+@pytest.mark.anyio
+async def test_cancel_stops_running_job_and_credits_saved_time():
+    started = asyncio.Event()
+    interrupted = []
+
+    async def run(job):
+        job.status = JobStatus.processing
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            interrupted.append(job.job_id)
+            raise
+
+    sched = GenerationScheduler(run, max_queue=5, concurrency=1, initial_job_seconds=30.0)
+    slow, waiting = Job("slow"), Job("waiting")
+    sched.submit(slow)
+    sched.submit(waiting)
+    await started.wait()
+
+    waiting.status = JobStatus.cancelled
+    assert sched.cancel(waiting) == 30.0
+    assert sched.depth == 0  # skipped at dispatch, so it no longer counts against max_queue
+    slow.status = JobStatus.cancelled
+    assert 29.0 < sched.cancel(slow) <= 30.0
+    await asyncio.wait_for(sched._queue.join(), timeout=1.0)
+    await sched.close()
+
+    assert interrupted == ["slow"]
+    assert waiting.dispatched_at is None
+    stats = sched.stats()
+    assert (stats["cancelled_queued"], stats["cancelled_running"]) == (1, 1)
+    assert 59.0 < stats["gpu_seconds_saved"] <= 60.0
+    assert stats["avg_job_seconds"] == 30.0  # cancelled runs don't skew the estimate
+
+
+@pytest.mark.anyio
+async def test_batch_keeps_running_until_every_variation_is_cancelled():
+    started = asyncio.Event()
+    finished = []
+
+    async def run(group):
+        started.set()
+        await asyncio.sleep(10)
+        finished.append(group)
+
+    sched = GenerationScheduler(run, max_queue=5, concurrency=1)
+    a, b = Job("a"), Job("b")
+    sched.submit_group([a, b], run, [a, b])
+    await started.wait()
+
+    a.status = JobStatus.cancelled
+    assert sched.cancel(a) == 0.0
+    assert sched.in_flight == 1
+    b.status = JobStatus.cancelled
+    assert sched.cancel(b) > 0
+    await asyncio.wait_for(sched._queue.join(), timeout=1.0)
+    await sched.close()
+    assert finished == []
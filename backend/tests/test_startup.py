@@ -0,0 +1,54 @@
+"""Cold-start budget: importing the app and serving the first request stays fast.
+
+Each check runs in a fresh interpreter, as a new container or reloaded worker
+would. The budget defaults to 1500 ms (best of three runs); set
+PENCIL_COLD_START_BUDGET_MS to tighten or relax it for a given machine.
+Profile regressions with ``python3 scripts/bench_startup.py --profile``.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+BUDGET_MS = float(os.environ.get("PENCIL_COLD_START_BUDGET_MS", "1500"))
+# Only the code paths that handle images should pay for these
+DEFERRED_MODULES = ("PIL",)
+
+_CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import backend.main as m
+loaded = sorted({name.split(".")[0] for name in sys.modules})
+
+async def first_request():
+    from httpx import ASGITransport, AsyncClient
+    async with AsyncClient(transport=ASGITransport(app=m.app), base_url="http://test") as c:
+        (await c.get("/api/sketches")).raise_for_status()
+
+asyncio.run(first_request())
+print(json.dumps({"ms": (time.perf_counter() - start) * 1000, "modules": loaded}))
+"""
+
+
+def _cold_start(dev_mode: bool) -> dict:
+    env = {**os.environ, "PENCIL_DEV_MODE": "true" if dev_mode else "false"}
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("dev_mode", [False, True])
+def test_heavy_imports_are_deferred(dev_mode):
+    loaded = set(_cold_start(dev_mode)["modules"])
+    assert not loaded.intersection(DEFERRED_MODULES)
+
+
+def test_cold_start_within_budget():
+    best = min(_cold_start(dev_mode=False)["ms"] for _ in range(3))
+    assert best <= BUDGET_MS, f"cold start took {best:.0f} ms (budget {BUDGET_MS:.0f} ms)"
@@ -0,0 +1,85 @@
+"""Tests for precompressed static asset serving."""
+
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from backend import static_assets
+from backend.static_assets import PrecompressedStaticFiles, precompress
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture()
+def static_dir(tmp_path):
+    (tmp_path / "index.html").write_text("<html>" + "hello world " * 500 + "</html>")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG not really")
+    return tmp_path
+
+
+def _client(directory) -> AsyncClient:
+    app = FastAPI()
+    app.mount("/static", PrecompressedStaticFiles(directory=str(directory)), name="static")
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+def test_precompress_builds_text_variants_only(static_dir):
+    written = {p.name for p in precompress(str(static_dir))}
+    expected = {"index.html.gz"} | ({"index.html.br"} if static_assets.brotli else set())
+    assert written == expected
+    assert gzip.decompress((static_dir / "index.html.gz").read_bytes()) == (static_dir / "index.html").read_bytes()
+    # Up-to-date variants are left alone
+    assert precompress(str(static_dir)) == []
+
+
+@pytest.mark.anyio
+async def test_serves_best_accepted_encoding(static_dir):
+    precompress(str(static_dir))
+    async with _client(static_dir) as c:
+        r = await c.get("/static/index.html", headers={"accept-encoding": "gzip"})
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.headers["content-type"].startswith("text/html")
+        assert r.headers["vary"] == "Accept-Encoding"
+        assert r.text.startswith("<html>hello world")  # httpx decodes it
+
+        if static_assets.brotli:
+            r = await c.get("/static/index.html", headers={"accept-encoding": "gzip, br"})
+            assert r.headers["content-encoding"] == "br"
+
+        r = await c.get("/static/index.html", headers={"accept-encoding": "identity"})
+        assert "content-encoding" not in r.headers
+
+        r = await c.get("/static/logo.png", headers={"accept-encoding": "gzip"})
+        assert "content-encoding" not in r.headers
+
+
+@pytest.mark.anyio
+async def test_conditional_get_per_encoding(static_dir):
+    precompress(str(static_dir))
+    async with _client(static_dir) as c:
+        r = await c.get("/static/index.html", headers={"accept-encoding": "gzip"})
+        etag = r.headers["etag"]
+        r = await c.get("/static/index.html", headers={"accept-encoding": "gzip", "if-none-match": etag})
+        assert r.status_code == 304
+        # The identity variant has its own validator
+        r = await c.get("/static/index.html", headers={"accept-encoding": "identity", "if-none-match": etag})
+        assert r.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_stale_variant_is_ignored(static_dir):
+    precompress(str(static_dir))
+    source = static_dir / "index.html"
+    source.write_text("<html>changed</html>")
+    stamp = (static_dir / "index.html.gz").stat().st_mtime + 10
+    os.utime(source, (stamp, stamp))
+    async with _client(static_dir) as c:
+        r = await c.get("/static/index.html", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.text == "<html>changed</html>"
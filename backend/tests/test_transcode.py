@@ -0,0 +1,116 @@
+"""Tests for result transcoding and format negotiation."""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from backend.transcode import THUMB_SIZES, Transcoder, available_formats, make_thumbnails, negotiate, transcode
+
+
+@pytest.fixture()
+def anyio_backend():
+    return "asyncio"
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (128, 128), (120, 80, 200)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+ALL = ("avif", "webp", "png")
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        ("image/avif,image/webp,image/apng,image/*,*/*;q=0.8", "avif"),
+        ("image/webp,*/*", "webp"),
+        ("image/avif;q=0,image/webp", "webp"),
+        ("*/*", "png"),
+        ("image/*", "png"),
+        ("", "png"),
+        ("image/webp;q=bogus", "png"),
+    ],
+)
+def test_negotiate(accept, expected):
+    assert negotiate(accept, ALL) == expected
+
+
+def test_negotiate_skips_unavailable_formats():
+    assert negotiate("image/avif,image/webp", ("webp", "png")) == "webp"
+
+
+def test_available_formats_always_include_png():
+    assert available_formats()[-1] == "png"
+
+
+@pytest.mark.parametrize("fmt", ["webp", "avif"])
+def test_transcode_round_trips(fmt):
+    if fmt not in available_formats():
+        pytest.skip(f"Pillow built without {fmt}")
+    out = transcode(_png(), fmt, 60)
+    img = Image.open(io.BytesIO(out))
+    assert img.format == fmt.upper()
+    assert img.size == (128, 128)
+
+
+def test_transcode_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        transcode(_png(), "gif", 80)
+
+
+@pytest.mark.anyio
+async def test_transcoder_caches_and_coalesces():
+    t = Transcoder(max_workers=2, cache_bytes=10**6)
+    data = _png()
+    results = await asyncio.gather(*(t.get("job", data, "webp", 80) for _ in range(5)))
+    assert len(set(results)) == 1
+    assert t.encoded == 1
+    await t.get("job", data, "webp", 80)
+    assert t.encoded == 1
+    # A different quality is a different rendition
+    await t.get("job", data, "webp", 50)
+    assert t.encoded == 2
+    assert t.stats()["cache"]["hits"] >= 1
+    t.close()
+
+
+@pytest.mark.anyio
+async def test_disconnected_client_does_not_fail_other_waiters():
+    t = Transcoder(max_workers=1, cache_bytes=10**6)
+    release = asyncio.Event()
+    run = t.run
+
+    async def gated_run(fn, *args):
+        await release.wait()
+        return await run(fn, *args)
+
+    t.run = gated_run
+    data = _png()
+    first = asyncio.create_task(t.get("job", data, "webp", 80))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(t.get("job", data, "webp", 80))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    release.set()
+    out = await asyncio.wait_for(second, 5.0)
+    assert Image.open(io.BytesIO(out)).format == "WEBP"
+    assert t.encoded == 1
+    t.close()
+
+
+def test_make_thumbnails_builds_every_size():
+    buf = io.BytesIO()
+    Image.new("RGB", (1024, 768), (10, 200, 30)).save(buf, format="PNG")
+    thumbs = make_thumbnails(buf.getvalue())
+    assert sorted(thumbs) == sorted(THUMB_SIZES)
+    for size, data in thumbs.items():
+        img = Image.open(io.BytesIO(data))
+        assert img.format == "WEBP"
+        assert max(img.size) == size
+        assert len(data) < 4096
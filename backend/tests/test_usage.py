@@ -1,6 +1,13 @@
 """Tests for the UsageTracker module."""
 
-from backend.usage import UsageTracker, hash_ip
+import csv
+import gzip
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.hll import HyperLogLog
+from backend.usage import SCHEMA_VERSION, UsageTracker, hash_ip
 
 
 class TestHashIp:
@@ -60,3 +67,265 @@ class TestUsageTracker:
         t.record("a")
         t.record("b")
         assert t.get_global_total() == 2
+
+
+class TestWriteBehind:
+    def test_record_does_not_block_on_disk(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", flush_interval=60)
+        t.record("a", 3)
+        # Nothing committed yet, but every read already sees the increment
+        committed = t.conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0]
+        assert committed == 0
+        assert t.get_today("a") == 3
+        assert t.get_total("a") == 3
+        assert t.get_global_today() == 3
+        assert t.get_global_total() == 3
+        assert t.get_unique_today() == 1
+        t.close()
+
+    def test_close_flushes_pending(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", flush_interval=60)
+        t.record("a")
+        t.record("b", 2)
+        t.close()
+        t2 = UsageTracker(tmp_db, "salt")
+        assert t2.get_today("a") == 1
+        assert t2.get_today("b") == 2
+        assert t2.get_unique_today() == 2
+        t2.close()
+
+    def test_flush_max_triggers_early_write(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", flush_interval=60, flush_max=5)
+        for i in range(5):
+            t.record(f"ip{i}")
+        deadline = time.monotonic() + 2
+        while t.flushes == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert t.flushes >= 1
+        assert t.conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 5
+        # Counts are not double-counted once the rows are committed
+        assert t.get_global_today() == 5
+        assert t.get_unique_today() == 5
+        t.close()
+
+    def test_counts_survive_restart_and_accumulate(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt")
+        t.record("a", 4)
+        t.close()
+        t2 = UsageTracker(tmp_db, "salt", flush_interval=60)
+        t2.record("a")
+        assert t2.get_today("a") == 5
+        assert t2.get_unique_today() == 1
+        t2.close()
+
+    def test_lookups_do_not_count_as_users(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", flush_interval=60, stats_ttl=0)
+        t.record("a")
+        t.snapshot("viewer")
+        t.get_today("rejected")
+        assert t.get_unique_today() == 1
+        t.flush()
+        assert t.get_unique_today() == 1
+        assert t.snapshot("viewer")["unique_users_today"] == 1
+        t.close()
+
+
+class TestRollups:
+    def test_migration_backfills_existing_rows(self, tmp_db):
+        conn = sqlite3.connect(tmp_db)
+        conn.execute(
+            "CREATE TABLE usage (ip_hash TEXT NOT NULL, date TEXT NOT NULL,"
+            " generation_count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (ip_hash, date))"
+        )
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        conn.executemany(
+            "INSERT INTO usage VALUES (?, ?, ?)",
+            [("a", "2024-01-01", 5), ("b", "2024-01-01", 2), ("a", today, 3), ("c", today, 1)],
+        )
+        conn.commit()
+        conn.close()
+
+        t = UsageTracker(tmp_db, "salt")
+        assert t.get_global_total() == 11
+        assert t.get_global_today() == 4
+        assert t.get_unique_today() == 2
+        assert t.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        t.close()
+
+    def test_rollups_track_flushed_rows(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt")
+        t.record("a", 2)
+        t.record("b")
+        t.close()
+        t = UsageTracker(tmp_db, "salt")
+        t.record("a")
+        t.record("c", 4)
+        t.close()
+
+        conn = sqlite3.connect(tmp_db)
+        daily = conn.execute("SELECT SUM(generation_count), SUM(unique_ips) FROM usage_daily").fetchone()
+        total = conn.execute("SELECT generation_count FROM usage_totals").fetchone()[0]
+        raw = conn.execute("SELECT SUM(generation_count), COUNT(*) FROM usage").fetchone()
+        conn.close()
+        assert daily == raw == (8, 3)
+        assert total == 8
+
+
+class TestSnapshot:
+    def test_snapshot_matches_individual_reads(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", stats_ttl=0)
+        t.record("a", 2)
+        t.record("b")
+        assert t.snapshot("a") == {
+            "today": 2,
+            "total": 2,
+            "global_today": t.get_global_today(),
+            "global_total": t.get_global_total(),
+            "unique_users_today": t.get_unique_today(),
+            "unique_users_7d": 2,
+            "unique_users_30d": 2,
+        }
+        t.close()
+
+    def test_global_stats_cached_within_ttl(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", stats_ttl=60)
+        t.record("a")
+        assert t.global_stats()["global_today"] == 1
+        t.record("b")
+        queries = []
+        t.conn.set_trace_callback(queries.append)
+        # Served from the shared cache: stale global figures, no new query
+        assert t.global_stats()["global_today"] == 1
+        assert queries == []
+        # The caller's own counts are never stale
+        assert t.snapshot("b")["today"] == 1
+        t.close()
+
+    def test_global_stats_refresh_after_ttl(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", stats_ttl=0)
+        t.record("a")
+        assert t.global_stats()["global_total"] == 1
+        t.record("a")
+        assert t.global_stats()["global_total"] == 2
+        t.close()
+
+
+class TestUniqueSketches:
+    def test_multi_day_uniques_union_previous_days(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt")
+        t.record("a")
+        t.record("b")
+        t.close()
+        today = datetime.now(timezone.utc).date()
+        conn = sqlite3.connect(tmp_db)
+        for days_ago, ips in ((3, ["a", "c"]), (10, ["d", "e", "f"]), (40, ["g"])):
+            date = (today - timedelta(days=days_ago)).isoformat()
+            sketch = HyperLogLog()
+            for ip in ips:
+                sketch.add(ip)
+            conn.execute("INSERT INTO usage_hll VALUES (?, ?)", (date, sketch.to_bytes()))
+        conn.commit()
+        conn.close()
+
+        t = UsageTracker(tmp_db, "salt")
+        stats = t.global_stats()
+        assert stats["unique_users_today"] == 2
+        assert stats["unique_users_7d"] == 3  # a, b, c
+        assert stats["unique_users_30d"] == 6  # a through f
+        t.close()
+
+    def test_sketch_persists_across_restart(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt")
+        for i in range(50):
+            t.record(f"ip{i}")
+        t.close()
+        t = UsageTracker(tmp_db, "salt", stats_ttl=0)
+        t.record("ip0")
+        t.record("new")
+        assert t.global_stats()["unique_users_7d"] == 51
+        t.close()
+
+    def test_lookups_do_not_enter_sketch(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt", stats_ttl=0)
+        t.record("a")
+        for ip in ("viewer1", "viewer2"):
+            t.snapshot(ip)
+            t.get_today(ip)
+        t.close()
+        t = UsageTracker(tmp_db, "salt", stats_ttl=0)
+        stats = t.global_stats()
+        assert stats["unique_users_7d"] == 1
+        assert stats["unique_users_30d"] == 1
+        t.close()
+
+    def test_migration_builds_sketches(self, tmp_db):
+        conn = sqlite3.connect(tmp_db)
+        conn.execute(
+            "CREATE TABLE usage (ip_hash TEXT NOT NULL, date TEXT NOT NULL,"
+            " generation_count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (ip_hash, date))"
+        )
+        yesterday = (datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
+        conn.executemany("INSERT INTO usage VALUES (?, ?, 1)", [(f"ip{i}", yesterday) for i in range(20)])
+        conn.commit()
+        conn.close()
+        t = UsageTracker(tmp_db, "salt")
+        assert t.global_stats()["unique_users_7d"] == 20
+        t.close()
+
+
+class TestRetention:
+    def _seed_old_rows(self, tmp_db):
+        t = UsageTracker(tmp_db, "salt")
+        t.close()
+        today = datetime.now(timezone.utc).date()
+        old = (today - timedelta(days=120)).isoformat()
+        older = (today - timedelta(days=200)).isoformat()
+        rows = [("a", older, 2), ("a", old, 3), ("b", old, 1)]
+        conn = sqlite3.connect(tmp_db)
+        conn.executemany("INSERT INTO usage VALUES (?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO usage_daily VALUES (?, ?, ?)", [(older, 2, 1), (old, 4, 2)]
+        )
+        conn.execute("UPDATE usage_totals SET generation_count = 6")
+        conn.commit()
+        conn.close()
+        return rows
+
+    def test_compaction_archives_and_keeps_totals(self, tmp_db, tmp_path):
+        rows = self._seed_old_rows(tmp_db)
+        archive_dir = tmp_path / "archive"
+        t = UsageTracker(tmp_db, "salt", retention_days=90, archive_dir=str(archive_dir))
+        t.record("a")
+        t.flush()
+        result = t.run_maintenance()
+        assert result["archived_rows"] == 3
+
+        # Old per-IP rows are gone from the hot table, recent ones stay
+        remaining = t.conn.execute("SELECT ip_hash, generation_count FROM usage").fetchall()
+        assert remaining == [("a", 1)]
+        # Lifetime figures are unchanged
+        assert t.get_total("a") == 6
+        assert t.get_total("b") == 1
+        assert t.get_global_total() == 7
+
+        with gzip.open(result["archive"], "rt", newline="") as f:
+            archived = list(csv.reader(f))
+        assert archived[0] == ["ip_hash", "date", "generation_count"]
+        assert sorted((ip, d, int(n)) for ip, d, n in archived[1:]) == sorted(rows)
+        t.close()
+
+    def test_compaction_is_idempotent(self, tmp_db, tmp_path):
+        self._seed_old_rows(tmp_db)
+        t = UsageTracker(tmp_db, "salt", retention_days=90, archive_dir=str(tmp_path))
+        t.run_maintenance()
+        assert t.run_maintenance()["archived_rows"] == 0
+        assert t.get_total("a") == 5
+        assert len(list(tmp_path.glob("*.csv.gz"))) == 1
+        t.close()
+
+    def test_no_retention_keeps_rows(self, tmp_db):
+        self._seed_old_rows(tmp_db)
+        t = UsageTracker(tmp_db, "salt")
+        assert t.run_maintenance()["archived_rows"] == 0
+        assert t.conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 3
+        t.close()
@@ -0,0 +1,151 @@
+"""Content-negotiated re-encoding of result PNGs to WebP or AVIF.
+
+ComfyUI hands back lossless PNGs that are far larger than a browser needs.
+``Transcoder`` re-encodes them on a bounded thread pool, caches each
+(job, format, quality) rendition in a byte-budgeted LRU, and coalesces
+concurrent requests for the same rendition so a strip of thumbnails loading
+at once only encodes each image once.
+
+Thumbnails for variation strips and history come in a few fixed sizes, so
+all of them are built in one pass when a job completes and kept with its
+result.
+"""
+
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .result_cache import ResultCache
+
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "avif": "image/avif"}
+# Best first; PNG is the fallback every client accepts
+_PREFERENCE = ("avif", "webp", "png")
+THUMB_SIZES = (64, 128, 256)  # longest side in pixels
+THUMB_QUALITY = 75
+
+
+def available_formats() -> tuple[str, ...]:
+    """Formats this Pillow build can encode, best first."""
+    from PIL import features
+
+    return tuple(fmt for fmt in _PREFERENCE if fmt == "png" or features.check(fmt))
+
+
+def negotiate(accept: str, formats: tuple[str, ...]) -> str:
+    """Pick the best of `formats` the client lists in its Accept header.
+
+    Only explicitly named types count: wildcards keep the PNG the API has
+    always returned, so clients that send ``*/*`` see no change.
+    """
+    accepted = set()
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(media_type.strip().lower())
+    for fmt in formats:
+        if MEDIA_TYPES[fmt] in accepted:
+            return fmt
+    return "png"
+
+
+def transcode(data: bytes, fmt: str, quality: int) -> bytes:
+    """Re-encode PNG bytes as `fmt`. Blocking; use ``Transcoder.get`` from async code."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    buf = io.BytesIO()
+    if fmt == "webp":
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    elif fmt == "avif":
+        img.save(buf, format="AVIF", quality=quality, speed=8)
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
+    return buf.getvalue()
+
+
+def make_thumbnails(data: bytes, sizes: tuple[int, ...] = THUMB_SIZES) -> dict[int, bytes]:
+    """WebP thumbnails of a PNG at each size, decoding it only once. Blocking."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    thumbs = {}
+    # Largest first, each step shrinking the previous one
+    for size in sorted(sizes, reverse=True):
+        img = img.copy()
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="WEBP", quality=THUMB_QUALITY, method=4)
+        thumbs[size] = buf.getvalue()
+    return thumbs
+
+
+class Transcoder:
+    def __init__(self, max_workers: int = 0, cache_bytes: int = 64 * 1024 * 1024):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.cache = ResultCache(cache_bytes)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.encoded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def run(self, fn, *args):
+        """Run blocking image work on the pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="transcode")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, job_id: str, data: bytes, fmt: str, quality: int) -> bytes:
+        """Return `data` as `fmt`, encoding at most once per (job, format, quality)."""
+        key = f"{job_id}:{fmt}:{quality}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        task = self._in_flight.get(key)
+        if task is None:
+            # Detached so a client that disconnects mid-encode doesn't fail
+            # everyone else waiting on the same rendition
+            task = asyncio.create_task(self._encode(key, data, fmt, quality))
+            # Waiters re-raise a failure; nobody else needs to see it
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _encode(self, key: str, data: bytes, fmt: str, quality: int) -> bytes:
+        try:
+            out = await self.run(transcode, data, fmt, quality)
+            await self.cache.put(key, out)
+        finally:
+            del self._in_flight[key]
+        self.encoded += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "encoded": self.encoded,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "cache": self.cache.stats(),
+        }
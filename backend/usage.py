@@ -1,11 +1,25 @@
+import csv
+import gzip
 import hashlib
 import hmac
+import logging
+import os
 import sqlite3
-from datetime import datetime, timezone
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
 
 from fastapi import Request
 
+from .hll import HyperLogLog
 
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
 def hash_ip(ip: str, salt: str) -> str:
     """HMAC-SHA256 of IP with salt, truncated to 16 hex chars."""
     return hmac.new(salt.encode(), ip.encode(), hashlib.sha256).hexdigest()[:16]
@@ -21,11 +35,364 @@ def get_client_ip(request: Request) -> str:
 
 
 class UsageTracker:
-    def __init__(self, db_path: str, salt: str):
+    """Per-IP daily generation counts in SQLite, recorded write-behind.
+
+    ``record`` only updates memory: today's per-IP counts are authoritative
+    in RAM (so the daily-limit check never touches disk) and increments are
+    queued for a background thread, which writes them in one transaction
+    every ``flush_interval`` seconds or ``flush_max`` records. Reads add the
+    not-yet-committed increments so results stay consistent meanwhile.
+
+    Global figures come from rollup tables (``usage_daily`` per date and the
+    single-row ``usage_totals``) maintained in the same transaction as the
+    per-IP rows, so the stats queries are primary-key lookups regardless of
+    how much history ``usage`` holds.
+
+    Distinct users over several days come from per-day HyperLogLog sketches
+    (see ``hll``) persisted in ``usage_hll``; only today's sketch and the
+    cached union of earlier days stay in memory.
+
+    With ``retention_days`` set, a maintenance thread periodically archives
+    per-IP rows older than the horizon to gzipped CSV, folds them into
+    per-IP lifetime totals in ``usage_archived`` (per-day figures already live
+    in ``usage_daily``), drops them from ``usage`` and checkpoints the WAL.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        salt: str,
+        flush_interval: float = 0.5,
+        flush_max: int = 100,
+        stats_ttl: float = 2.0,
+        retention_days: int = 0,
+        archive_dir: str = "",
+        maintenance_interval: float = 0.0,
+    ):
         self.salt = salt
+        self.stats_ttl = stats_ttl
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_max = flush_max
+        # Read connection, used from the event loop; the flusher has its own
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.execute("PRAGMA journal_mode=WAL")
-        self.conn.execute(
+        _migrate(self.conn)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)  # wakes the flusher
+        self._flushed = threading.Condition(self._lock)  # signalled after each flush attempt
+        self._pending: dict[tuple[str, str], int] = {}  # (ip_hash, date) -> increment
+        self._flushing: dict[tuple[str, str], int] = {}  # batch being committed right now
+        self._day = self._today()
+        self._today_counts: dict[str, int] = {}  # authoritative counts for self._day
+        self._new_today: set[str] = set()  # IPs with no committed row for today yet
+        self._sketches: dict[str, HyperLogLog] = {}  # date -> sketch, today plus any unsaved
+        self._dirty_sketches: set[str] = set()
+        self._past_unions: dict[int, HyperLogLog] = {}  # window -> union of its days before today
+        self._past_unions_day = ""
+        self._closed = False
+        self.flushes = 0
+        self._global_stats: Optional[dict] = None
+        self._global_stats_at = float("-inf")
+        self._flusher = threading.Thread(target=self._flush_loop, name="usage-flush", daemon=True)
+        self._flusher.start()
+
+        self.retention_days = retention_days
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.maintenance_interval = maintenance_interval
+        self.last_maintenance: dict = {}
+        self._stop_maintenance = threading.Event()
+        self._maintainer = None
+        if maintenance_interval > 0:
+            self._maintainer = threading.Thread(
+                target=self._maintenance_loop, name="usage-maintenance", daemon=True
+            )
+            self._maintainer.start()
+
+    def _today(self) -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def _roll_day(self):
+        """Reset the in-memory counts at UTC midnight. Caller holds the lock."""
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._today_counts.clear()
+            self._new_today.clear()
+
+    def _load_today(self, ip_hash: str) -> int:
+        """Today's count for an IP, reading the DB only the first time. Caller holds the lock."""
+        count = self._today_counts.get(ip_hash)
+        if count is None:
+            row = self.conn.execute(
+                "SELECT generation_count FROM usage WHERE ip_hash = ? AND date = ?",
+                (ip_hash, self._day),
+            ).fetchone()
+            count = row[0] if row else 0
+            self._today_counts[ip_hash] = count
+        return count
+
+    def _today_sketch(self) -> HyperLogLog:
+        """Today's sketch, restored from the DB after a restart. Caller holds the lock."""
+        sketch = self._sketches.get(self._day)
+        if sketch is None:
+            row = self.conn.execute(
+                "SELECT registers FROM usage_hll WHERE date = ?", (self._day,)
+            ).fetchone()
+            sketch = self._sketches[self._day] = HyperLogLog(registers=row[0] if row else b"")
+        return sketch
+
+    def record(self, ip_hash: str, count: int = 1) -> None:
+        with self._lock:
+            self._roll_day()
+            before = self._load_today(ip_hash)
+            if before == 0:
+                # Only generating makes someone a user; lookups from
+                # /api/usage or admission must not count them
+                self._new_today.add(ip_hash)
+            self._today_counts[ip_hash] = before + count
+            # Re-adding an IP already in the sketch changes nothing
+            self._today_sketch().add(ip_hash)
+            self._dirty_sketches.add(self._day)
+            key = (ip_hash, self._day)
+            self._pending[key] = self._pending.get(key, 0) + count
+            if len(self._pending) >= self.flush_max:
+                self._wake.notify()
+
+    def _flush_loop(self):
+        writer = sqlite3.connect(self.db_path)
+        try:
+            while True:
+                with self._lock:
+                    if not self._closed and len(self._pending) < self.flush_max:
+                        self._wake.wait(self.flush_interval)
+                    closing = self._closed
+                self._flush(writer)
+                if closing:
+                    return
+        finally:
+            writer.close()
+
+    def _flush(self, writer: sqlite3.Connection):
+        with self._lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            batch = self._flushing
+            sketches = {date: self._sketches[date].to_bytes() for date in self._dirty_sketches}
+            self._dirty_sketches.clear()
+            # Earlier days are final once their registers are captured
+            for date in [d for d in self._sketches if d != self._day]:
+                del self._sketches[date]
+        try:
+            with writer:
+                _write_batch(writer, batch, sketches)
+        except sqlite3.Error:
+            logger.exception("Usage flush failed; will retry %d rows", len(batch))
+            with self._lock:
+                for key, n in batch.items():
+                    self._pending[key] = self._pending.get(key, 0) + n
+                self._flushing = {}
+                for date, registers in sketches.items():
+                    sketch = self._sketches.setdefault(date, HyperLogLog())
+                    sketch.merge(HyperLogLog(registers=registers))
+                    self._dirty_sketches.add(date)
+                self._flushed.notify_all()
+            return
+        with self._lock:
+            self._flushing = {}
+            for ip_hash, date in batch:
+                if date == self._day:
+                    self._new_today.discard(ip_hash)
+            self.flushes += 1
+            self._flushed.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Commit pending increments now, waiting up to `timeout` seconds.
+
+        Returns False if they were still uncommitted when the wait ran out.
+        """
+        with self._lock:
+            self._wake.notify()
+            return self._flushed.wait_for(lambda: not self._pending and not self._flushing, timeout)
+
+    def close(self) -> None:
+        """Flush everything still pending and stop the background thread."""
+        self._stop_maintenance.set()
+        if self._maintainer is not None:
+            self._maintainer.join()
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        self._flusher.join()
+        self.conn.close()
+
+    def _maintenance_loop(self):
+        while not self._stop_maintenance.wait(self.maintenance_interval):
+            try:
+                self.run_maintenance()
+            except (sqlite3.Error, OSError):
+                logger.exception("Usage maintenance failed")
+
+    def run_maintenance(self) -> dict:
+        """Compact rows past the retention horizon, then checkpoint and vacuum.
+
+        Runs on its own connection so request handling never waits on it.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            result = {"archived_rows": 0, "archive": None, "vacuumed": False}
+            if self.retention_days > 0:
+                today = datetime.now(timezone.utc).date()
+                cutoff = (today - timedelta(days=self.retention_days)).isoformat()
+                # Sketches are only unioned over the last 30 days
+                sketch_cutoff = min(cutoff, (today - timedelta(days=30)).isoformat())
+                result.update(_compact(conn, cutoff, sketch_cutoff, self.archive_dir))
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            total_pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            if total_pages and free_pages / total_pages > 0.25:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                result["vacuumed"] = True
+            self.last_maintenance = result
+            if result["archived_rows"]:
+                logger.info("Usage maintenance archived %d rows to %s", result["archived_rows"], result["archive"])
+            return result
+        finally:
+            conn.close()
+
+    def _uncommitted(self) -> list[tuple[str, str, int]]:
+        """Increments recorded but not yet committed. Caller holds the lock."""
+        merged = dict(self._flushing)
+        for key, n in self._pending.items():
+            merged[key] = merged.get(key, 0) + n
+        return [(ip_hash, date, n) for (ip_hash, date), n in merged.items()]
+
+    def snapshot(self, ip_hash: str) -> dict:
+        """Everything /api/usage shows, read under one lock in one query.
+
+        Global figures come from ``global_stats`` and may be up to
+        ``stats_ttl`` seconds old; the caller's own counts are always exact.
+        """
+        with self._lock:
+            self._roll_day()
+            today = self._load_today(ip_hash)
+            total = self._committed_total(ip_hash)
+            total += sum(n for ip, _, n in self._uncommitted() if ip == ip_hash)
+        return {"today": today, "total": total, **self.global_stats()}
+
+    def global_stats(self) -> dict:
+        """Site-wide totals, cached for ``stats_ttl`` seconds and shared by all callers."""
+        now = time.monotonic()
+        with self._lock:
+            if self._global_stats is not None and now - self._global_stats_at < self.stats_ttl:
+                return self._global_stats
+            self._roll_day()
+            global_today, unique_today, global_total = self.conn.execute(
+                """
+                SELECT
+                    (SELECT generation_count FROM usage_daily WHERE date = ?),
+                    (SELECT unique_ips FROM usage_daily WHERE date = ?),
+                    (SELECT generation_count FROM usage_totals WHERE id = 1)
+                """,
+                (self._day, self._day),
+            ).fetchone()
+            uncommitted = self._uncommitted()
+            self._global_stats = {
+                "global_today": (global_today or 0)
+                + sum(n for _, date, n in uncommitted if date == self._day),
+                "global_total": global_total + sum(n for _, _, n in uncommitted),
+                "unique_users_today": (unique_today or 0) + len(self._new_today),
+                "unique_users_7d": self._unique_over(7),
+                "unique_users_30d": self._unique_over(30),
+            }
+            self._global_stats_at = now
+            return self._global_stats
+
+    def _unique_over(self, days: int) -> int:
+        """Approximate distinct IPs over the last `days` days, today included. Caller holds the lock."""
+        if self._past_unions_day != self._day:
+            self._past_unions.clear()
+            self._past_unions_day = self._day
+        past = self._past_unions.get(days)
+        if past is None:
+            today = datetime.strptime(self._day, "%Y-%m-%d").date()
+            first = (today - timedelta(days=days - 1)).isoformat()
+            past = HyperLogLog.union(
+                HyperLogLog(registers=registers)
+                for (registers,) in self.conn.execute(
+                    "SELECT registers FROM usage_hll WHERE date >= ? AND date < ?",
+                    (first, self._day),
+                )
+            )
+            # Earlier days whose final registers haven't been flushed yet
+            for date, sketch in self._sketches.items():
+                if first <= date < self._day:
+                    past.merge(sketch)
+            self._past_unions[days] = past
+        return HyperLogLog.union((past, self._today_sketch())).count()
+
+    def get_today(self, ip_hash: str) -> int:
+        with self._lock:
+            self._roll_day()
+            return self._load_today(ip_hash)
+
+    def _committed_total(self, ip_hash: str) -> int:
+        """Lifetime count on disk, live rows plus archived ones. Caller holds the lock."""
+        return self.conn.execute(
+            """
+            SELECT
+                (SELECT COALESCE(SUM(generation_count), 0) FROM usage WHERE ip_hash = ?)
+                + COALESCE((SELECT generation_count FROM usage_archived WHERE ip_hash = ?), 0)
+            """,
+            (ip_hash, ip_hash),
+        ).fetchone()[0]
+
+    def get_total(self, ip_hash: str) -> int:
+        with self._lock:
+            total = self._committed_total(ip_hash)
+            return total + sum(n for ip, _, n in self._uncommitted() if ip == ip_hash)
+
+    def get_global_today(self) -> int:
+        with self._lock:
+            today = self._today()
+            row = self.conn.execute(
+                "SELECT generation_count FROM usage_daily WHERE date = ?", (today,)
+            ).fetchone()
+            committed = row[0] if row else 0
+            return committed + sum(n for _, date, n in self._uncommitted() if date == today)
+
+    def get_global_total(self) -> int:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT generation_count FROM usage_totals WHERE id = 1"
+            ).fetchone()
+            return row[0] + sum(n for _, _, n in self._uncommitted())
+
+    def get_unique_today(self) -> int:
+        with self._lock:
+            self._roll_day()
+            row = self.conn.execute(
+                "SELECT unique_ips FROM usage_daily WHERE date = ?", (self._day,)
+            ).fetchone()
+            committed = row[0] if row else 0
+            return committed + len(self._new_today)
+
+
+SCHEMA_VERSION = 3
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Create the schema, upgrading older databases in place.
+
+    Version 1 adds the rollup tables and version 2 the per-day HyperLogLog
+    sketches; both are backfilled from ``usage``. Version 3 adds the per-IP
+    totals that retention folds old rows into.
+    """
+    with conn:
+        conn.execute(
             """
             CREATE TABLE IF NOT EXISTS usage (
                 ip_hash TEXT NOT NULL,
@@ -35,52 +402,138 @@ class UsageTracker:
             )
             """
         )
-        self.conn.commit()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage_daily (
+                    date TEXT PRIMARY KEY,
+                    generation_count INTEGER NOT NULL DEFAULT 0,
+                    unique_ips INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage_totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    generation_count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("DELETE FROM usage_daily")
+            conn.execute(
+                """
+                INSERT INTO usage_daily (date, generation_count, unique_ips)
+                SELECT date, SUM(generation_count), COUNT(*) FROM usage GROUP BY date
+                """
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO usage_totals (id, generation_count)
+                SELECT 1, COALESCE(SUM(generation_count), 0) FROM usage
+                """
+            )
+        if version < 2:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage_hll (date TEXT PRIMARY KEY, registers BLOB NOT NULL)"
+            )
+            sketches: dict[str, HyperLogLog] = {}
+            for ip_hash, date in conn.execute("SELECT ip_hash, date FROM usage"):
+                sketches.setdefault(date, HyperLogLog()).add(ip_hash)
+            conn.executemany(
+                "INSERT OR REPLACE INTO usage_hll (date, registers) VALUES (?, ?)",
+                [(date, sketch.to_bytes()) for date, sketch in sketches.items()],
+            )
+        if version < 3:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage_archived (
+                    ip_hash TEXT PRIMARY KEY,
+                    generation_count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-    def _today(self) -> str:
-        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
-    def record(self, ip_hash: str) -> None:
-        self.conn.execute(
-            """
-            INSERT INTO usage (ip_hash, date, generation_count)
-            VALUES (?, ?, 1)
-            ON CONFLICT(ip_hash, date) DO UPDATE SET generation_count = generation_count + 1
-            """,
-            (ip_hash, self._today()),
-        )
-        self.conn.commit()
+def _write_batch(
+    conn: sqlite3.Connection, batch: dict[tuple[str, str], int], sketches: dict[str, bytes]
+):
+    """Apply increments to ``usage``, its rollups and sketches. Caller owns the transaction."""
+    daily: dict[str, list[int]] = {}  # date -> [generations, new IPs]
+    for (ip_hash, date), n in batch.items():
+        created = conn.execute(
+            "INSERT INTO usage (ip_hash, date, generation_count) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+            (ip_hash, date, n),
+        ).rowcount
+        if not created:
+            conn.execute(
+                "UPDATE usage SET generation_count = generation_count + ? WHERE ip_hash = ? AND date = ?",
+                (n, ip_hash, date),
+            )
+        day = daily.setdefault(date, [0, 0])
+        day[0] += n
+        day[1] += created
+    conn.executemany(
+        """
+        INSERT INTO usage_daily (date, generation_count, unique_ips) VALUES (?, ?, ?)
+        ON CONFLICT(date) DO UPDATE SET
+            generation_count = generation_count + excluded.generation_count,
+            unique_ips = unique_ips + excluded.unique_ips
+        """,
+        [(date, gens, new_ips) for date, (gens, new_ips) in daily.items()],
+    )
+    conn.execute(
+        "UPDATE usage_totals SET generation_count = generation_count + ? WHERE id = 1",
+        (sum(batch.values()),),
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO usage_hll (date, registers) VALUES (?, ?)", sketches.items()
+    )
 
-    def get_today(self, ip_hash: str) -> int:
-        row = self.conn.execute(
-            "SELECT generation_count FROM usage WHERE ip_hash = ? AND date = ?",
-            (ip_hash, self._today()),
-        ).fetchone()
-        return row[0] if row else 0
 
-    def get_total(self, ip_hash: str) -> int:
-        row = self.conn.execute(
-            "SELECT COALESCE(SUM(generation_count), 0) FROM usage WHERE ip_hash = ?",
-            (ip_hash,),
-        ).fetchone()
-        return row[0]
+def _compact(conn: sqlite3.Connection, cutoff: str, sketch_cutoff: str, archive_dir: Optional[Path]) -> dict:
+    """Move ``usage`` rows dated before `cutoff` into the archive, in one transaction.
 
-    def get_global_today(self) -> int:
-        row = self.conn.execute(
-            "SELECT COALESCE(SUM(generation_count), 0) FROM usage WHERE date = ?",
-            (self._today(),),
-        ).fetchone()
-        return row[0]
+    Holding the write lock from the read through the delete means rows can't
+    be added behind the archive's back; the write-behind flusher just waits.
+    """
+    archive = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT ip_hash, date, generation_count FROM usage WHERE date < ? ORDER BY date, ip_hash",
+            (cutoff,),
+        ).fetchall()
+        if rows and archive_dir is not None:
+            archive = _write_archive(archive_dir, rows)
+        conn.execute(
+            """
+            INSERT INTO usage_archived (ip_hash, generation_count)
+            SELECT ip_hash, SUM(generation_count) FROM usage WHERE date < ? GROUP BY ip_hash
+            ON CONFLICT(ip_hash) DO UPDATE SET generation_count = generation_count + excluded.generation_count
+            """,
+            (cutoff,),
+        )
+        conn.execute("DELETE FROM usage WHERE date < ?", (cutoff,))
+        conn.execute("DELETE FROM usage_hll WHERE date < ?", (sketch_cutoff,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        if archive is not None:
+            archive.unlink(missing_ok=True)
+        raise
+    return {"archived_rows": len(rows), "archive": str(archive) if archive else None}
 
-    def get_global_total(self) -> int:
-        row = self.conn.execute(
-            "SELECT COALESCE(SUM(generation_count), 0) FROM usage"
-        ).fetchone()
-        return row[0]
 
-    def get_unique_today(self) -> int:
-        row = self.conn.execute(
-            "SELECT COUNT(DISTINCT ip_hash) FROM usage WHERE date = ?",
-            (self._today(),),
-        ).fetchone()
-        return row[0]
+def _write_archive(archive_dir: Path, rows: list[tuple[str, str, int]]) -> Path:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"usage-{rows[0][1]}_{rows[-1][1]}-{int(time.time())}.csv.gz"
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("ip_hash", "date", "generation_count"))
+        writer.writerows(rows)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Sketch ingest benchmark — concurrent uploads inline vs on the ingest pool.
+
+Builds a large JPEG sketch (forcing the decode + PNG re-encode path) and a
+large PNG (the passthrough path), then ingests N copies concurrently: once
+inline on the event loop, as /api/generate used to, and once through
+``SketchIngestor``. Reports wall time and the longest event-loop stall seen by
+a 1 ms heartbeat task, which is what other requests experience meanwhile.
+
+Usage: python3 scripts/bench_ingest.py [--uploads 32] [--size 2048] [--workers 0]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.ingest import SketchIngestor, ingest_sketch  # noqa: E402
+
+
+def make_sketch(size: int, fmt: str) -> str:
+    img = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(0, size, 16):
+        draw.line([(i, 0), (size - i, size)], fill="black", width=3)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+async def heartbeat(stalls: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+
+async def run(sketch: str, uploads: int, ingestor) -> tuple[float, float]:
+    """Return (wall seconds, worst loop stall in ms)."""
+    stalls: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stalls, stop))
+    await asyncio.sleep(0)
+
+    async def one():
+        if ingestor is None:
+            ingest_sketch(sketch, 2**30)
+            await asyncio.sleep(0)
+        else:
+            await ingestor.ingest(sketch, 2**30)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(uploads)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    return elapsed, max(stalls, default=0) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=32)
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    ingestor = SketchIngestor(args.workers)
+    print(f"{'input':>6}  {'mode':>6}  {'wall s':>7}  {'uploads/s':>9}  {'max stall ms':>12}")
+    for fmt in ("JPEG", "PNG"):
+        sketch = make_sketch(args.size, fmt)
+        for mode, pool in (("inline", None), ("pool", ingestor)):
+            elapsed, stall = await run(sketch, args.uploads, pool)
+            print(f"{fmt:>6}  {mode:>6}  {elapsed:>7.2f}  {args.uploads / elapsed:>9.1f}  {stall:>12.1f}")
+    print(f"(pool workers: {ingestor.max_workers})")
+    ingestor.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Job store microbenchmark — per-operation cost should not grow with store size.
+
+Fills a JobStore with N jobs (mostly terminal, some active), then times the
+operations /api/generate and /api/gpu hit on every request: adding a job
+(which triggers eviction), a status transition, and the active-job count.
+With O(1) bookkeeping the per-op times stay flat from 1k to 100k jobs.
+
+Usage: python3 scripts/bench_job_store.py [--sizes 1000,10000,100000] [--ops 20000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.job_store import JobStore  # noqa: E402
+from backend.models import Job, JobStatus  # noqa: E402
+
+
+def fill(size: int) -> JobStore:
+    """Store at capacity: 90% terminal jobs, 10% still active."""
+    store = JobStore(max_jobs=size, max_bytes=2**62)
+    for i in range(size):
+        job = Job(f"fill-{i}")
+        store.add(job)
+        if i % 10:
+            store.set_status(job, JobStatus.completed)
+    return store
+
+
+def bench(size: int, ops: int) -> dict:
+    store = fill(size)
+
+    start = time.perf_counter()
+    added = []
+    for i in range(ops):
+        job = Job(f"new-{i}")
+        store.add(job)  # store is full, so every add evicts one terminal job
+        added.append(job)
+    add_us = (time.perf_counter() - start) / ops * 1e6
+
+    start = time.perf_counter()
+    for job in added:
+        store.set_status(job, JobStatus.completed)
+    transition_us = (time.perf_counter() - start) / ops * 1e6
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        store.active_count()
+    count_us = (time.perf_counter() - start) / ops * 1e6
+
+    assert len(store) <= size
+    return {"add": add_us, "transition": transition_us, "active_count": count_us}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'jobs':>8}  {'add+evict':>10}  {'transition':>10}  {'active_count':>12}  (µs/op)")
+    for size in (int(s) for s in args.sizes.split(",")):
+        r = bench(size, args.ops)
+        print(f"{size:>8}  {r['add']:>10.2f}  {r['transition']:>10.2f}  {r['active_count']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
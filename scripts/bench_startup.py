@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Startup benchmark — time from ``import backend.main`` to the first served request.
+
+Each run is a fresh interpreter, as on a container boot or worker reload. It
+times the import, then the first in-process request (``GET /api/sketches``,
+then the default preset's PNG) through an ASGI transport. For comparison it
+also times what import used to do eagerly: drawing and PNG-encoding the house
+and face presets and reading the llama and birds files.
+
+``--profile`` adds a ``python -X importtime`` breakdown of the import: self
+time summed per top-level package, and the slowest backend modules.
+
+Usage: python3 scripts/bench_startup.py [--runs 5] [--profile] [--top 15]
+"""
+
+import argparse
+import collections
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_CHILD = r"""
+import json, time
+start = time.perf_counter()
+import backend.main as m
+imported = time.perf_counter()
+
+import asyncio
+from httpx import ASGITransport, AsyncClient
+
+async def first_request():
+    async with AsyncClient(transport=ASGITransport(app=m.app), base_url="http://bench") as c:
+        (await c.get("/api/sketches")).raise_for_status()
+        listed = time.perf_counter()
+        (await c.get("/api/sketches/llama")).raise_for_status()
+        return listed
+
+listed = asyncio.run(first_request())
+served = time.perf_counter()
+
+# What the old eager loader paid on every import
+import io
+from backend.presets import DRAWN
+legacy_start = time.perf_counter()
+for draw in DRAWN.values():
+    draw().save(io.BytesIO(), format="PNG")
+for name in ("llama-sketch.png", "input-sketch.png"):
+    open("static/img/" + name, "rb").read()
+legacy = time.perf_counter() - legacy_start
+
+print(json.dumps({
+    "import": imported - start,
+    "first_list": listed - imported,
+    "first_png": served - listed,
+    "total": served - start,
+    "legacy_presets": legacy,
+}))
+"""
+
+
+def run_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_profile() -> list[tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for each module imported by ``import backend.main``."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def print_profile(rows: list[tuple[str, int, int]], top: int):
+    by_package: collections.Counter = collections.Counter()
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    print(f"\n{'package':>20}  {'self ms':>8}")
+    for package, us in by_package.most_common(top):
+        print(f"{package:>20}  {us / 1000:>8.1f}")
+    backend = sorted((r for r in rows if r[0].startswith("backend")), key=lambda r: -r[1])
+    print(f"\n{'backend module':>20}  {'self ms':>8}  {'cumulative ms':>13}")
+    for name, self_us, cumulative_us in backend[:top]:
+        print(f"{name:>20}  {self_us / 1000:>8.1f}  {cumulative_us / 1000:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", action="store_true", help="also break the import down with -X importtime")
+    parser.add_argument("--top", type=int, default=15, help="rows per profile table")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{'stage':>16}  {'median ms':>9}  {'min ms':>7}")
+    for stage in ("import", "first_list", "first_png", "total", "legacy_presets"):
+        values = [r[stage] * 1000 for r in runs]
+        print(f"{stage:>16}  {statistics.median(values):>9.1f}  {min(values):>7.1f}")
+    if args.profile:
+        print_profile(import_profile(), args.top)
+
+
+if __name__ == "__main__":
+    main()
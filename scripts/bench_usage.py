@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""/api/usage read-path benchmark — queries and latency per request.
+
+Seeds a usage database with D days of history for N IPs, then serves R
+simulated /api/usage lookups two ways: the old five separate tracker reads,
+and the consolidated ``snapshot`` call backed by the shared global-stats cache.
+Reports SQL statements executed and mean latency per request.
+
+Usage: python3 scripts/bench_usage.py [--ips 2000] [--days 90] [--requests 5000]
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.usage import UsageTracker, hash_ip  # noqa: E402
+
+
+def seed(db_path: str, ips: int, days: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE usage (ip_hash TEXT NOT NULL, date TEXT NOT NULL,"
+        " generation_count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (ip_hash, date))"
+    )
+    start = date.today() - timedelta(days=days)
+    conn.executemany(
+        "INSERT INTO usage VALUES (?, ?, ?)",
+        (
+            (hash_ip(f"10.0.{i // 256}.{i % 256}", "bench"), (start + timedelta(days=d)).isoformat(), 1 + i % 5)
+            for i in range(ips)
+            for d in range(0, days, 3)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy(tracker: UsageTracker, ip_hash: str):
+    tracker.get_today(ip_hash)
+    tracker.get_total(ip_hash)
+    tracker.get_global_today()
+    tracker.get_global_total()
+    tracker.get_unique_today()
+
+
+def consolidated(tracker: UsageTracker, ip_hash: str):
+    tracker.snapshot(ip_hash)
+
+
+def run(tracker: UsageTracker, handler, ips: int, requests: int) -> tuple[float, float]:
+    """Return (SQL statements per request, µs per request)."""
+    queries = 0
+
+    def count(_sql):
+        nonlocal queries
+        queries += 1
+
+    addrs = [f"10.0.{i // 256}.{i % 256}" for i in range(ips)]
+    tracker.conn.set_trace_callback(count)
+    start = time.perf_counter()
+    for i in range(requests):
+        handler(tracker, hash_ip(addrs[i % ips], tracker.salt))
+    elapsed = time.perf_counter() - start
+    tracker.conn.set_trace_callback(None)
+    return queries / requests, elapsed / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ips", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "usage.db")
+        seed(db, args.ips, args.days)
+        tracker = UsageTracker(db, "bench")
+        print(f"{'path':>12}  {'queries/req':>11}  {'µs/req':>8}")
+        for name, handler in (("five reads", legacy), ("snapshot", consolidated)):
+            q, us = run(tracker, handler, args.ips, args.requests)
+            print(f"{name:>12}  {q:>11.2f}  {us:>8.1f}")
+        tracker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+/**
+ * Job status subscription over Server-Sent Events (/api/events), falling
+ * back to polling /api/status when EventSource is missing or the stream drops.
+ * EventSource, fetch and timers are injected; extracted for unit testing.
+ */
+
+export interface JobStatusPayload {
+  job_id?: string;
+  status?: string;
+  error?: string | null;
+  elapsed_seconds?: number;
+}
+
+export interface EventSourceLike {
+  addEventListener(type: string, listener: (e: { data: string }) => void): void;
+  close(): void;
+  onerror: ((e: unknown) => void) | null;
+}
+
+export interface WatchDeps {
+  openEvents: ((url: string) => EventSourceLike) | null; // null without EventSource
+  fetchStatus: (jobId: string) => Promise<JobStatusPayload>;
+  setInterval: (fn: () => void, ms: number) => number;
+  clearInterval: (id: number) => void;
+}
+
+export type WatchMode = "events" | "polling" | "closed";
+
+export interface JobWatch {
+  mode: WatchMode;
+  close(): void;
+}
+
+export const TERMINAL_STATUSES = ["completed", "failed", "cancelled"];
+export const POLL_INTERVAL_MS = 1000;
+
+/** Call `onStatus` with every status update for `jobId` until `close()` is called. */
+export function watchJob(
+  api: string,
+  jobId: string,
+  deps: WatchDeps,
+  onStatus: (data: JobStatusPayload) => void,
+  onError: (err: unknown) => void = () => {},
+): JobWatch {
+  let source: EventSourceLike | null = null;
+  let timer: number | null = null;
+
+  const watch: JobWatch = {
+    mode: "events",
+    close() {
+      watch.mode = "closed";
+      if (source) {
+        source.close();
+        source = null;
+      }
+      if (timer !== null) {
+        deps.clearInterval(timer);
+        timer = null;
+      }
+    },
+  };
+
+  const deliver = (data: JobStatusPayload) => {
+    if (watch.mode === "closed") return;
+    // The server ends the stream after a terminal status; don't let it reconnect
+    if (source && data.status && TERMINAL_STATUSES.includes(data.status)) {
+      source.close();
+      source = null;
+    }
+    onStatus(data);
+  };
+
+  const poll = () => {
+    watch.mode = "polling";
+    timer = deps.setInterval(async () => {
+      try {
+        deliver(await deps.fetchStatus(jobId));
+      } catch (e) {
+        if (watch.mode !== "closed") onError(e);
+      }
+    }, POLL_INTERVAL_MS);
+  };
+
+  if (!deps.openEvents) {
+    poll();
+    return watch;
+  }
+  source = deps.openEvents(`${api}/api/events?jobs=${encodeURIComponent(jobId)}`);
+  source.addEventListener("status", (e) => deliver(JSON.parse(e.data)));
+  source.onerror = () => {
+    if (watch.mode !== "events" || !source) return;
+    source.close();
+    source = null;
+    poll();
+  };
+  return watch;
+}
@@ -53,6 +53,18 @@ export function shouldDisplay(queue: QueueState, entry: QueueEntry): boolean {
   return !queue.submissions.some((e) => e.seqNum > entry.seqNum && e.status === "completed");
 }
 
+/**
+ * Mark entries the server cancelled because a newer submission from the same
+ * session superseded them. Returns the entries that changed.
+ */
+export function markSuperseded(queue: QueueState, jobIds: string[]): QueueEntry[] {
+  const changed = queue.submissions.filter(
+    (e) => jobIds.includes(e.jobId) && (e.status === "pending" || e.status === "polling"),
+  );
+  for (const entry of changed) entry.status = "cancelled";
+  return changed;
+}
+
 /** Remove an entry by jobId. */
 export function removeEntry(queue: QueueState, jobId: string): void {
   queue.submissions = queue.submissions.filter((e) => e.jobId !== jobId);
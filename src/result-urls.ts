@@ -0,0 +1,26 @@
+/**
+ * URLs for generated results and their server-side thumbnails.
+ * No DOM dependencies; extracted for unit testing.
+ */
+
+/** Thumbnail sizes served by /api/result/{id}/thumb (longest side, px). */
+export const THUMB_SIZES = [64, 128, 256] as const;
+
+/** Smallest thumbnail that covers `cssPx` CSS pixels at `dpr`; the largest if none does. */
+export function pickThumbSize(cssPx: number, dpr: number = 1): number {
+  const needed = cssPx * (dpr > 0 ? dpr : 1);
+  for (const size of THUMB_SIZES) {
+    if (size >= needed) return size;
+  }
+  return THUMB_SIZES[THUMB_SIZES.length - 1];
+}
+
+/** Full-size result image. */
+export function resultUrl(api: string, jobId: string): string {
+  return `${api}/api/result/${encodeURIComponent(jobId)}`;
+}
+
+/** WebP preview for strips and history, a few KB instead of a full PNG. */
+export function thumbUrl(api: string, jobId: string, size: number): string {
+  return `${resultUrl(api, jobId)}/thumb?size=${size}`;
+}
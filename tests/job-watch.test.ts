@@ -0,0 +1,118 @@
+import { describe, it, expect, vi } from "vitest";
+import { watchJob, POLL_INTERVAL_MS } from "../src/job-watch";
+import type { EventSourceLike, WatchDeps } from "../src/job-watch";
+
+class FakeEventSource implements EventSourceLike {
+  url: string;
+  closed = false;
+  onerror: ((e: unknown) => void) | null = null;
+  listeners = new Map<string, (e: { data: string }) => void>();
+
+  constructor(url: string) {
+    this.url = url;
+  }
+
+  addEventListener(type: string, listener: (e: { data: string }) => void) {
+    this.listeners.set(type, listener);
+  }
+
+  close() {
+    this.closed = true;
+  }
+
+  emit(type: string, data: object) {
+    this.listeners.get(type)?.({ data: JSON.stringify(data) });
+  }
+}
+
+function makeDeps(withEvents = true) {
+  const sources: FakeEventSource[] = [];
+  const intervals = new Map<number, () => void>();
+  let nextId = 1;
+  const deps: WatchDeps = {
+    openEvents: withEvents
+      ? (url) => {
+          const source = new FakeEventSource(url);
+          sources.push(source);
+          return source;
+        }
+      : null,
+    fetchStatus: vi.fn(async () => ({ status: "processing" })),
+    setInterval: vi.fn((fn: () => void) => {
+      intervals.set(nextId, fn);
+      return nextId++;
+    }),
+    clearInterval: vi.fn((id: number) => {
+      intervals.delete(id);
+    }),
+  };
+  return { deps, sources, intervals };
+}
+
+describe("job-watch", () => {
+  it("subscribes to the SSE stream for the job", () => {
+    const { deps, sources, intervals } = makeDeps();
+    const onStatus = vi.fn();
+    const watch = watchJob("", "abc", deps, onStatus);
+    expect(watch.mode).toBe("events");
+    expect(sources[0].url).toBe("/api/events?jobs=abc");
+    expect(intervals.size).toBe(0);
+
+    sources[0].emit("status", { job_id: "abc", status: "processing" });
+    expect(onStatus).toHaveBeenCalledWith({ job_id: "abc", status: "processing" });
+  });
+
+  it("closes the stream after a terminal status", () => {
+    const { deps, sources } = makeDeps();
+    const onStatus = vi.fn();
+    watchJob("", "abc", deps, onStatus);
+    sources[0].emit("status", { status: "completed" });
+    expect(sources[0].closed).toBe(true);
+    expect(onStatus).toHaveBeenCalledTimes(1);
+  });
+
+  it("falls back to polling when the stream errors", async () => {
+    const { deps, sources, intervals } = makeDeps();
+    const onStatus = vi.fn();
+    const watch = watchJob("", "abc", deps, onStatus);
+    sources[0].onerror?.({});
+    expect(sources[0].closed).toBe(true);
+    expect(watch.mode).toBe("polling");
+    expect(deps.setInterval).toHaveBeenCalledWith(expect.any(Function), POLL_INTERVAL_MS);
+
+    await [...intervals.values()][0]();
+    expect(deps.fetchStatus).toHaveBeenCalledWith("abc");
+    expect(onStatus).toHaveBeenCalledWith({ status: "processing" });
+  });
+
+  it("polls when EventSource is unavailable", () => {
+    const { deps, intervals } = makeDeps(false);
+    const watch = watchJob("", "abc", deps, vi.fn());
+    expect(watch.mode).toBe("polling");
+    expect(intervals.size).toBe(1);
+  });
+
+  it("reports polling failures", async () => {
+    const { deps, intervals } = makeDeps(false);
+    deps.fetchStatus = vi.fn(async () => {
+      throw new Error("offline");
+    });
+    const onError = vi.fn();
+    watchJob("", "abc", deps, vi.fn(), onError);
+    await [...intervals.values()][0]();
+    expect(onError).toHaveBeenCalledTimes(1);
+  });
+
+  it("delivers nothing after close", () => {
+    const { deps, sources } = makeDeps();
+    const onStatus = vi.fn();
+    const watch = watchJob("", "abc", deps, onStatus);
+    watch.close();
+    expect(watch.mode).toBe("closed");
+    expect(sources[0].closed).toBe(true);
+    sources[0].emit("status", { status: "processing" });
+    sources[0].onerror?.({});
+    expect(onStatus).not.toHaveBeenCalled();
+    expect(deps.setInterval).not.toHaveBeenCalled();
+  });
+});
@@ -6,6 +6,7 @@ import {
   removeEntry,
   findEntry,
   activeCount,
+  markSuperseded,
   MAX_QUEUE,
 } from "../src/queue-manager";
 
@@ -108,4 +109,18 @@ describe("QueueManager", () => {
     findEntry(q, "job-b")!.status = "failed";
     expect(activeCount(q)).toBe(1);
   });
+
+  it("markSuperseded cancels only live entries the server named", () => {
+    const q = createQueue();
+    addSubmission(q, "job-a");
+    addSubmission(q, "job-b");
+    addSubmission(q, "job-c");
+    findEntry(q, "job-a")!.status = "completed";
+
+    const changed = markSuperseded(q, ["job-a", "job-b"]);
+    expect(changed.map((e) => e.jobId)).toEqual(["job-b"]);
+    expect(findEntry(q, "job-a")!.status).toBe("completed");
+    expect(findEntry(q, "job-b")!.status).toBe("cancelled");
+    expect(activeCount(q)).toBe(1);
+  });
 });
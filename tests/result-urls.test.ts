@@ -0,0 +1,38 @@
+import { describe, it, expect } from "vitest";
+import { THUMB_SIZES, pickThumbSize, resultUrl, thumbUrl } from "../src/result-urls";
+
+describe("result-urls", () => {
+  describe("pickThumbSize", () => {
+    it("uses the 64px thumbnail for history at 1x", () => {
+      expect(pickThumbSize(64, 1)).toBe(64);
+      expect(pickThumbSize(52, 1)).toBe(64);
+    });
+
+    it("scales with device pixel ratio", () => {
+      expect(pickThumbSize(64, 2)).toBe(128);
+      expect(pickThumbSize(100, 2)).toBe(256);
+    });
+
+    it("caps at the largest served size", () => {
+      expect(pickThumbSize(400, 3)).toBe(THUMB_SIZES[THUMB_SIZES.length - 1]);
+    });
+
+    it("treats a missing or invalid ratio as 1x", () => {
+      expect(pickThumbSize(64)).toBe(64);
+      expect(pickThumbSize(64, 0)).toBe(64);
+    });
+  });
+
+  describe("resultUrl / thumbUrl", () => {
+    it("builds the full result URL", () => {
+      expect(resultUrl("", "abc123")).toBe("/api/result/abc123");
+    });
+
+    it("builds the thumbnail URL with its size", () => {
+      expect(thumbUrl("", "abc123", 64)).toBe("/api/result/abc123/thumb?size=64");
+      expect(thumbUrl("https://x.test", "abc123", 128)).toBe(
+        "https://x.test/api/result/abc123/thumb?size=128",
+      );
+    });
+  });
+});